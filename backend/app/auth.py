@@ -1,16 +1,28 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
+from passlib.hash import pbkdf2_sha256
 
 from .config import get_config
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+_VERIFIED_TOKENS = 1024  # verified token payloads kept, least recently used evicted first
 
 security = HTTPBearer()
 
+# sha256(token) -> payload of tokens that passed the signature check under _verified_secret;
+# an entry is only used until the token's own exp
+_verified: OrderedDict[bytes, dict] = OrderedDict()
+_verified_secret: str | None = None
+_verified_lock = threading.Lock()
+
 
 def create_access_token(username: str, role: str, expires_delta: timedelta | None = None) -> str:
     config = get_config()
@@ -21,22 +33,41 @@ def create_access_token(username: str, role: str, expires_delta: timedelta | Non
 
 def verify_user(username: str, password: str) -> str | None:
     """Returns role if credentials are valid, None otherwise."""
-    config = get_config()
-    for user in config.auth.users:
-        if user.username == username and user.password == password:
-            return user.role
-    return None
+    user = get_config().auth.find_user(username)
+    if user is None or not user.password_hash:
+        return None
+    return user.role if pbkdf2_sha256.verify(password, user.password_hash) else None
 
 
 def _decode_token(credentials: HTTPAuthorizationCredentials) -> dict:
-    config = get_config()
+    global _verified_secret
+    secret = get_config().auth.jwt_secret
+    key = hashlib.sha256(credentials.credentials.encode()).digest()
+    with _verified_lock:
+        if secret != _verified_secret:
+            _verified.clear()
+            _verified_secret = secret
+        payload = _verified.get(key)
+        if payload is not None:
+            if payload["exp"] > time.time():
+                _verified.move_to_end(key)
+                return payload
+            del _verified[key]
+
     try:
-        payload = jwt.decode(credentials.credentials, config.auth.jwt_secret, algorithms=[ALGORITHM])
-        if payload.get("sub") is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return payload
+        payload = jwt.decode(credentials.credentials, secret, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    if isinstance(payload.get("exp"), (int, float)):
+        with _verified_lock:
+            if secret == _verified_secret:
+                _verified[key] = payload
+                while len(_verified) > _VERIFIED_TOKENS:
+                    _verified.popitem(last=False)
+    return payload
 
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
@@ -1,14 +1,34 @@
+import errno
+import logging
 import os
+import stat
+import tempfile
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
 
 import yaml
-from pydantic import BaseModel
+from passlib.hash import pbkdf2_sha256
+from pydantic import BaseModel, PrivateAttr, model_validator
+
+logger = logging.getLogger(__name__)
 
 
 class CustomProject(BaseModel):
     path: str
     retention_days: int
+    max_bytes: int | None = None  # project quota; None = the server's project_max_bytes, 0 = no limit
+    max_builds: int | None = None  # project quota; None = the server's project_max_builds, 0 = no limit
+
+
+class RetentionRule(BaseModel):
+    """Build-aware retention rule. Projects and builds are matched by case-insensitive glob (* and ?)."""
+
+    projects: str = "*"  # project path glob
+    builds: str = "*"  # build name glob, e.g. "*release*"
+    keep_last: int = 0  # never delete the newest N matching builds of each project
+    protect: bool = False  # never delete any matching build
+    extra_days: int = 0  # added to the retention of matching builds (build overrides still win)
 
 
 class BinaryServerConfig(BaseModel):
@@ -18,8 +38,22 @@ class BinaryServerConfig(BaseModel):
     project_depth: int = 1
     trigger_threshold_percent: int = 90
     target_threshold_percent: int = 80
+    emergency_threshold_percent: int = 98  # above this, cleanup takes the fast path (see retention_engine)
+    cold_band_days: int = 0  # builds with at most this many days left are compressed before deletion (0 = off)
+    project_max_bytes: int = 0  # default per-project quota, trimmed before the disk thresholds (0 = no limit)
+    project_max_builds: int = 0  # default per-project build count quota (0 = no limit)
     check_interval_minutes: int = 5
     custom_projects: list[CustomProject] = []
+    rules: list[RetentionRule] = []  # see build_index.RetentionRules
+
+    _custom: dict[str, CustomProject] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        for cp in self.custom_projects:
+            self._custom.setdefault(cp.path, cp)  # the first entry for a path wins
+
+    def custom_project(self, path: str) -> CustomProject | None:
+        return self._custom.get(path)
 
 
 class RetentionConfig(BaseModel):
@@ -30,14 +64,32 @@ class RetentionConfig(BaseModel):
 
 class UserAccount(BaseModel):
     username: str
-    password: str
+    password_hash: str = ""  # passlib pbkdf2_sha256 hash; "" = cannot log in
     role: str = "user"  # "admin" or "user"
 
+    @model_validator(mode="before")
+    @classmethod
+    def _hash_plaintext(cls, data: Any) -> Any:
+        """Accept a plaintext `password` (older configs, or an admin adding a user by hand)
+        and keep only its hash; load_config then rewrites the file without it."""
+        if isinstance(data, dict) and "password" in data:
+            data = dict(data)
+            data["password_hash"] = pbkdf2_sha256.hash(data.pop("password"))
+        return data
+
 
 class AuthConfig(BaseModel):
     users: list[UserAccount] = []
     jwt_secret: str = "change-this-to-a-random-secret-in-production"
 
+    _by_name: dict[str, UserAccount] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._by_name = {u.username: u for u in self.users}
+
+    def find_user(self, username: str) -> UserAccount | None:
+        return self._by_name.get(username)
+
 
 class AppConfig(BaseModel):
     demo_mode: bool = False
@@ -46,8 +98,16 @@ class AppConfig(BaseModel):
     auth: AuthConfig = AuthConfig()
 
 
+ConfigListener = Callable[[Optional[AppConfig], AppConfig, set[str]], None]
+
 _config: Optional[AppConfig] = None
 _config_path: Optional[Path] = None
+_config_lock = threading.RLock()  # serializes swaps: API saves and the file watcher
+_listeners: list[ConfigListener] = []
+_file_stamp: tuple | None = None  # (inode, mtime_ns, size) of the file as last read or written
+_WATCH_INTERVAL = 2  # seconds between config file checks
+_watcher: threading.Thread | None = None
+_watcher_stop = threading.Event()
 
 
 def get_config_path() -> Path:
@@ -61,17 +121,58 @@ def get_config_path() -> Path:
 
 
 def load_config(path: Optional[Path] = None) -> AppConfig:
-    global _config, _config_path
+    global _config_path
     if path:
         _config_path = path
     config_path = get_config_path()
-    if config_path.exists():
-        with open(config_path) as f:
-            data = yaml.safe_load(f) or {}
-        _config = AppConfig(**data)
-    else:
-        _config = AppConfig()
-    return _config
+    with _config_lock:
+        _swap(_read(config_path) if config_path.exists() else AppConfig())
+        return _config
+
+
+def reload_config() -> bool:
+    """Re-read the config file and swap it in when it is valid and differs from the current
+    config. An invalid file is logged and ignored; the current config stays in place."""
+    config_path = get_config_path()
+    with _config_lock:
+        try:
+            config = _read(config_path)
+        except (OSError, ValueError, TypeError, yaml.YAMLError) as e:
+            logger.error("Ignoring invalid config %s: %s", config_path, e)
+            return False
+        if config == _config:
+            return False
+        _swap(config)
+    logger.info("Reloaded config from %s", config_path)
+    return True
+
+
+def _read(config_path: Path) -> AppConfig:
+    global _file_stamp
+    _file_stamp = _stamp(config_path)
+    with open(config_path) as f:
+        data = yaml.safe_load(f) or {}
+    config = AppConfig(**data)
+    if _has_plaintext_passwords(data):
+        try:
+            _write(config, config_path)
+            logger.info("Replaced plaintext passwords in %s with hashes", config_path)
+        except OSError as e:
+            logger.warning("Plaintext passwords in %s could not be replaced: %s", config_path, e)
+    return config
+
+
+def _has_plaintext_passwords(data: dict) -> bool:
+    users = (data.get("auth") or {}).get("users") or []
+    return any(isinstance(u, dict) and "password" in u for u in users)
+
+
+def _stamp(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
 
 
 def get_config() -> AppConfig:
@@ -82,9 +183,84 @@ def get_config() -> AppConfig:
 
 
 def save_config(config: AppConfig) -> None:
+    """Persist config and make it the current one."""
+    with _config_lock:
+        _write(config, get_config_path())
+        _swap(config)
+
+
+def _write(config: AppConfig, config_path: Path) -> None:
+    """Write to a temporary file renamed over the config, so a crash mid-write never leaves
+    a truncated file behind."""
+    global _file_stamp
+    text = yaml.dump(config.model_dump(), default_flow_style=False, allow_unicode=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{config_path.name}.", suffix=".tmp", dir=config_path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if config_path.exists():
+            os.chmod(tmp, stat.S_IMODE(config_path.stat().st_mode))
+        os.replace(tmp, config_path)
+    except OSError as e:
+        os.unlink(tmp)
+        if e.errno not in (errno.EBUSY, errno.EXDEV):
+            raise
+        # a file bind-mounted on its own cannot be replaced; mount its directory instead
+        logger.warning("Cannot replace %s atomically (%s), writing it in place", config_path, e)
+        with open(config_path, "w") as f:
+            f.write(text)
+    _file_stamp = _stamp(config_path)
+
+
+def on_config_change(listener: ConfigListener) -> None:
+    """Call listener(old, new, changed) whenever a new config is swapped in. `changed` holds
+    the names of servers added, removed or modified; unchanged servers keep their instance."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def _swap(config: AppConfig) -> None:
     global _config
+    old = _config
+    previous = {s.name: s for s in old.binary_servers} if old else {}
+    config.binary_servers = [
+        previous[s.name] if previous.get(s.name) == s else s for s in config.binary_servers
+    ]
+    current = {s.name: s for s in config.binary_servers}
+    changed = {name for name in previous.keys() | current.keys() if previous.get(name) is not current.get(name)}
     _config = config
-    config_path = get_config_path()
-    data = config.model_dump()
-    with open(config_path, "w") as f:
-        yaml.dump(data, f, default_flow_style=False, allow_unicode=True)
+    for listener in _listeners:
+        try:
+            listener(old, config, changed)
+        except Exception:
+            logger.exception("Config change listener %s failed", getattr(listener, "__name__", listener))
+
+
+def watch_config(interval: float = _WATCH_INTERVAL) -> None:
+    """Reload the config file in a background thread whenever it changes on disk."""
+    global _watcher
+    if _watcher and _watcher.is_alive():
+        return
+    _watcher_stop.clear()
+    _watcher = threading.Thread(target=_watch, args=(interval,), daemon=True, name="config-watcher")
+    _watcher.start()
+
+
+def stop_watching() -> None:
+    global _watcher
+    _watcher_stop.set()
+    if _watcher:
+        _watcher.join(timeout=5)
+        _watcher = None
+
+
+def _watch(interval: float) -> None:
+    while not _watcher_stop.wait(interval):
+        stamp = _stamp(get_config_path())
+        if stamp is not None and stamp != _file_stamp:
+            try:
+                reload_config()
+            except Exception:
+                logger.exception("Config reload failed")
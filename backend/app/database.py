@@ -1,8 +1,11 @@
+import logging
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import UniqueConstraint, create_engine, func, inspect, literal, select, text
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
+logger = logging.getLogger(__name__)
+
 
 class Base(DeclarativeBase):
     pass
@@ -26,6 +29,49 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate(engine)
+
+
+def migrate(bind) -> None:
+    """Bring tables created by an older version up to the models. create_all only creates
+    missing tables, so add the columns (with their scalar default) and unique constraints
+    that are missing; duplicate rows are dropped before a unique constraint is added,
+    keeping the newest (highest id) of each."""
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = _column_ddl(column, conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {ddl}"))
+                    logger.info("Added column %s.%s", table.name, column.name)
+
+            unique = {u["name"] for u in inspector.get_unique_constraints(table.name)}
+            unique |= {i["name"] for i in inspector.get_indexes(table.name) if i["unique"]}
+            for constraint in table.constraints:
+                if not isinstance(constraint, UniqueConstraint) or constraint.name in unique:
+                    continue
+                columns = list(constraint.columns)
+                keep = select(func.max(table.c.id).label("id")).group_by(*columns).subquery()
+                dropped = conn.execute(table.delete().where(table.c.id.not_in(select(keep.c.id)))).rowcount
+                conn.execute(text(
+                    f"CREATE UNIQUE INDEX {quote(constraint.name)} ON {quote(table.name)} "
+                    f"({', '.join(quote(c.name) for c in columns)})"
+                ))
+                logger.info("Added unique constraint %s (%d duplicate rows dropped)", constraint.name, dropped)
+
+
+def _column_ddl(column, dialect) -> str:
+    ddl = f"{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is None:
+        return ddl  # existing rows get NULL, whatever the model says
+    value = literal(default, column.type).compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    return f"{ddl} DEFAULT {value}" + ("" if column.nullable else " NOT NULL")
 
 
 def get_db():
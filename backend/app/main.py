@@ -1,9 +1,10 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from .config import load_config
+from .config import load_config, stop_watching, watch_config
 from .database import init_db
 from .routers import (
     auth_router,
@@ -13,6 +14,7 @@ from .routers import (
     dashboard_router,
     logs_router,
 )
+from .services.disk_agent_service import AgentUnavailable
 from .services.scheduler_service import start_scheduler, stop_scheduler
 
 
@@ -21,7 +23,9 @@ async def lifespan(app: FastAPI):
     load_config()
     init_db()
     start_scheduler()
+    watch_config()
     yield
+    stop_watching()
     stop_scheduler()
 
 
@@ -35,6 +39,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(AgentUnavailable)
+async def agent_unavailable(request: Request, exc: AgentUnavailable):
+    """A disk agent whose circuit is open: fail fast instead of waiting for its timeouts."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 app.include_router(auth_router.router)
 app.include_router(dashboard_router.router)
 app.include_router(binaries_router.router)
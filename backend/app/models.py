@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, Float, Integer, String, Text
+from sqlalchemy import BigInteger, DateTime, Float, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .database import Base
@@ -12,7 +12,7 @@ class CleanupRun(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
-    trigger: Mapped[str] = mapped_column(String(50))  # "scheduled" | "manual"
+    trigger: Mapped[str] = mapped_column(String(50))  # "scheduled" | "manual" | "emergency"
     dry_run: Mapped[bool] = mapped_column(default=False)
     disk_usage_before: Mapped[float | None] = mapped_column(Float, nullable=True)
     disk_usage_after: Mapped[float | None] = mapped_column(Float, nullable=True)
@@ -24,6 +24,9 @@ class CleanupRun(Base):
 
 class BuildRetentionOverride(Base):
     __tablename__ = "build_retention_overrides"
+    __table_args__ = (
+        UniqueConstraint("server_name", "project_name", "build_number", name="uq_overrides_server_project_build"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     server_name: Mapped[str] = mapped_column(String(100))
@@ -31,6 +34,7 @@ class BuildRetentionOverride(Base):
     build_number: Mapped[str] = mapped_column(String(50))
     retention_days: Mapped[int] = mapped_column(Integer)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # ignored (and purged) after this
 
 
 class CleanupLog(Base):
@@ -44,6 +48,76 @@ class CleanupLog(Base):
     build_number: Mapped[str] = mapped_column(String(50))
     retention_type: Mapped[str] = mapped_column(String(50))
     age_days: Mapped[float] = mapped_column(Float)
-    size_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, default=0)  # bytes freed
     score: Mapped[float] = mapped_column(Float)
     dry_run: Mapped[bool] = mapped_column(default=False)
+    action: Mapped[str] = mapped_column(String(20), default="delete")  # delete|compress
+
+
+class CleanupProfile(Base):
+    __tablename__ = "cleanup_profiles"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id: Mapped[int] = mapped_column(Integer, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    duration_seconds: Mapped[float] = mapped_column(Float, default=0)
+    sample_count: Mapped[int] = mapped_column(Integer, default=0)
+    summary: Mapped[str] = mapped_column(Text(length=2**24 - 1))  # MEDIUMTEXT on MySQL
+    collapsed_stacks: Mapped[str] = mapped_column(Text(length=2**32 - 1))  # LONGTEXT on MySQL
+
+
+class Build(Base):
+    """Catalog of every agent's builds, kept in sync by catalog_service."""
+
+    __tablename__ = "builds"
+    __table_args__ = (
+        UniqueConstraint("server_name", "project_name", "build_number", name="uq_builds_server_project_build"),
+        Index("ix_builds_server_modified", "server_name", "modified_at"),
+        Index("ix_builds_server_epoch", "server_name", "modified_epoch"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    server_name: Mapped[str] = mapped_column(String(100))
+    project_name: Mapped[str] = mapped_column(String(255))
+    build_number: Mapped[str] = mapped_column(String(50))
+    modified_at: Mapped[datetime] = mapped_column(DateTime)
+    modified_epoch: Mapped[int] = mapped_column(BigInteger)  # modified_at in Unix seconds, for SQL scoring
+    size_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    exclusive_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)  # freed by deleting it
+    compressed: Mapped[bool] = mapped_column(default=False)  # replaced by a tarball in place; sizes are the archive's
+    last_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class BuildCatalogSync(Base):
+    """Per-server journal position of the build catalog and the disk usage seen at the last sync."""
+
+    __tablename__ = "build_catalog_syncs"
+
+    server_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    agent_key: Mapped[str] = mapped_column(String(255))  # agent url + build depth the position belongs to
+    epoch: Mapped[str] = mapped_column(String(64), default="")
+    seq: Mapped[int] = mapped_column(BigInteger, default=0)
+    synced_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    total_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    used_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    free_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    usage_percent: Mapped[float] = mapped_column(Float, default=0)
+
+
+class ProjectRollup(Base):
+    """Agent rollup per directory level (see disk_agent_service.get_rollups), refreshed by each sync."""
+
+    __tablename__ = "project_rollups"
+    __table_args__ = (UniqueConstraint("server_name", "path", name="uq_project_rollups_server_path"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    server_name: Mapped[str] = mapped_column(String(100))
+    path: Mapped[str] = mapped_column(String(255))
+    level: Mapped[int] = mapped_column(Integer)
+    builds: Mapped[int] = mapped_column(Integer, default=0)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    unsized_builds: Mapped[int] = mapped_column(Integer, default=0)
+    oldest_modified_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    newest_modified_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    first_build: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    last_build: Mapped[str | None] = mapped_column(String(50), nullable=True)
@@ -1,6 +1,10 @@
-from datetime import datetime
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Literal
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
@@ -8,83 +12,118 @@ from ..auth import get_current_user
 from ..config import get_config
 from ..database import get_db
 from ..models import BuildRetentionOverride, CleanupLog
-from ..schemas import BuildInfo, ProjectDetail, ProjectInfo
-from ..services import disk_agent_service
-from ..services.retention_engine import get_retention_days, has_build_override, is_custom_project
+from ..schemas import (
+    BuildInfo,
+    BulkRetentionRequest,
+    BulkRetentionResponse,
+    DeleteJobRequest,
+    DeleteJobStatus,
+    ProjectDetail,
+    ProjectInfo,
+)
+from ..services import catalog_service, delete_job_service, disk_agent_service, override_service, retention_engine
+from ..services.retention_engine import get_retention_days, is_custom_project
 
 router = APIRouter(prefix="/api/binaries", tags=["binaries"])
 
+_MAX_PAGE_SIZE = 10000
+_STREAM_CHUNK = 500  # items serialized per chunk written to the response
+_JOB_KEEPALIVE = 15  # seconds between delete job progress lines when nothing changes
+
 
 @router.get("", response_model=list[ProjectInfo])
 def list_projects(
     server: str = Query("", description="Filter by server name"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(0, ge=0, le=_MAX_PAGE_SIZE, description="0: all projects"),
+    sort: catalog_service.ProjectSort = Query("name"),
+    order: Literal["asc", "desc"] = Query("asc"),
+    fields: str = Query("", description="Comma-separated ProjectInfo fields to return (default all)"),
+    format: Literal["json", "ndjson"] = Query("json"),
     user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
 ):
+    """Projects from the catalog's rollups, streamed; the total count is in X-Total-Count."""
     config = get_config()
     servers = config.binary_servers
     if server:
         servers = [s for s in servers if s.name == server]
+    include = _parse_fields(fields, ProjectInfo)
+    by_name = {s.name: s for s in servers}
 
-    result = []
-    for srv in servers:
-        projects = disk_agent_service.list_projects(srv)
-        for name in projects:
-            retention = get_retention_days(srv, name)
-            builds = disk_agent_service.list_builds(srv, name)
-            build_numbers = [b["build_number"] for b in builds]
-            result.append(
-                ProjectInfo(
-                    name=name,
-                    retention_days=retention,
-                    is_custom=is_custom_project(srv, name),
-                    build_count=len(builds),
-                    oldest_build=min(build_numbers) if build_numbers else None,
-                    newest_build=max(build_numbers) if build_numbers else None,
-                    server=srv.name,
-                )
-            )
-    return result
+    total = catalog_service.count_projects(servers, db)
+    rows = catalog_service.iter_projects(
+        servers, db, sort, order == "desc", (page - 1) * page_size, page_size or None
+    )
+    projects = (
+        ProjectInfo(
+            name=r.path,
+            retention_days=get_retention_days(by_name[r.server_name], r.path),
+            is_custom=is_custom_project(by_name[r.server_name], r.path),
+            build_count=r.builds,
+            oldest_build=r.first_build,
+            newest_build=r.last_build,
+            server=r.server_name,
+            total_size_bytes=r.size_bytes,
+            unsized_build_count=r.unsized_builds,
+            oldest_modified_at=r.oldest_modified_at,
+            newest_modified_at=r.newest_modified_at,
+        )
+        for r in rows
+    )
+    return _stream(projects, include, format, headers={"X-Total-Count": str(total)})
 
 
 @router.get("/detail/{project:path}", response_model=ProjectDetail)
 def get_project_builds(
     project: str,
     server: str = Query("", alias="server"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(0, ge=0, le=_MAX_PAGE_SIZE, description="0: all builds"),
+    sort: retention_engine.BuildSort = Query("build"),
+    order: Literal["asc", "desc"] = Query("asc"),
+    fields: str = Query("", description="Comma-separated BuildInfo fields to return (default all)"),
+    format: Literal["json", "ndjson"] = Query("json"),
     user: str = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    """One page of a project's builds, sorted and scored in SQL and streamed.
+
+    As NDJSON the first line is the project (without builds), followed by one build per line."""
     config = get_config()
     srv = _find_server(config, server)
+    include = _parse_fields(fields, BuildInfo)
 
-    builds = disk_agent_service.list_builds(srv, project)
-
-    now = datetime.utcnow()
-    build_infos = []
-    for b in builds:
-        modified = b["modified_at"]
-        age_days = (now - modified).total_seconds() / 86400
-        retention = get_retention_days(srv, project, b["build_number"], db)
-        remaining = retention - age_days
-        build_infos.append(
-            BuildInfo(
-                build_number=b["build_number"],
-                modified_at=modified,
-                age_days=round(age_days, 1),
-                retention_days=retention,
-                remaining_days=round(remaining, 1),
-                expired=age_days >= retention,
-                has_override=has_build_override(srv, project, b["build_number"], db),
-            )
-        )
-
-    project_retention = get_retention_days(srv, project)
-    build_infos.sort(key=lambda b: b.build_number)
-    return ProjectDetail(
+    head = ProjectDetail(
         name=project,
-        retention_days=project_retention,
+        retention_days=get_retention_days(srv, project),
         is_custom=is_custom_project(srv, project),
-        builds=build_infos,
+        builds=[],
+        total=catalog_service.count_builds(srv, project, db),
+        page=page,
+        page_size=page_size,
+    ).model_dump_json(exclude={"builds"})
+    rows = retention_engine.iter_project_builds(
+        srv, project, db, sort, order == "desc", (page - 1) * page_size, page_size or None
     )
+    builds = (
+        BuildInfo(
+            build_number=b.build_number,
+            modified_at=b.modified_at,
+            age_days=round(b.age_days, 1),
+            retention_days=b.retention_days,
+            remaining_days=round(b.score, 1),
+            expired=b.age_days >= b.retention_days,
+            size_bytes=b.size_bytes or 0,
+            has_override=has_override,
+            compressed=b.compressed,
+            protected=b.protected,
+        )
+        for b, has_override in rows
+    )
+    if format == "ndjson":
+        return _stream(builds, include, format, head=head)
+    return _stream(builds, include, format, head=head[:-1] + ',"builds":[', tail="]}")
 
 
 @router.delete("/detail/{project:path}/{build}", status_code=status.HTTP_200_OK)
@@ -102,7 +141,7 @@ def delete_build(
         raise HTTPException(status_code=404, detail="Build not found")
 
     rel_path = f"{project}/{build}"
-    size = disk_agent_service.get_directory_size(srv, rel_path)
+    _, size = disk_agent_service.get_directory_usage(srv, rel_path)
     success = disk_agent_service.delete_build(srv, project, build)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete build")
@@ -119,14 +158,56 @@ def delete_build(
         dry_run=False,
     )
     db.add(log)
+    catalog_service.remove_build(srv, project, build, db)
     db.commit()
 
     disk_agent_service.invalidate_cache()
     return {"message": f"Deleted {project}/{build}", "size_bytes": size}
 
 
+@router.post("/delete-jobs", response_model=DeleteJobStatus, status_code=status.HTTP_202_ACCEPTED)
+def submit_delete_job(
+    body: DeleteJobRequest,
+    user: str = Depends(get_current_user),
+):
+    """Delete many builds of one server in the background, through the agent's batch delete."""
+    srv = _find_server(get_config(), body.server)
+    job = delete_job_service.submit(srv, [(b.project, b.build) for b in body.builds])
+    return job.snapshot()
+
+
+@router.get("/delete-jobs/{job_id}", response_model=DeleteJobStatus)
+def get_delete_job(job_id: str, user: str = Depends(get_current_user)):
+    return _find_job(job_id).snapshot()
+
+
+@router.get("/delete-jobs/{job_id}/events")
+def stream_delete_job(job_id: str, user: str = Depends(get_current_user)):
+    """The job's status as NDJSON: a line on every progress update (and every
+    _JOB_KEEPALIVE seconds), ending with the finished job."""
+    job = _find_job(job_id)
+
+    def events() -> Iterator[str]:
+        version = -1
+        while True:
+            snapshot, version = delete_job_service.wait(job, version, _JOB_KEEPALIVE)
+            yield DeleteJobStatus(**snapshot).model_dump_json() + "\n"
+            if snapshot["state"] in ("completed", "failed"):
+                return
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def _find_job(job_id: str) -> delete_job_service.DeleteJob:
+    job = delete_job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Delete job not found")
+    return job
+
+
 class RetentionOverrideRequest(BaseModel):
     retention_days: int
+    expires_at: datetime | None = None  # naive UTC; the override is ignored after it
 
 
 @router.put("/detail/{project:path}/{build}/retention")
@@ -140,24 +221,8 @@ def set_build_retention(
 ):
     config = get_config()
     srv = _find_server(config, server)
-
-    override = db.query(BuildRetentionOverride).filter(
-        BuildRetentionOverride.server_name == srv.name,
-        BuildRetentionOverride.project_name == project,
-        BuildRetentionOverride.build_number == build,
-    ).first()
-
-    if override:
-        override.retention_days = body.retention_days
-    else:
-        override = BuildRetentionOverride(
-            server_name=srv.name,
-            project_name=project,
-            build_number=build,
-            retention_days=body.retention_days,
-        )
-        db.add(override)
-
+    row = _override_row(srv.name, project, build, body.retention_days, _expiry(body.expires_at))
+    override_service.set_overrides([row], db)
     db.commit()
     return {"message": f"Retention set to {body.retention_days}d for {project}/{build}"}
 
@@ -185,6 +250,122 @@ def remove_build_retention(
     return {"message": f"Retention override removed for {project}/{build}"}
 
 
+@router.put("/retention", response_model=BulkRetentionResponse)
+def set_retention_bulk(
+    body: BulkRetentionRequest,
+    user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Set the overrides of many builds in one transaction, a single upsert per 1000 builds."""
+    rows = {}
+    for server_name, project, build, days, expires_at in _bulk_targets(body, db):
+        if days is None:
+            raise HTTPException(status_code=400, detail=f"No retention_days for {project}/{build}")
+        rows[(server_name, project, build)] = _override_row(server_name, project, build, days, _expiry(expires_at))
+
+    override_service.set_overrides(list(rows.values()), db)
+    db.commit()
+    return BulkRetentionResponse(builds=len(rows))
+
+
+@router.delete("/retention", response_model=BulkRetentionResponse)
+def remove_retention_bulk(
+    body: BulkRetentionRequest,
+    user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Remove the overrides of many builds in one transaction."""
+    keys: dict[str, set[tuple[str, str]]] = {}
+    for server_name, project, build, _, _ in _bulk_targets(body, db):
+        keys.setdefault(server_name, set()).add((project, build))
+
+    removed = sum(override_service.remove_overrides(name, sorted(builds), db) for name, builds in keys.items())
+    db.commit()
+    return BulkRetentionResponse(builds=removed)
+
+
+def _bulk_targets(body: BulkRetentionRequest, db: Session) -> list[tuple[str, str, str, int | None, datetime | None]]:
+    """(server, project, build, retention_days, expires_at) of every build a bulk request selects."""
+    config = get_config()
+    targets = [
+        (
+            _find_server(config, item.server).name, item.project, item.build,
+            body.retention_days if item.retention_days is None else item.retention_days,
+            item.expires_at or body.expires_at,
+        )
+        for item in body.items
+    ]
+    if body.project is not None:
+        srv = _find_server(config, body.server)
+        builds = override_service.select_builds(
+            srv, body.project, db, body.pattern, body.first_build, body.last_build
+        )
+        targets += [(srv.name, body.project, b, body.retention_days, body.expires_at) for b in builds]
+    return targets
+
+
+def _override_row(server_name: str, project: str, build: str, days: int, expires_at: datetime | None) -> dict:
+    return {
+        "server_name": server_name,
+        "project_name": project,
+        "build_number": build,
+        "retention_days": days,
+        "expires_at": expires_at,
+    }
+
+
+def _expiry(expires_at: datetime | None) -> datetime | None:
+    """expires_at as naive UTC (the DB's timestamps), rejecting past ones."""
+    if expires_at is None:
+        return None
+    if expires_at.tzinfo is not None:
+        expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if expires_at <= datetime.utcnow():
+        raise HTTPException(status_code=400, detail="expires_at is in the past")
+    return expires_at
+
+
+def _parse_fields(fields: str, model: type[BaseModel]) -> set[str] | None:
+    """?fields=a,b as an include set for model_dump_json; None selects every field."""
+    names = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = names - model.model_fields.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return names or None
+
+
+def _stream(
+    items: Iterable[BaseModel], include: set[str] | None, format: str,
+    head: str | None = None, tail: str = "]", headers: dict | None = None,
+) -> StreamingResponse:
+    """Serialize items lazily, _STREAM_CHUNK at a time, as a JSON array or as NDJSON.
+
+    head/tail wrap the JSON array (default a bare array); as NDJSON head is the first line."""
+    def json_body() -> Iterator[str]:
+        yield "[" if head is None else head
+        sep = ""
+        for batch in _chunks(items):
+            yield sep + ",".join(item.model_dump_json(include=include) for item in batch)
+            sep = ","
+        yield tail
+
+    def ndjson_body() -> Iterator[str]:
+        if head is not None:
+            yield head + "\n"
+        for batch in _chunks(items):
+            yield "".join(item.model_dump_json(include=include) + "\n" for item in batch)
+
+    if format == "ndjson":
+        return StreamingResponse(ndjson_body(), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(json_body(), media_type="application/json", headers=headers)
+
+
+def _chunks(items: Iterable) -> Iterator[list]:
+    it = iter(items)
+    while batch := list(islice(it, _STREAM_CHUNK)):
+        yield batch
+
+
 def _find_server(config, server_name: str):
     """Find server by name, or return first server."""
     if server_name:
@@ -1,11 +1,11 @@
+import heapq
 import threading
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from ..auth import get_current_user
+from ..auth import get_current_role, get_current_user
 from ..database import SessionLocal, get_db
-from ..models import CleanupLog
 from ..schemas import CleanupStatusResponse, CleanupTriggerRequest
 from ..services import retention_engine
 
@@ -16,38 +16,55 @@ router = APIRouter(prefix="/api/cleanup", tags=["cleanup"])
 def trigger_cleanup(
     request: CleanupTriggerRequest,
     user: str = Depends(get_current_user),
+    role: str = Depends(get_current_role),
     db: Session = Depends(get_db),
 ):
-    if retention_engine.is_running():
-        raise HTTPException(status_code=409, detail="Cleanup already in progress")
+    if request.profile and role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required for profiling")
 
     if request.dry_run:
-        # Run dry_run synchronously
-        run = retention_engine.run_cleanup(db, trigger="manual", dry_run=True)
-        # Return deletion targets inline
-        logs = db.query(CleanupLog).filter(CleanupLog.run_id == run.id).order_by(CleanupLog.score).all()
+        # Simulated in memory; the DB is only written when persist/profile is requested
+        plans, run = retention_engine.simulate_cleanup(
+            db, trigger="manual", persist=request.persist, profile=request.profile
+        )
+        all_targets = list(heapq.merge(*(p["targets"] for p in plans), key=lambda t: t["score"]))
+        offset = (request.page - 1) * request.page_size
         targets = [
             {
-                "project": log.project_name,
-                "build_number": log.build_number,
-                "retention_type": log.retention_type,
-                "age_days": round(log.age_days, 1),
-                "score": round(log.score, 1),
+                "server": t["server"],
+                "project": t["project"],
+                "build_number": t["build_number"],
+                "action": t["action"],
+                "quota": t["quota"],
+                "retention_type": t["retention_type"],
+                "age_days": round(t["age_days"], 1),
+                "score": round(t["score"], 1),
+                "size_bytes": t["size_bytes"],
+                "usage_after": round(t["usage_after"], 2),
             }
-            for log in logs
+            for t in all_targets[offset:offset + request.page_size]
         ]
         return {
             "message": "Dry run completed",
-            "run_id": run.id,
-            "builds_deleted": run.builds_deleted,
+            "run_id": run.id if run else None,
+            "builds_deleted": sum(p["builds_deleted"] for p in plans),
+            "builds_compressed": sum(p["builds_compressed"] for p in plans),
+            "builds_over_quota": sum(p["builds_over_quota"] for p in plans),
             "targets": targets,
+            "total": len(all_targets),
+            "page": request.page,
+            "page_size": request.page_size,
+            "servers": [{k: v for k, v in p.items() if k != "targets"} for p in plans],
         }
 
+    if retention_engine.is_running():
+        raise HTTPException(status_code=409, detail="Cleanup already in progress")
+
     # Run actual cleanup in background thread
     def _run():
         session = SessionLocal()
         try:
-            retention_engine.run_cleanup(session, trigger="manual", dry_run=False)
+            retention_engine.run_cleanup(session, trigger="manual", dry_run=False, profile=request.profile)
         except Exception:
             pass
         finally:
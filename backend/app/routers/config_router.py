@@ -1,18 +1,30 @@
 import logging
+from datetime import datetime
 
 import httpx
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
 
 from ..auth import get_current_user, require_admin
 from ..config import (
+    AppConfig,
     BinaryServerConfig,
     CustomProject,
     RetentionConfig,
+    RetentionRule,
     get_config,
     save_config,
 )
-from ..schemas import ConfigResponse, ConfigUpdate, RetentionConfigSchema
-from ..services.scheduler_service import reschedule
+from ..database import get_db
+from ..schemas import (
+    AgentThrottleUpdate,
+    ConfigResponse,
+    ConfigUpdate,
+    PolicyServerComparison,
+    PolicySimulationResponse,
+    RetentionConfigSchema,
+)
+from ..services import catalog_service, disk_agent_service, retention_engine, simulation_service
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +46,49 @@ def get_current_config(user: str = Depends(get_current_user)):
 
 @router.put("")
 def update_config(update: ConfigUpdate, user: str = Depends(require_admin)):
-    config = get_config()
+    save_config(_apply_update(get_config(), update))  # listeners rebuild what depends on changed servers
+    return {"message": "Configuration updated"}
+
+
+@router.post("/simulate", response_model=PolicySimulationResponse)
+def simulate_config(
+    update: ConfigUpdate,
+    user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Evaluate a proposed config against every server's build catalog without saving it.
+
+    Each evaluation scores the server's whole catalog in Python, about half a second per
+    300k builds; servers whose policy the proposal leaves unchanged are evaluated once."""
+    current = get_config()
+    proposed = _apply_update(current, update)
+    current_servers = {s.name: s for s in current.binary_servers}
+    same_default = proposed.retention.default_days == current.retention.default_days
+    now = datetime.utcnow()
+
+    results = []
+    for server in proposed.binary_servers:
+        table = retention_engine.load_build_table(server, db)
+        disk_info = catalog_service.get_disk_usage(server, db)
+        proposed_impact = simulation_service.evaluate_policy(
+            server, table, disk_info, proposed.retention.default_days, now
+        )
+        current_impact = None
+        if same_default and current_servers.get(server.name) == server:
+            current_impact = {**proposed_impact, "projects": []}
+        elif server.name in current_servers:
+            current_impact = simulation_service.evaluate_policy(
+                current_servers[server.name], table, disk_info, current.retention.default_days, now,
+                include_projects=False,
+            )
+        results.append(PolicyServerComparison(name=server.name, current=current_impact, proposed=proposed_impact))
+
+    return PolicySimulationResponse(servers=results)
+
+
+def _apply_update(config: AppConfig, update: ConfigUpdate) -> AppConfig:
+    """Return a copy of config with the update applied; config itself is left untouched."""
+    config = config.model_copy()
 
     if update.binary_servers is not None:
         config.binary_servers = [
@@ -45,17 +99,22 @@ def update_config(update: ConfigUpdate, user: str = Depends(require_admin)):
                 project_depth=s.project_depth,
                 trigger_threshold_percent=s.trigger_threshold_percent,
                 target_threshold_percent=s.target_threshold_percent,
+                emergency_threshold_percent=s.emergency_threshold_percent,
+                cold_band_days=s.cold_band_days,
+                project_max_bytes=s.project_max_bytes,
+                project_max_builds=s.project_max_builds,
                 check_interval_minutes=s.check_interval_minutes,
                 custom_projects=[
-                    CustomProject(path=cp.path, retention_days=cp.retention_days)
+                    CustomProject(
+                        path=cp.path, retention_days=cp.retention_days, max_bytes=cp.max_bytes,
+                        max_builds=cp.max_builds,
+                    )
                     for cp in s.custom_projects
                 ],
+                rules=[RetentionRule(**r.model_dump()) for r in s.rules],
             )
             for s in update.binary_servers
         ]
-        # Reschedule with shortest interval
-        intervals = [s.check_interval_minutes for s in config.binary_servers] or [5]
-        reschedule(min(intervals))
 
     if update.retention is not None:
         config.retention = RetentionConfig(
@@ -64,8 +123,7 @@ def update_config(update: ConfigUpdate, user: str = Depends(require_admin)):
             log_retention_days=update.retention.log_retention_days,
         )
 
-    save_config(config)
-    return {"message": "Configuration updated"}
+    return config
 
 
 @router.post("/test-connection")
@@ -77,27 +135,46 @@ def test_connection(user: str = Depends(require_admin)):
     for server in config.binary_servers:
         result = {"name": server.name, "disk_agent": {"ok": False, "message": ""}}
 
-        # Test Disk Agent health
+        # Test Disk Agent health (a probe: also closes an open circuit when the agent answers)
         try:
-            resp = httpx.get(f"{server.disk_agent_url.rstrip('/')}/health", timeout=3)
-            resp.raise_for_status()
+            disk_agent_service.check_health(server)
             result["disk_agent"] = {"ok": True, "message": "Connected"}
         except Exception as e:
             result["disk_agent"] = {"ok": False, "message": str(e)}
+        result["circuit"] = disk_agent_service.agent_status(server)
 
-        # Test file listing
+        # Test file listing (through the circuit breaker: skipped while the circuit is open)
         try:
-            resp = httpx.get(
-                f"{server.disk_agent_url.rstrip('/')}/files/list",
-                params={"path": "", "depth": 1},
-                timeout=3,
-            )
-            resp.raise_for_status()
-            entries = resp.json().get("entries", [])
-            result["file_list"] = {"ok": True, "message": f"{len(entries)} directories found"}
+            count = disk_agent_service.check_listing(server)
+            result["file_list"] = {"ok": True, "message": f"{count} directories found"}
         except Exception as e:
             result["file_list"] = {"ok": False, "message": str(e)}
 
         results.append(result)
 
     return results
+
+
+@router.get("/servers/{name}/throttle")
+def get_agent_throttle(name: str, user: str = Depends(require_admin)):
+    """Disk agent I/O priority, rate limits and throttling counters."""
+    try:
+        return disk_agent_service.get_throttle(_find_server(name))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Disk agent error: {e}")
+
+
+@router.put("/servers/{name}/throttle")
+def update_agent_throttle(name: str, update: AgentThrottleUpdate, user: str = Depends(require_admin)):
+    """Change a disk agent's I/O priority / rate limits at runtime (not persisted in config)."""
+    try:
+        return disk_agent_service.update_throttle(_find_server(name), update.model_dump(exclude_none=True))
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Disk agent error: {e}")
+
+
+def _find_server(name: str) -> BinaryServerConfig:
+    for server in get_config().binary_servers:
+        if server.name == name:
+            return server
+    raise HTTPException(status_code=404, detail="Server not found")
@@ -5,8 +5,8 @@ from ..auth import get_current_user
 from ..config import get_config
 from ..database import get_db
 from ..models import CleanupRun
-from ..schemas import DashboardStats, DiskUsage, ServerStats
-from ..services import disk_agent_service
+from ..schemas import AgentStatus, DashboardStats, DiskUsage, ServerStats
+from ..services import catalog_service, disk_agent_service
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
@@ -17,21 +17,23 @@ def get_stats(user: str = Depends(get_current_user), db: Session = Depends(get_d
 
     server_stats = []
     for server in config.binary_servers:
-        disk_info = disk_agent_service.get_disk_usage(server)
-        disk = DiskUsage(**disk_info)
+        disk = DiskUsage(**catalog_service.get_disk_usage(server, db))
 
-        projects = disk_agent_service.list_projects(server)
-        build_count = 0
-        for project in projects:
-            builds = disk_agent_service.list_builds(server, project)
-            build_count += len(builds)
+        rollups = catalog_service.get_rollups(server, db)
+        top_level = [r for r in rollups if r.level == 1]
 
         server_stats.append(
             ServerStats(
                 name=server.name,
                 disk=disk,
-                project_count=len(projects),
-                build_count=build_count,
+                project_count=sum(1 for r in rollups if r.level == server.project_depth),
+                build_count=sum(r.builds for r in top_level),
+                total_size_bytes=sum(r.size_bytes for r in top_level),
+                unsized_build_count=sum(r.unsized_builds for r in top_level),
+                agent=AgentStatus(
+                    **disk_agent_service.agent_status(server),
+                    synced_at=catalog_service.last_synced_at(server, db),
+                ),
             )
         )
 
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
 from ..auth import get_current_user
 from ..database import get_db
+from ..models import CleanupProfile
 from ..schemas import CleanupLogResponse, CleanupRunResponse, PaginatedLogs
 from ..services import cleanup_log_service
 
@@ -17,6 +19,7 @@ def list_runs(
     db: Session = Depends(get_db),
 ):
     runs, _ = cleanup_log_service.get_runs(db, limit=limit, offset=offset)
+    profiled = cleanup_log_service.get_profiled_run_ids(db, [r.id for r in runs])
     return [
         CleanupRunResponse(
             id=r.id,
@@ -30,11 +33,29 @@ def list_runs(
             bytes_freed=r.bytes_freed,
             status=r.status,
             error_message=r.error_message,
+            has_profile=r.id in profiled,
         )
         for r in runs
     ]
 
 
+@router.get("/runs/{run_id}/profile", response_class=PlainTextResponse)
+def download_profile(
+    run_id: int,
+    format: str = Query("collapsed", pattern="^(collapsed|summary)$"),
+    user: str = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Download a run's profile: collapsed stacks (flamegraph.pl / speedscope) or a text summary."""
+    profile = db.query(CleanupProfile).filter(CleanupProfile.run_id == run_id).first()
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile for this run")
+
+    body = profile.collapsed_stacks if format == "collapsed" else profile.summary
+    filename = f"cleanup-run-{run_id}.{'folded' if format == 'collapsed' else 'txt'}"
+    return PlainTextResponse(body, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
 @router.get("", response_model=PaginatedLogs)
 def list_logs(
     run_id: int | None = Query(None),
@@ -57,6 +78,7 @@ def list_logs(
                 age_days=log.age_days,
                 size_bytes=log.size_bytes,
                 score=log.score,
+                action=log.action,
                 dry_run=log.dry_run,
             )
             for log in logs
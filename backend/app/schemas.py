@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # Auth
@@ -24,11 +24,22 @@ class DiskUsage(BaseModel):
     usage_percent: float
 
 
+class AgentStatus(BaseModel):
+    state: str = "closed"  # circuit breaker: closed | open | half_open
+    failures: int = 0
+    last_error: Optional[str] = None
+    retry_in_seconds: float = 0
+    synced_at: Optional[datetime] = None  # last successful build catalog sync
+
+
 class ServerStats(BaseModel):
     name: str
     disk: DiskUsage
     project_count: int
     build_count: int
+    total_size_bytes: int = 0  # cached build sizes only, see unsized_build_count
+    unsized_build_count: int = 0
+    agent: AgentStatus = AgentStatus()
 
 
 class DashboardStats(BaseModel):
@@ -47,6 +58,8 @@ class BuildInfo(BaseModel):
     expired: bool
     size_bytes: int = 0
     has_override: bool = False
+    compressed: bool = False
+    protected: bool = False  # kept by a retention rule
 
 
 class ProjectInfo(BaseModel):
@@ -57,6 +70,10 @@ class ProjectInfo(BaseModel):
     oldest_build: Optional[str] = None
     newest_build: Optional[str] = None
     server: str = ""
+    total_size_bytes: int = 0
+    unsized_build_count: int = 0
+    oldest_modified_at: Optional[datetime] = None
+    newest_modified_at: Optional[datetime] = None
 
 
 class ProjectDetail(BaseModel):
@@ -64,12 +81,74 @@ class ProjectDetail(BaseModel):
     retention_days: int
     is_custom: bool
     builds: list[BuildInfo]
+    total: int = 0  # builds in the project; builds holds one page of them
+    page: int = 1
+    page_size: int = 0  # 0: all builds
+
+
+class RetentionOverrideItem(BaseModel):
+    server: str = ""  # "" = first server
+    project: str
+    build: str
+    retention_days: Optional[int] = None  # None: the request's retention_days
+    expires_at: Optional[datetime] = None  # None: the request's expires_at
+
+
+class BulkRetentionRequest(BaseModel):
+    """Builds to set (or remove) overrides for: the listed items, plus, when project is given,
+    that project's cataloged builds matching pattern (glob) within [first_build, last_build]."""
+
+    items: list[RetentionOverrideItem] = Field([], max_length=10000)
+    server: str = ""
+    project: Optional[str] = None
+    pattern: str = "*"
+    first_build: Optional[str] = None
+    last_build: Optional[str] = None
+    retention_days: Optional[int] = None  # ignored on removal
+    expires_at: Optional[datetime] = None  # naive UTC; the override is ignored after it
+
+
+class BulkRetentionResponse(BaseModel):
+    builds: int  # overrides set or removed
+
+
+class BuildRef(BaseModel):
+    project: str
+    build: str
+
+
+class DeleteJobRequest(BaseModel):
+    server: str = ""  # "" = first server
+    builds: list[BuildRef] = Field(min_length=1, max_length=10000)
+
+
+class DeleteJobStatus(BaseModel):
+    id: str
+    server: str
+    state: str  # queued|running|completed|failed
+    total: int
+    deleted: int
+    failed: list[str]  # project/build not deleted (including builds missing from the catalog)
+    bytes_freed: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 
 # Config
 class CustomProjectSchema(BaseModel):
     path: str
     retention_days: int
+    max_bytes: Optional[int] = Field(None, ge=0)
+    max_builds: Optional[int] = Field(None, ge=0)
+
+
+class RetentionRuleSchema(BaseModel):
+    projects: str = "*"
+    builds: str = "*"
+    keep_last: int = Field(0, ge=0)
+    protect: bool = False
+    extra_days: int = 0
 
 
 class BinaryServerSchema(BaseModel):
@@ -79,8 +158,13 @@ class BinaryServerSchema(BaseModel):
     project_depth: int = 1
     trigger_threshold_percent: int = 90
     target_threshold_percent: int = 80
+    emergency_threshold_percent: int = 98
+    cold_band_days: int = Field(0, ge=0)
+    project_max_bytes: int = Field(0, ge=0)
+    project_max_builds: int = Field(0, ge=0)
     check_interval_minutes: int = 5
     custom_projects: list[CustomProjectSchema] = []
+    rules: list[RetentionRuleSchema] = []
 
 
 class RetentionConfigSchema(BaseModel):
@@ -99,9 +183,56 @@ class ConfigResponse(BaseModel):
     retention: RetentionConfigSchema
 
 
+class PolicyImpact(BaseModel):
+    builds: int
+    bytes: int
+    expired_builds: int
+    expired_bytes: int
+    deletable_builds: int
+    deletable_bytes: int
+
+
+class PolicyProjectImpact(PolicyImpact):
+    project: str
+    retention_days: int
+    is_custom: bool
+    steady_state_bytes: int
+
+
+class PolicyServerImpact(PolicyImpact):
+    name: str
+    usage_percent: float
+    would_trigger: bool
+    usage_after_cleanup: float
+    steady_state_usage_percent: float
+    projects: list[PolicyProjectImpact] = []
+
+
+class PolicyServerComparison(BaseModel):
+    name: str
+    current: Optional[PolicyServerImpact] = None  # None for servers that only exist in the proposal
+    proposed: PolicyServerImpact
+
+
+class PolicySimulationResponse(BaseModel):
+    servers: list[PolicyServerComparison]
+
+
 # Cleanup
+class AgentThrottleUpdate(BaseModel):
+    files_per_second: Optional[float] = Field(None, ge=0)  # 0 = unlimited
+    bytes_per_second: Optional[float] = Field(None, ge=0)
+    io_class: Optional[str] = Field(None, pattern="^(none|best-effort|idle)$")
+    io_level: Optional[int] = Field(None, ge=0, le=7)
+    nice: Optional[int] = Field(None, ge=0, le=19)
+
+
 class CleanupTriggerRequest(BaseModel):
     dry_run: bool = False
+    profile: bool = False  # admin only: sample the run and store a flamegraph profile
+    persist: bool = False  # dry run only: record the simulated run and its targets in the DB
+    page: int = Field(1, ge=1)  # dry run only: page of the score-ordered target list
+    page_size: int = Field(500, ge=1, le=5000)
 
 
 class CleanupStatusResponse(BaseModel):
@@ -122,6 +253,7 @@ class CleanupRunResponse(BaseModel):
     bytes_freed: int
     status: str
     error_message: Optional[str]
+    has_profile: bool = False
 
 
 # Logs
@@ -137,6 +269,7 @@ class CleanupLogResponse(BaseModel):
     size_bytes: int
     score: float
     dry_run: bool
+    action: str = "delete"
 
 
 class PaginatedLogs(BaseModel):
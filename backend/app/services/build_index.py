@@ -0,0 +1,347 @@
+"""Build records and the columnar build index used for bulk scoring."""
+
+import re
+import sys
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import repeat
+from typing import Literal
+
+from ..config import RetentionRule
+
+_NO_OVERRIDE = -1
+_UNKNOWN_SIZE = -1
+_EPOCH = datetime(1970, 1, 1)
+
+UPLOAD_GRACE_DAYS = 10 / 1440  # builds modified in the last 10 minutes may still be uploading
+COMPRESSED_FRACTION = 0.4  # assumed archive size / build size when planning a compression
+
+
+def to_epoch(dt: datetime) -> float:
+    """Naive-UTC datetime to epoch seconds."""
+    return (dt - _EPOCH).total_seconds()
+
+
+@dataclass(frozen=True, slots=True)
+class BuildRecord:
+    """One build directory as listed by the disk agent.
+
+    Server and project names are interned, so the thousands of records of a
+    project share a single string object for each. exclusive_bytes is what deleting
+    the build frees: its size minus files still hard-linked from other builds.
+    A compressed build was replaced by a tarball in place; its sizes are the archive's."""
+
+    server: str
+    project: str
+    build_number: str
+    modified_at: datetime  # naive UTC
+    size_bytes: int | None = None
+    exclusive_bytes: int | None = None
+    compressed: bool = False
+
+    @classmethod
+    def create(
+        cls, server: str, project: str, build_number: str, modified_at: datetime, size_bytes: int | None = None,
+        exclusive_bytes: int | None = None, compressed: bool = False,
+    ) -> "BuildRecord":
+        return cls(
+            sys.intern(server), sys.intern(project), build_number, modified_at, size_bytes, exclusive_bytes, compressed
+        )
+
+    @property
+    def freed_bytes(self) -> int | None:
+        """Bytes deleting the build frees; the plain size when the agent reported no exclusive size."""
+        return self.size_bytes if self.exclusive_bytes is None else self.exclusive_bytes
+
+    @property
+    def compression_savings(self) -> int | None:
+        """Estimated bytes compressing the build frees: what deleting it frees, minus the archive left behind."""
+        if self.size_bytes is None:
+            return None
+        return self.freed_bytes - int(self.size_bytes * COMPRESSED_FRACTION)
+
+
+@dataclass(frozen=True, slots=True)
+class ScoredBuild:
+    """A build with the retention values the engine scored it with."""
+
+    build: BuildRecord
+    age_days: float
+    retention_days: int
+    is_custom: bool
+    score: float
+    protected: bool = False  # kept by a retention rule whatever its score
+
+    @property
+    def server(self) -> str:
+        return self.build.server
+
+    @property
+    def project(self) -> str:
+        return self.build.project
+
+    @property
+    def build_number(self) -> str:
+        return self.build.build_number
+
+    @property
+    def modified_at(self) -> datetime:
+        return self.build.modified_at
+
+    @property
+    def size_bytes(self) -> int | None:
+        return self.build.size_bytes
+
+    @property
+    def freed_bytes(self) -> int | None:
+        return self.build.freed_bytes
+
+    @property
+    def compressed(self) -> bool:
+        return self.build.compressed
+
+    def action(self, cold_band_days: int) -> Literal["compress", "delete"]:
+        """What freeing this build's space means: builds whose score is in the cold band
+        (0 < score <= cold_band_days) are compressed first and deleted once compressed,
+        unless compressing would free nothing (hard links shared with other builds)."""
+        if self.compressed or not 0 < self.score <= cold_band_days:
+            return "delete"
+        savings = self.build.compression_savings
+        return "delete" if savings is not None and savings <= 0 else "compress"
+
+
+def glob_pattern(glob: str) -> re.Pattern:
+    """Case-insensitive regex of a rule glob: * and ? only, like the SQL LIKE it is compiled to."""
+    return re.compile(re.escape(glob).replace(r"\*", ".*").replace(r"\?", "."), re.IGNORECASE | re.DOTALL)
+
+
+def like_pattern(glob: str) -> str:
+    """SQL LIKE pattern (escape character \\) of a rule glob, matching what glob_pattern matches."""
+    for char, escaped in (("\\", "\\\\"), ("%", "\\%"), ("_", "\\_"), ("*", "%"), ("?", "_")):
+        glob = glob.replace(char, escaped)
+    return glob
+
+
+class RetentionRules:
+    """A server's build-aware retention rules (config.RetentionRule), compiled once.
+
+    evaluate() walks one project's builds newest first in a single pass, keeping a running
+    rank per rule among the builds it matches (the keep_last window), and returns each build's
+    protection flag and extra retention days. retention_engine evaluates the same rules in SQL."""
+
+    __slots__ = ("rules",)
+
+    def __init__(self, rules: Sequence[RetentionRule]):
+        self.rules = [(glob_pattern(r.projects), glob_pattern(r.builds), r) for r in rules]
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def evaluate(self, project: str, build_numbers: Sequence[str]) -> tuple[list[bool], list[int]]:
+        """(protected, extra_days) per build of a project, build_numbers ordered newest first."""
+        protected = [False] * len(build_numbers)
+        extra = [0] * len(build_numbers)
+        active = [(builds, r) for projects, builds, r in self.rules if projects.fullmatch(project)]
+        if not active:
+            return protected, extra
+        ranks = [0] * len(active)
+        for i, name in enumerate(build_numbers):
+            for k, (builds, rule) in enumerate(active):
+                if not builds.fullmatch(name):
+                    continue
+                ranks[k] += 1
+                if rule.protect or ranks[k] <= rule.keep_last:
+                    protected[i] = True
+                extra[i] += rule.extra_days
+        return protected, extra
+
+
+class BuildTable:
+    """All builds of one server as columns, indexed by row number.
+
+    Columns are stdlib arrays; per-build values (ages, scores) are single comprehension
+    passes over them, still one Python step per build. Per-project values (retention,
+    custom flag) are computed once per project and broadcast through project_ids. A
+    project's rows are contiguous (project_starts), so per-project totals are C-level
+    sums over slices. Rows are only turned into BuildRecords on demand via row()."""
+
+    __slots__ = (
+        "server", "projects", "project_ids", "project_starts", "build_numbers", "mtimes", "sizes", "exclusive",
+        "override_days", "compressed",
+    )
+
+    def __init__(self, server: str):
+        self.server = server
+        self.projects: list[str] = []
+        self.project_ids = array("I")
+        self.project_starts = array("I")  # first row of each project
+        self.build_numbers: list[str] = []
+        self.mtimes = array("d")  # epoch seconds (UTC)
+        self.sizes = array("q")  # bytes, -1 when unknown
+        self.exclusive = array("q")  # bytes freed by deleting the build, -1 when unknown
+        self.override_days = array("i")  # -1 when the build has no override
+        self.compressed = array("b")  # 1 when the build was compressed in place
+
+    def __len__(self) -> int:
+        return len(self.build_numbers)
+
+    @classmethod
+    def from_listings(
+        cls,
+        server: str,
+        listings: dict[str, list[BuildRecord]],
+        overrides: dict[tuple[str, str], int] | None = None,
+    ) -> "BuildTable":
+        """Build the table from {project: [records]} as returned by disk_agent_service.list_builds."""
+        overrides = overrides or {}
+        table = cls(server)
+        for project, builds in listings.items():
+            pid = len(table.projects)
+            table.projects.append(sys.intern(project))
+            table.project_starts.append(len(table.build_numbers))
+            numbers = [b.build_number for b in builds]
+            sizes = [b.size_bytes for b in builds]
+            freed = [b.freed_bytes for b in builds]
+            table.project_ids.extend(repeat(pid, len(builds)))
+            table.build_numbers.extend(numbers)
+            table.mtimes.extend([(b.modified_at - _EPOCH).total_seconds() for b in builds])
+            table.sizes.extend([_UNKNOWN_SIZE if size is None else size for size in sizes])
+            table.exclusive.extend([_UNKNOWN_SIZE if size is None else size for size in freed])
+            table.compressed.extend([b.compressed for b in builds])
+            if overrides:
+                table.override_days.extend([overrides.get((project, n), _NO_OVERRIDE) for n in numbers])
+            else:
+                table.override_days.extend(repeat(_NO_OVERRIDE, len(builds)))
+        return table
+
+    def project_spans(self) -> list[tuple[int, int]]:
+        """(start, end) rows of each project, by project id."""
+        return list(zip(self.project_starts, [*self.project_starts[1:], len(self)]))
+
+    # --- Column computations ---
+
+    def ages(self, now: datetime) -> array:
+        """Age of each build in days."""
+        now_ts = to_epoch(now)
+        return array("d", [(now_ts - m) / 86400 for m in self.mtimes])
+
+    def retention(self, project_days: list[int], extra_days: array | None = None) -> array:
+        """Effective retention per build: override, else the project's retention plus the
+        build's extra days from the retention rules (see apply_rules)."""
+        if extra_days is None:
+            extra_days = repeat(0)
+        return array("i", [
+            o if o != _NO_OVERRIDE else project_days[p] + e
+            for o, p, e in zip(self.override_days, self.project_ids, extra_days)
+        ])
+
+    def apply_rules(self, rules: RetentionRules) -> tuple[array, array]:
+        """Protection flags and extra retention days per build, evaluating the rules once per
+        project over its builds sorted newest first (ties by build number, as in SQL)."""
+        protected = array("b", repeat(0, len(self)))
+        extra = array("i", repeat(0, len(self)))
+        if not rules:
+            return protected, extra
+        rows: list[list[int]] = [[] for _ in self.projects]
+        for i, pid in enumerate(self.project_ids):
+            rows[pid].append(i)
+        for pid, project_rows in enumerate(rows):
+            project_rows.sort(key=lambda i: (self.mtimes[i], self.build_numbers[i]), reverse=True)
+            flags, days = rules.evaluate(self.projects[pid], [self.build_numbers[i] for i in project_rows])
+            for i, flag, e in zip(project_rows, flags, days):
+                protected[i] = flag
+                extra[i] = e
+        return protected, extra
+
+    def scores(self, retention: array, ages: array) -> array:
+        """Remaining days per build (see retention_engine.compute_score)."""
+        return array("d", [r - a for r, a in zip(retention, ages)])
+
+    def average_size(self) -> int:
+        """Average of the known build sizes, 0 when none are known."""
+        known = [s for s in self.sizes if s != _UNKNOWN_SIZE]
+        return sum(known) // len(known) if known else 0
+
+    def filled_sizes(self) -> array:
+        """Sizes with unknown entries replaced by the average known size."""
+        fallback = self.average_size()
+        return array("q", [s if s != _UNKNOWN_SIZE else fallback for s in self.sizes])
+
+    def average_freed(self) -> int:
+        """Average of the known freed (exclusive) sizes, 0 when none are known."""
+        known = [s for s in self.exclusive if s != _UNKNOWN_SIZE]
+        return sum(known) // len(known) if known else 0
+
+    def filled_freed(self) -> array:
+        """Freed sizes with unknown entries replaced by the average known freed size."""
+        fallback = self.average_freed()
+        return array("q", [s if s != _UNKNOWN_SIZE else fallback for s in self.exclusive])
+
+    @staticmethod
+    def argsort(values: array, rows=None) -> list[int]:
+        """Row indices ordered by ascending value, optionally restricted to `rows`."""
+        return sorted(range(len(values)) if rows is None else rows, key=values.__getitem__)
+
+    # --- Lazy row access ---
+
+    def row(self, i: int) -> BuildRecord:
+        size = self.sizes[i]
+        exclusive = self.exclusive[i]
+        return BuildRecord(
+            self.server,
+            self.projects[self.project_ids[i]],
+            self.build_numbers[i],
+            _EPOCH + timedelta(seconds=self.mtimes[i]),
+            None if size == _UNKNOWN_SIZE else size,
+            None if exclusive == _UNKNOWN_SIZE else exclusive,
+            bool(self.compressed[i]),
+        )
+
+    def has_override(self, i: int) -> bool:
+        return self.override_days[i] != _NO_OVERRIDE
+
+
+class ScoredBuilds:
+    """Score-ordered view over a BuildTable.
+
+    Holds only the row order and the score columns; a build becomes a ScoredBuild
+    when it is reached while iterating, so a cleanup that stops at its target
+    never materializes the builds it keeps."""
+
+    __slots__ = ("table", "order", "ages", "retention", "scores", "custom")
+
+    def __init__(self, table: BuildTable, order: list[int], ages: array, retention: array,
+                 scores: array, custom: list[bool]):
+        self.table = table
+        self.order = order
+        self.ages = ages
+        self.retention = retention
+        self.scores = scores
+        self.custom = custom  # per project id
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self):
+        for i in self.order:
+            yield self.row(i)
+
+    def __getitem__(self, position: int) -> ScoredBuild:
+        return self.row(self.order[position])
+
+    def row(self, i: int) -> ScoredBuild:
+        return ScoredBuild(
+            self.table.row(i),
+            self.ages[i],
+            self.retention[i],
+            self.custom[self.table.project_ids[i]],
+            self.scores[i],
+        )
+
+    def average_size(self) -> int:
+        return self.table.average_size()
+
+    def average_freed(self) -> int:
+        return self.table.average_freed()
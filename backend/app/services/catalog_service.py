@@ -0,0 +1,325 @@
+"""Build catalog - persistent copy of every agent's builds, synced from the agents' change journals.
+
+Routers and the retention engine read builds, sizes, rollups and disk usage from
+here; agents are only contacted by the sync job and for deletes."""
+
+import calendar
+import logging
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Literal
+
+from sqlalchemy import Row, and_, delete, false, func, or_, select, tuple_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import BinaryServerConfig, get_config
+from ..models import Build, BuildCatalogSync, ProjectRollup
+from . import disk_agent_service
+from .build_index import UPLOAD_GRACE_DAYS, BuildRecord
+
+logger = logging.getLogger(__name__)
+
+_BATCH = 1000  # rows per bulk statement
+_sync_lock = threading.Lock()  # the scheduler and a cleanup may both ask for a sync
+
+
+def epoch_seconds(dt: datetime) -> int:
+    """Unix seconds of a naive UTC datetime (Build.modified_epoch)."""
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _batches(items: list, size: int = _BATCH):
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+# --- Sync ---
+
+def sync_all(db: Session, servers: list[BinaryServerConfig] | None = None) -> None:
+    """Sync every configured server (or the given ones), logging (not raising) per-server failures."""
+    for server in get_config().binary_servers if servers is None else servers:
+        try:
+            sync_server(server, db)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Build catalog sync failed for %s: %s", server.name, e)
+
+
+def sync_server(server: BinaryServerConfig, db: Session) -> int:
+    """Apply the agent's journal changes since the stored position. Returns the number of changes."""
+    with _sync_lock:
+        agent_key = f"{server.disk_agent_url}|{server.project_depth + 1}"
+        state = db.get(BuildCatalogSync, server.name)
+        if state is None:
+            state = BuildCatalogSync(server_name=server.name, agent_key=agent_key)
+            db.add(state)
+        if state.agent_key != agent_key:
+            state.agent_key, state.epoch, state.seq = agent_key, "", 0
+
+        payload = disk_agent_service.fetch_changes(server, state.epoch or "", state.seq or 0)
+        if payload["changes"]:
+            disk_agent_service.invalidate_cache()  # cached listings and rollups predate the changes
+        now = datetime.utcnow()
+        if payload["reset"]:
+            logger.info("Full build catalog resync for %s (%d builds)", server.name, len(payload["changes"]))
+            db.execute(delete(Build).where(Build.server_name == server.name))
+
+        removed: list[tuple[str, str]] = []
+        upserts: dict[tuple[str, str], dict] = {}
+        for change in payload["changes"]:
+            project, _, build = change["path"].rpartition("/")
+            if change["op"] == "remove":
+                removed.append((project, build))
+                upserts.pop((project, build), None)
+            else:
+                upserts[(project, build)] = _row(disk_agent_service.parse_change(server, change), now)
+        for batch in _batches(removed):
+            db.execute(delete(Build).where(
+                Build.server_name == server.name,
+                tuple_(Build.project_name, Build.build_number).in_(batch),
+            ))
+        _upsert(db, list(upserts.values()))
+
+        disk = disk_agent_service.get_disk_usage(server)
+        state.epoch, state.seq, state.synced_at = payload["epoch"], payload["seq"], now
+        state.total_bytes, state.used_bytes = disk["total_bytes"], disk["used_bytes"]
+        state.free_bytes, state.usage_percent = disk["free_bytes"], disk["usage_percent"]
+        db.commit()
+
+        # Sizes: projects with unmeasured builds, and those that lost builds (hard links they
+        # shared may now be exclusive to the remaining ones)
+        _fill_sizes(server, db, {project for project, _ in removed})
+        _sync_rollups(server, db)
+        return len(payload["changes"])
+
+
+def _row(record: BuildRecord, now: datetime) -> dict:
+    return {
+        "server_name": record.server,
+        "project_name": record.project,
+        "build_number": record.build_number,
+        "modified_at": record.modified_at,
+        "modified_epoch": epoch_seconds(record.modified_at),
+        "size_bytes": record.size_bytes,
+        "exclusive_bytes": record.exclusive_bytes,
+        "compressed": record.compressed,
+        "last_seen": now,
+    }
+
+
+def _upsert(db: Session, rows: list[dict]) -> None:
+    """Insert builds, updating the existing row on (server, project, build) conflicts."""
+    updated = ("modified_at", "modified_epoch", "size_bytes", "exclusive_bytes", "compressed", "last_seen")
+    dialect = db.get_bind().dialect.name
+    for batch in _batches(rows):
+        if dialect == "mysql":
+            stmt = mysql_insert(Build).values(batch)
+            stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in updated})
+        else:
+            stmt = sqlite_insert(Build).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["server_name", "project_name", "build_number"],
+                set_={c: stmt.excluded[c] for c in updated},
+            )
+        db.execute(stmt)
+
+
+def _fill_sizes(server: BinaryServerConfig, db: Session, projects: set[str]) -> None:
+    """Fetch agent-measured sizes for the given projects and those with unsized settled builds."""
+    settled = datetime.utcnow() - timedelta(days=UPLOAD_GRACE_DAYS)
+    unsized = db.query(Build.project_name).filter(
+        Build.server_name == server.name, Build.size_bytes.is_(None), Build.modified_at < settled,
+    ).distinct()
+    projects = projects | {p for (p,) in unsized}
+
+    for project in sorted(projects):
+        sized = {b.build_number: b for b in disk_agent_service.list_builds(server, project, with_sizes=True)}
+        rows = db.query(Build.id, Build.build_number, Build.size_bytes, Build.exclusive_bytes).filter(
+            Build.server_name == server.name, Build.project_name == project,
+        ).all()
+        changes = [
+            {"id": r.id, "size_bytes": b.size_bytes, "exclusive_bytes": b.exclusive_bytes}
+            for r in rows
+            if (b := sized.get(r.build_number)) is not None
+            and (b.size_bytes, b.exclusive_bytes) != (r.size_bytes, r.exclusive_bytes)
+        ]
+        if changes:
+            db.execute(update(Build), changes)
+    db.commit()
+
+
+def _sync_rollups(server: BinaryServerConfig, db: Session) -> None:
+    rollups = disk_agent_service.get_rollups(server)
+    if not rollups:
+        return  # agent unreachable; keep the previous rollups
+    db.execute(delete(ProjectRollup).where(ProjectRollup.server_name == server.name))
+    db.add_all([
+        ProjectRollup(
+            server_name=server.name,
+            path=r["path"],
+            level=r["level"],
+            builds=r["builds"],
+            size_bytes=r["size_bytes"],
+            unsized_builds=r["unsized_builds"],
+            oldest_modified_at=r["oldest_modified_at"],
+            newest_modified_at=r["newest_modified_at"],
+            first_build=r.get("first_build"),
+            last_build=r.get("last_build"),
+        )
+        for r in rollups.values()
+    ])
+    db.commit()
+
+
+# --- Queries ---
+
+def load_listings(server: BinaryServerConfig, db: Session) -> dict[str, list[BuildRecord]]:
+    """All cataloged builds of a server as {project: [records]}, sorted by build number."""
+    rows = db.query(
+        Build.project_name, Build.build_number, Build.modified_at, Build.size_bytes, Build.exclusive_bytes,
+        Build.compressed,
+    ).filter(Build.server_name == server.name).order_by(Build.project_name, Build.build_number)
+
+    listings: dict[str, list[BuildRecord]] = {}
+    for r in rows.yield_per(_BATCH):
+        builds = listings.get(r.project_name)
+        if builds is None:
+            builds = listings[r.project_name] = []
+        builds.append(BuildRecord.create(
+            server.name, r.project_name, r.build_number, r.modified_at, r.size_bytes, r.exclusive_bytes, r.compressed
+        ))
+    return listings
+
+
+def list_builds(server: BinaryServerConfig, project: str, db: Session) -> list[BuildRecord]:
+    """Cataloged builds of one project, sorted by build number."""
+    rows = db.query(
+        Build.build_number, Build.modified_at, Build.size_bytes, Build.exclusive_bytes, Build.compressed,
+    ).filter(Build.server_name == server.name, Build.project_name == project).order_by(Build.build_number)
+    return [
+        BuildRecord.create(
+            server.name, project, r.build_number, r.modified_at, r.size_bytes, r.exclusive_bytes, r.compressed
+        )
+        for r in rows
+    ]
+
+
+def count_builds(server: BinaryServerConfig, project: str, db: Session) -> int:
+    return db.query(func.count(Build.id)).filter(
+        Build.server_name == server.name, Build.project_name == project,
+    ).scalar()
+
+
+ProjectSort = Literal["name", "builds", "size", "newest"]
+
+
+def _projects_filter(servers: list[BinaryServerConfig]):
+    """Project-level rollups of the given servers (each server has its own project depth)."""
+    return or_(false(), *(
+        and_(ProjectRollup.server_name == s.name, ProjectRollup.level == s.project_depth) for s in servers
+    ))
+
+
+def count_projects(servers: list[BinaryServerConfig], db: Session) -> int:
+    return db.query(func.count(ProjectRollup.id)).filter(_projects_filter(servers)).scalar()
+
+
+def iter_projects(
+    servers: list[BinaryServerConfig], db: Session, sort: ProjectSort = "name", descending: bool = False,
+    offset: int = 0, limit: int | None = None,
+) -> Iterator[Row]:
+    """A page of project rollup rows (every ProjectRollup column) of the given servers,
+    streamed on a connection of its own."""
+    key = {
+        "name": ProjectRollup.path,
+        "builds": ProjectRollup.builds,
+        "size": ProjectRollup.size_bytes,
+        "newest": ProjectRollup.newest_modified_at,
+    }[sort]
+    stmt = (
+        select(ProjectRollup.__table__)
+        .where(_projects_filter(servers))
+        .order_by(key.desc() if descending else key, ProjectRollup.path, ProjectRollup.server_name)
+        .offset(offset)
+        .limit(limit)
+    )
+    with db.get_bind().connect() as conn:
+        yield from conn.execution_options(yield_per=_BATCH).execute(stmt)
+
+
+def get_rollups(server: BinaryServerConfig, db: Session, level: int | None = None) -> list[ProjectRollup]:
+    query = db.query(ProjectRollup).filter(ProjectRollup.server_name == server.name)
+    if level is not None:
+        query = query.filter(ProjectRollup.level == level)
+    return query.order_by(ProjectRollup.path).all()
+
+
+def get_disk_usage(server: BinaryServerConfig, db: Session) -> dict:
+    """Disk usage recorded at the last sync (zeros before the first one)."""
+    state = db.get(BuildCatalogSync, server.name)
+    if state is None:
+        return {"total_bytes": 0, "used_bytes": 0, "free_bytes": 0, "usage_percent": 0.0}
+    return {
+        "total_bytes": state.total_bytes,
+        "used_bytes": state.used_bytes,
+        "free_bytes": state.free_bytes,
+        "usage_percent": state.usage_percent,
+    }
+
+
+def average_freed(server: BinaryServerConfig, db: Session) -> int:
+    """Average bytes deleting one of the server's measured builds frees (exclusive size, else
+    size, as BuildRecord.freed_bytes), 0 when no build is measured."""
+    freed = func.coalesce(Build.exclusive_bytes, Build.size_bytes)
+    average = db.execute(select(func.avg(freed)).where(Build.server_name == server.name, freed.is_not(None))).scalar()
+    return int(average or 0)
+
+
+def last_synced_at(server: BinaryServerConfig, db: Session) -> datetime | None:
+    state = db.get(BuildCatalogSync, server.name)
+    return state.synced_at if state else None
+
+
+def mark_compressed(server: BinaryServerConfig, project: str, build: str, size_bytes: int, exclusive_bytes: int,
+                    db: Session) -> None:
+    """Record a build compressed through the backend without waiting for the next sync (caller commits)."""
+    db.execute(update(Build).where(
+        Build.server_name == server.name, Build.project_name == project, Build.build_number == build,
+    ).values(compressed=True, size_bytes=size_bytes, exclusive_bytes=exclusive_bytes))
+
+
+def shrink_rollups(
+    server: BinaryServerConfig, project: str, builds: int, size_bytes: int, db: Session, unsized: int = 0,
+) -> None:
+    """Take builds deleted through the backend (unsized of them unmeasured) off the project's
+    rollup and its ancestors', until the next sync replaces them (caller commits). size_bytes
+    is what the deletes freed: exclusive bytes, as the agent's rollup counts hard-linked
+    files once."""
+    parts = project.split("/")
+    paths = ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+    db.execute(update(ProjectRollup).where(
+        ProjectRollup.server_name == server.name, ProjectRollup.path.in_(paths),
+    ).values(
+        builds=ProjectRollup.builds - builds, size_bytes=ProjectRollup.size_bytes - size_bytes,
+        unsized_builds=ProjectRollup.unsized_builds - unsized,
+    ))
+
+
+def remove_build(server: BinaryServerConfig, project: str, build: str, db: Session) -> None:
+    """Drop a build deleted through the backend without waiting for the next sync (caller commits)."""
+    db.execute(delete(Build).where(
+        Build.server_name == server.name, Build.project_name == project, Build.build_number == build,
+    ))
+
+
+def remove_builds(server: BinaryServerConfig, builds: list[tuple[str, str]], db: Session) -> None:
+    """remove_build for many (project, build) pairs, one statement per batch (caller commits)."""
+    for batch in _batches(builds):
+        db.execute(delete(Build).where(
+            Build.server_name == server.name, tuple_(Build.project_name, Build.build_number).in_(batch),
+        ))
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 
-from ..models import CleanupLog, CleanupRun
+from ..models import CleanupLog, CleanupProfile, CleanupRun
 
 
 def get_runs(db: Session, limit: int = 20, offset: int = 0) -> tuple[list[CleanupRun], int]:
@@ -15,6 +15,13 @@ def get_runs(db: Session, limit: int = 20, offset: int = 0) -> tuple[list[Cleanu
     return runs, total
 
 
+def get_profiled_run_ids(db: Session, run_ids: list[int]) -> set[int]:
+    if not run_ids:
+        return set()
+    rows = db.query(CleanupProfile.run_id).filter(CleanupProfile.run_id.in_(run_ids)).all()
+    return {row.run_id for row in rows}
+
+
 def get_logs(
     db: Session,
     run_id: int | None = None,
@@ -0,0 +1,175 @@
+"""Bulk build delete jobs - a list of builds deleted in a background thread through the
+agent's batch delete, with progress that API clients can poll or stream.
+
+Sizes and ages come from the build catalog (no directory walks), and each batch's
+deletions are logged with one bulk CleanupLog insert. Jobs live in memory only."""
+
+import logging
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..config import BinaryServerConfig
+from ..database import SessionLocal
+from ..models import Build, CleanupLog
+from . import catalog_service, disk_agent_service
+from .retention_engine import is_custom_project
+
+logger = logging.getLogger(__name__)
+
+_BATCH = 50  # builds per agent delete-batch call (and per progress update)
+_LOOKUP_BATCH = 1000  # builds per catalog lookup
+_KEEP_FINISHED = 20  # finished jobs kept for status queries
+
+_jobs: dict[str, "DeleteJob"] = {}
+_changed = threading.Condition()  # guards _jobs and job fields; notified on every job update
+
+
+@dataclass
+class DeleteJob:
+    id: str
+    server: str
+    builds: list[tuple[str, str]]  # (project, build), in submission order
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    state: str = "queued"  # queued|running|completed|failed
+    deleted: int = 0
+    bytes_freed: int = 0
+    failed: list[str] = field(default_factory=list)  # "project/build" not deleted (or not in the catalog)
+    error: str | None = None
+    finished_at: datetime | None = None
+    version: int = 0  # bumped on every update, see wait()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("completed", "failed")
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "server": self.server,
+            "state": self.state,
+            "total": len(self.builds),
+            "deleted": self.deleted,
+            "failed": list(self.failed),
+            "bytes_freed": self.bytes_freed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def submit(server: BinaryServerConfig, builds: list[tuple[str, str]]) -> DeleteJob:
+    """Start a job deleting the given (project, build) pairs (duplicates dropped) of a server."""
+    job = DeleteJob(id=uuid.uuid4().hex, server=server.name, builds=list(dict.fromkeys(builds)))
+    with _changed:
+        finished = [j for j in _jobs.values() if j.finished]
+        for old in finished[:-_KEEP_FINISHED]:
+            del _jobs[old.id]
+        _jobs[job.id] = job
+    threading.Thread(target=_run, args=(job, server), daemon=True, name=f"delete-job-{job.id[:8]}").start()
+    return job
+
+
+def get_job(job_id: str) -> DeleteJob | None:
+    with _changed:
+        return _jobs.get(job_id)
+
+
+def wait(job: DeleteJob, version: int, timeout: float) -> tuple[dict, int]:
+    """Block until the job changes past `version` (or the timeout passes); returns (snapshot, version)."""
+    with _changed:
+        _changed.wait_for(lambda: job.version != version or job.finished, timeout)
+        return job.snapshot(), job.version
+
+
+def _update(job: DeleteJob, **changes) -> None:
+    with _changed:
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.version += 1
+        _changed.notify_all()
+
+
+def _run(job: DeleteJob, server: BinaryServerConfig) -> None:
+    db = SessionLocal()
+    try:
+        _update(job, state="running")
+        found = _lookup(server, job.builds, db)
+        keys = [k for k in job.builds if k in found]
+        if len(keys) < len(job.builds):
+            _update(job, failed=[f"{p}/{b}" for p, b in job.builds if (p, b) not in found])
+
+        for start in range(0, len(keys), _BATCH):
+            batch = keys[start:start + _BATCH]
+            results = disk_agent_service.delete_builds(server, batch)
+            deleted = [k for k, ok in zip(batch, results) if ok]
+            if deleted:
+                now = datetime.utcnow()
+                catalog_service.remove_builds(server, deleted, db)
+                for project, rows in _by_project(found[k] for k in deleted).items():
+                    catalog_service.shrink_rollups(
+                        server, project, len(rows), sum(_freed(r) for r in rows), db,
+                        unsized=sum(r.size_bytes is None for r in rows),
+                    )
+                db.execute(insert(CleanupLog), [_log_row(server, found[k], now) for k in deleted])
+                db.commit()
+            _update(
+                job,
+                deleted=job.deleted + len(deleted),
+                bytes_freed=job.bytes_freed + sum(_freed(found[k]) for k in deleted),
+                failed=job.failed + [f"{p}/{b}" for (p, b), ok in zip(batch, results) if not ok],
+            )
+        disk_agent_service.invalidate_cache()
+        logger.info("Delete job %s: %d/%d builds deleted on %s", job.id, job.deleted, len(job.builds), server.name)
+        _update(job, state="completed", finished_at=datetime.utcnow())
+    except Exception as e:
+        logger.exception("Delete job %s failed", job.id)
+        db.rollback()
+        _update(job, state="failed", error=str(e), finished_at=datetime.utcnow())
+    finally:
+        db.close()
+
+
+def _lookup(server: BinaryServerConfig, builds: list[tuple[str, str]], db: Session) -> dict:
+    """Catalog rows of the given builds, keyed by (project, build)."""
+    found = {}
+    for start in range(0, len(builds), _LOOKUP_BATCH):
+        rows = db.execute(select(
+            Build.project_name, Build.build_number, Build.modified_at, Build.size_bytes, Build.exclusive_bytes,
+        ).where(
+            Build.server_name == server.name,
+            tuple_(Build.project_name, Build.build_number).in_(builds[start:start + _LOOKUP_BATCH]),
+        ))
+        found.update({(r.project_name, r.build_number): r for r in rows})
+    return found
+
+
+def _by_project(rows) -> dict[str, list]:
+    projects: dict[str, list] = {}
+    for row in rows:
+        projects.setdefault(row.project_name, []).append(row)
+    return projects
+
+
+def _freed(row) -> int:
+    return (row.size_bytes if row.exclusive_bytes is None else row.exclusive_bytes) or 0
+
+
+def _log_row(server: BinaryServerConfig, row, now: datetime) -> dict:
+    return {
+        "run_id": 0,  # manual deletes belong to no cleanup run
+        "deleted_at": now,
+        "server_name": server.name,
+        "project_name": row.project_name,
+        "build_number": row.build_number,
+        "retention_type": "custom" if is_custom_project(server, row.project_name) else "default",
+        "age_days": (now - row.modified_at).total_seconds() / 86400,
+        "size_bytes": _freed(row),
+        "score": 0,
+        "dry_run": False,
+        "action": "delete",
+    }
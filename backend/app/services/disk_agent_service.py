@@ -2,20 +2,44 @@
 
 import logging
 import random
+import threading
 import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, TypeVar
 
 import httpx
 
-from ..config import BinaryServerConfig, get_config
+from ..config import AppConfig, BinaryServerConfig, get_config, on_config_change
+from .build_index import BuildRecord
 
 logger = logging.getLogger(__name__)
 
-_cache: dict = {}
-_cache_time: float = 0
+T = TypeVar("T")
+
+_cache: dict[str, tuple[float, object]] = {}  # key -> (fetched_at, value)
 _CACHE_TTL = 60  # seconds
 
+# Last parsed listing per (agent, path, depth, sizes) with its ETag. Kept past the TTL so
+# expired entries are revalidated with If-None-Match instead of being re-downloaded.
+_listings: dict[tuple[str, str, int, bool], tuple[str, object]] = {}
+
+# One keep-alive connection pool per agent
+_clients: dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+# Failure handling per agent: see CircuitBreaker and _request
+_BREAKER_FAILURES = 3  # consecutive failures that open the circuit
+_BREAKER_COOLDOWN = 30  # seconds open before a half-open probe is let through
+_RETRIES = 2  # extra attempts for idempotent calls
+_BACKOFF = 0.5  # seconds; attempt n sleeps uniform(0, _BACKOFF * 2**n)
+_RETRY_BUDGET = 0.2  # retries earned per request, so retries stay a fraction of the traffic
+_CONNECT_TIMEOUT = 3  # seconds
+_RETRYABLE_STATUS = {502, 503, 504}
+_breakers: dict[str, "CircuitBreaker"] = {}
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-hedge")
+
 _DEMO_PROJECTS: dict[str, list[str]] = {
     "custom": ["automotive/dev", "automotive/release", "infotainment/dev"],
     "mobile": ["android", "ios", "flutter"],
@@ -23,8 +47,182 @@ _DEMO_PROJECTS: dict[str, list[str]] = {
 _DEMO_BUILD_COUNT = 10
 
 
-def _agent_url(server: BinaryServerConfig, path: str) -> str:
-    return f"{server.disk_agent_url.rstrip('/')}{path}"
+class AgentUnavailable(Exception):
+    """Raised without contacting the agent while its circuit is open."""
+
+
+class CircuitBreaker:
+    """Health of one agent.
+
+    closed: requests pass. open: after _BREAKER_FAILURES consecutive failures requests
+    fail fast with AgentUnavailable. half-open: after _BREAKER_COOLDOWN one probe request
+    is let through; its outcome closes or re-opens the circuit. Also holds the agent's
+    retry budget."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: str | None = None
+        self.retry_tokens = float(_RETRIES)
+
+    def allow(self) -> bool:
+        with self.lock:
+            self.retry_tokens = min(self.retry_tokens + _RETRY_BUDGET, 10.0)
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= _BREAKER_COOLDOWN:
+                self.state = "half_open"
+                return True
+            return False
+
+    def take_retry(self) -> bool:
+        with self.lock:
+            if self.state != "closed" or self.retry_tokens < 1:
+                return False
+            self.retry_tokens -= 1
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state, self.failures, self.last_error = "closed", 0, None
+
+    def record_failure(self, error: str) -> None:
+        with self.lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == "half_open" or self.failures >= _BREAKER_FAILURES:
+                if self.state != "open":
+                    logger.warning("Disk agent circuit open after %d failures: %s", self.failures, error)
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def status(self) -> dict:
+        with self.lock:
+            retry_in = max(0.0, _BREAKER_COOLDOWN - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "retry_in_seconds": round(retry_in, 1) if self.state == "open" else 0.0,
+            }
+
+
+def _breaker(server: BinaryServerConfig) -> CircuitBreaker:
+    base_url = server.disk_agent_url.rstrip("/")
+    with _clients_lock:
+        breaker = _breakers.get(base_url)
+        if breaker is None:
+            breaker = _breakers[base_url] = CircuitBreaker()
+    return breaker
+
+
+def agent_status(server: BinaryServerConfig) -> dict:
+    """Circuit state of the server's agent: state, failures, last_error, retry_in_seconds."""
+    if get_config().demo_mode:
+        return CircuitBreaker().status()
+    return _breaker(server).status()
+
+
+def _client(server: BinaryServerConfig) -> httpx.Client:
+    base_url = server.disk_agent_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = httpx.Client(base_url=base_url, limits=httpx.Limits(max_keepalive_connections=8))
+            _clients[base_url] = client
+    return client
+
+
+def _request(
+    server: BinaryServerConfig, method: str, path: str, *, timeout: float, idempotent: bool = True,
+    hedge_after: float | None = None, probe: bool = False, **kwargs,
+) -> httpx.Response:
+    """Send a request to the server's agent through its circuit breaker.
+
+    Idempotent calls are retried on transport errors and 502/503/504 with jittered
+    exponential backoff, within the agent's retry budget. With hedge_after, a second
+    identical request is sent when the first has not answered after that many seconds
+    and the first response wins. probe=True bypasses an open circuit (connection tests).
+    Raises AgentUnavailable when the circuit is open, httpx errors otherwise."""
+    breaker = _breaker(server)
+    if not breaker.allow() and not probe:
+        status = breaker.status()
+        raise AgentUnavailable(
+            f"Disk agent of {server.name} unavailable (retry in {status['retry_in_seconds']:.0f}s): "
+            f"{status['last_error']}"
+        )
+
+    timeout = httpx.Timeout(timeout, connect=min(timeout, _CONNECT_TIMEOUT))
+    attempt = 0
+    while True:
+        try:
+            resp = _send(_client(server), method, path, timeout, hedge_after, **kwargs)
+            if resp.status_code not in _RETRYABLE_STATUS:
+                breaker.record_success()
+                return resp
+            failure, error = None, f"HTTP {resp.status_code}"
+        except httpx.TransportError as e:
+            resp, failure, error = None, e, f"{type(e).__name__}: {e}"
+        breaker.record_failure(error)
+
+        if not idempotent or attempt >= _RETRIES or not breaker.take_retry():
+            if failure is not None:
+                raise failure
+            return resp  # the caller's raise_for_status reports it
+        time.sleep(random.uniform(0, _BACKOFF * 2**attempt))
+        attempt += 1
+
+
+def _send(
+    client: httpx.Client, method: str, path: str, timeout: httpx.Timeout, hedge_after: float | None, **kwargs,
+) -> httpx.Response:
+    if hedge_after is None:
+        return client.request(method, path, timeout=timeout, **kwargs)
+
+    pending = {_hedge_pool.submit(client.request, method, path, timeout=timeout, **kwargs)}
+    done, pending = wait(pending, timeout=hedge_after)
+    if not done:
+        pending.add(_hedge_pool.submit(client.request, method, path, timeout=timeout, **kwargs))
+    while True:
+        for future in done:
+            if future.exception() is None or not pending:
+                return future.result()
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+
+def _cached(key: str) -> object | None:
+    entry = _cache.get(key)
+    if entry and time.time() - entry[0] < _CACHE_TTL:
+        return entry[1]
+    return None
+
+
+def _list_conditional(
+    server: BinaryServerConfig, path: str, depth: int, sizes: bool, timeout: float,
+    parse: Callable[[list[dict]], T],
+) -> T:
+    """GET /files/list, revalidating the previous response by ETag.
+
+    On 304 the previously parsed value is returned without re-downloading or
+    re-parsing the listing."""
+    key = (server.disk_agent_url, path, depth, sizes)
+    previous = _listings.get(key)
+    headers = {"If-None-Match": previous[0]} if previous else {}
+
+    resp = _request(
+        server, "GET", "/files/list", params={"path": path, "depth": depth, "sizes": sizes},
+        headers=headers, timeout=timeout,
+    )
+    if resp.status_code == 304 and previous:
+        return previous[1]
+    resp.raise_for_status()
+
+    value = parse(resp.json()["entries"])
+    etag = resp.headers.get("etag")
+    if etag:
+        _listings[key] = (etag, value)
+    return value
 
 
 # --- Disk usage ---
@@ -42,29 +240,60 @@ def get_disk_usage(server: BinaryServerConfig) -> dict:
             "usage_percent": 85.0,
         }
 
-    resp = httpx.get(_agent_url(server, "/disk-usage"), timeout=10)
+    resp = _request(server, "GET", "/disk-usage", timeout=10, hedge_after=1)
     resp.raise_for_status()
     return resp.json()
 
 
-def get_directory_size(server: BinaryServerConfig, rel_path: str) -> int:
-    """Get size of a directory via the disk agent."""
+def get_directory_usage(server: BinaryServerConfig, rel_path: str) -> tuple[int, int]:
+    """(size_bytes, exclusive_bytes) of a directory via the disk agent.
+
+    exclusive_bytes leaves out files that are hard-linked from outside the
+    directory: it is what deleting the directory actually frees."""
     if get_config().demo_mode:
-        return random.randint(50, 500) * 1024 * 1024
+        size = random.randint(50, 500) * 1024 * 1024
+        return size, size
 
-    resp = httpx.get(_agent_url(server, "/dir-size"), params={"path": rel_path}, timeout=30)
+    resp = _request(server, "GET", "/dir-size", params={"path": rel_path}, timeout=30)
     resp.raise_for_status()
-    return resp.json()["size_bytes"]
+    data = resp.json()
+    return data["size_bytes"], data.get("exclusive_bytes", data["size_bytes"])
+
+
+def get_throttle(server: BinaryServerConfig) -> dict:
+    """The agent's I/O priority, rate limits and throttling counters."""
+    if get_config().demo_mode:
+        return {"files_per_second": 0.0, "bytes_per_second": 0.0, "io_class": "best-effort", "io_level": 7,
+                "nice": 10, "workers": 1, "active_tasks": 0, "files_total": 0, "bytes_total": 0,
+                "files_wait_seconds": 0.0, "bytes_wait_seconds": 0.0}
+
+    resp = _request(server, "GET", "/admin/throttle", timeout=10)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def update_throttle(server: BinaryServerConfig, changes: dict) -> dict:
+    """Change the agent's throttle settings; returns the resulting settings and counters."""
+    if get_config().demo_mode:
+        return {**get_throttle(server), **changes}
+
+    resp = _request(server, "PUT", "/admin/throttle", json=changes, timeout=30, idempotent=False)
+    resp.raise_for_status()
+    return resp.json()
 
 
 # --- File listing ---
 
-def _generate_demo_builds(project: str) -> list[dict]:
+def _generate_demo_builds(server_name: str, project: str) -> list[BuildRecord]:
     now = datetime.utcnow()
-    return [
-        {"build_number": str(10000 + i), "modified_at": now - timedelta(days=i)}
-        for i in range(1, _DEMO_BUILD_COUNT + 1)
-    ]
+    builds = []
+    for i in range(1, _DEMO_BUILD_COUNT + 1):
+        build_number = str(10000 + i)
+        # Stable pseudo-random size so repeated simulations agree with each other
+        size_mb = 50 + zlib.crc32(f"{project}/{build_number}".encode()) % 450
+        builds.append(BuildRecord.create(server_name, project, build_number, now - timedelta(days=i),
+                                         size_mb * 1024 * 1024))
+    return builds
 
 
 def list_projects(server: BinaryServerConfig) -> list[str]:
@@ -72,92 +301,281 @@ def list_projects(server: BinaryServerConfig) -> list[str]:
     if get_config().demo_mode:
         return sorted(_DEMO_PROJECTS.get(server.name, []))
 
+    cache_key = f"{server.name}:projects"
+    cached = _cached(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        resp = httpx.get(
-            _agent_url(server, "/files/list"),
-            params={"path": "", "depth": server.project_depth},
-            timeout=30,
+        projects = _list_conditional(
+            server, "", server.project_depth, False, 30,
+            lambda entries: sorted(e["name"] for e in entries),
         )
-        resp.raise_for_status()
-        entries = resp.json()["entries"]
-        return sorted(e["name"] for e in entries)
     except Exception as e:
         logger.error("Failed to list projects on %s: %s", server.name, e)
         return []
 
+    _cache[cache_key] = (time.time(), projects)
+    return projects
 
-def list_builds(server: BinaryServerConfig, project: str) -> list[dict]:
-    """List all builds under a project with their modification times."""
-    global _cache, _cache_time
 
+def list_builds(server: BinaryServerConfig, project: str, with_sizes: bool = False) -> list[BuildRecord]:
+    """List all builds under a project with their modification times.
+
+    With with_sizes=True each build also carries size_bytes and exclusive_bytes (cached by
+    the agent per build mtime)."""
     if get_config().demo_mode:
-        return _generate_demo_builds(project)
+        return _generate_demo_builds(server.name, project)
 
-    cache_key = f"{server.name}:builds:{project}"
-    now = time.time()
-    if cache_key in _cache and (now - _cache_time) < _CACHE_TTL:
-        return _cache[cache_key]
+    cache_key = f"{server.name}:builds{':sized' if with_sizes else ''}:{project}"
+    cached = _cached(cache_key)
+    if cached is not None:
+        return cached
 
     try:
-        resp = httpx.get(
-            _agent_url(server, "/files/list"),
-            params={"path": project, "depth": 1},
-            timeout=30,
+        builds = _list_conditional(
+            server, project, 1, with_sizes, 120 if with_sizes else 30,
+            lambda entries: _parse_builds(server, project, entries),
         )
-        resp.raise_for_status()
-        entries = resp.json()["entries"]
     except Exception as e:
         logger.error("Failed to list builds for %s on %s: %s", project, server.name, e)
         return []
 
-    builds = []
-    for entry in entries:
-        modified_str = entry["modified_at"]
-        try:
-            modified_dt = datetime.fromisoformat(modified_str.replace("Z", "+00:00")).replace(tzinfo=None)
-        except (ValueError, AttributeError):
-            modified_dt = datetime.utcnow()
-        builds.append({"build_number": entry["name"], "modified_at": modified_dt})
+    _cache[cache_key] = (time.time(), builds)
+    return builds
+
+
+def _parse_builds(server: BinaryServerConfig, project: str, entries: list[dict]) -> list[BuildRecord]:
+    builds = [
+        BuildRecord.create(
+            server.name, project, entry["name"], _parse_modified(entry),
+            entry.get("size_bytes"), entry.get("exclusive_bytes"), entry.get("compressed", False),
+        )
+        for entry in entries
+    ]
+    builds.sort(key=lambda b: b.build_number)
+    return builds
 
-    _cache[cache_key] = builds
-    _cache_time = now
-    return sorted(builds, key=lambda b: b["build_number"])
+
+def _parse_modified(entry: dict) -> datetime:
+    try:
+        return datetime.fromisoformat(entry["modified_at"].replace("Z", "+00:00")).replace(tzinfo=None)
+    except (ValueError, AttributeError):
+        return datetime.utcnow()
+
+
+def get_rollups(server: BinaryServerConfig) -> dict[str, dict]:
+    """Per-directory totals down to project_depth, keyed by path.
+
+    Each entry has level, builds, size_bytes (cached build sizes, hard links counted
+    once), unsized_builds, oldest/newest_modified_at and, at project level,
+    first/last_build. Served by the agent from its index without walking."""
+    if get_config().demo_mode:
+        return _demo_rollups(server)
+
+    cache_key = f"{server.name}:rollups"
+    cached = _cached(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        resp = _request(server, "GET", "/files/rollup", params={"depth": server.project_depth}, timeout=60)
+        resp.raise_for_status()
+    except Exception as e:
+        logger.error("Failed to get rollups for %s: %s", server.name, e)
+        return {}
+
+    rollups = {}
+    for entry in resp.json()["entries"]:
+        for field in ("oldest_modified_at", "newest_modified_at"):
+            if entry[field] is not None:
+                entry[field] = _parse_modified({"modified_at": entry[field]})
+        rollups[entry["path"]] = entry
+    _cache[cache_key] = (time.time(), rollups)
+    return rollups
+
+
+def _demo_rollups(server: BinaryServerConfig) -> dict[str, dict]:
+    rollups = {}
+    for project in list_projects(server):
+        builds = list_builds(server, project)
+        prefix = ""
+        for level, part in enumerate(project.split("/"), start=1):
+            prefix = f"{prefix}/{part}" if prefix else part
+            entry = rollups.setdefault(prefix, {
+                "path": prefix, "level": level, "builds": 0, "size_bytes": 0, "unsized_builds": 0,
+                "oldest_modified_at": None, "newest_modified_at": None,
+            })
+            entry["builds"] += len(builds)
+            entry["size_bytes"] += sum(b.size_bytes or 0 for b in builds)
+            mtimes = [b.modified_at for b in builds] + [m for m in (entry["oldest_modified_at"],
+                                                                     entry["newest_modified_at"]) if m]
+            if mtimes:
+                entry["oldest_modified_at"], entry["newest_modified_at"] = min(mtimes), max(mtimes)
+        if builds:
+            rollups[project]["first_build"] = builds[0].build_number
+            rollups[project]["last_build"] = builds[-1].build_number
+    return rollups
+
+
+# --- Change journal ---
+
+def fetch_changes(server: BinaryServerConfig, epoch: str, since: int) -> dict:
+    """Build changes after journal position (epoch, since) from the agent's /files/changes.
+
+    The agent answers with a full snapshot (reset) on the first sync, after its
+    index was recreated (new epoch) or when the position fell off its journal.
+    In demo mode every call is a reset with the generated demo builds."""
+    if get_config().demo_mode:
+        changes = [
+            {"op": "add", "path": f"{b.project}/{b.build_number}", "modified_at": b.modified_at.isoformat(),
+             "size_bytes": b.size_bytes, "exclusive_bytes": b.size_bytes}
+            for project in list_projects(server)
+            for b in list_builds(server, project)
+        ]
+        return {"epoch": "demo", "seq": 0, "reset": True, "changes": changes}
+
+    resp = _request(
+        server, "GET", "/files/changes",
+        params={"since": since, "epoch": epoch, "depth": server.project_depth + 1},
+        timeout=60,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+def parse_change(server: BinaryServerConfig, change: dict) -> BuildRecord:
+    """BuildRecord for an add/update journal entry."""
+    project, _, build = change["path"].rpartition("/")
+    return BuildRecord.create(
+        server.name, project, build, _parse_modified(change),
+        change.get("size_bytes"), change.get("exclusive_bytes"), change.get("compressed", False),
+    )
 
 
 # --- File operations ---
 
 def delete_build(server: BinaryServerConfig, project: str, build: str) -> bool:
-    """Delete a build directory via disk agent."""
+    """Delete a build directory via disk agent. Raises AgentUnavailable while the circuit is open."""
     if get_config().demo_mode:
         logger.info("[DEMO] Would delete: %s/%s", project, build)
         return True
 
     rel_path = f"{project}/{build}"
     try:
-        resp = httpx.request("DELETE", _agent_url(server, "/files"), params={"path": rel_path}, timeout=30)
+        resp = _request(server, "DELETE", "/files", params={"path": rel_path}, timeout=30, idempotent=False)
         resp.raise_for_status()
         logger.info("Deleted: %s/%s on %s", project, build, server.name)
         return True
+    except AgentUnavailable:
+        raise
     except Exception as e:
         logger.error("Failed to delete %s/%s on %s: %s", project, build, server.name, e)
         return False
 
 
+def delete_builds(server: BinaryServerConfig, builds: list[tuple[str, str]]) -> list[bool]:
+    """Delete (project, build) pairs in one call; the agent works through them in parallel and
+    moves them to its trash when it can. Returns per-build success. Raises AgentUnavailable
+    while the circuit is open."""
+    if get_config().demo_mode:
+        logger.info("[DEMO] Would delete %d builds", len(builds))
+        return [True] * len(builds)
+
+    paths = [f"{project}/{build}" for project, build in builds]
+    try:
+        resp = _request(server, "POST", "/files/delete-batch", json={"paths": paths}, timeout=120, idempotent=False)
+        resp.raise_for_status()
+    except AgentUnavailable:
+        raise
+    except Exception as e:
+        logger.error("Failed to delete %d builds on %s: %s", len(builds), server.name, e)
+        return [False] * len(builds)
+    results = resp.json()["results"]
+    for r in results:
+        if r["error"]:
+            logger.error("Failed to delete %s on %s: %s", r["path"], server.name, r["error"])
+    logger.info("Deleted %d/%d builds on %s", sum(r["deleted"] for r in results), len(builds), server.name)
+    return [r["deleted"] for r in results]
+
+
+def compress_build(server: BinaryServerConfig, project: str, build: str) -> dict | None:
+    """Compress a build directory in place into a zstd tarball via disk agent.
+
+    Returns the agent's {original_bytes, size_bytes, exclusive_bytes} (sizes after compression),
+    or None on failure, including agents without compression support. Raises AgentUnavailable
+    while the circuit is open."""
+    if get_config().demo_mode:
+        logger.info("[DEMO] Would compress: %s/%s", project, build)
+        return {"original_bytes": 0, "size_bytes": 0, "exclusive_bytes": 0}
+
+    rel_path = f"{project}/{build}"
+    try:
+        resp = _request(server, "POST", "/files/compress", params={"path": rel_path}, timeout=600, idempotent=False)
+        resp.raise_for_status()
+    except AgentUnavailable:
+        raise
+    except Exception as e:
+        logger.error("Failed to compress %s/%s on %s: %s", project, build, server.name, e)
+        return None
+    result = resp.json()
+    logger.info("Compressed: %s/%s on %s (%d -> %d bytes)", project, build, server.name,
+                result["original_bytes"], result["size_bytes"])
+    return result
+
+
 def build_exists(server: BinaryServerConfig, project: str, build: str) -> bool:
-    """Check if a build directory exists."""
+    """Check if a build directory exists. Raises AgentUnavailable while the circuit is open."""
     if get_config().demo_mode:
         return True
 
     rel_path = f"{project}/{build}"
     try:
-        resp = httpx.get(_agent_url(server, "/files/exists"), params={"path": rel_path}, timeout=10)
+        resp = _request(server, "GET", "/files/exists", params={"path": rel_path}, timeout=10, hedge_after=1)
         resp.raise_for_status()
         return resp.json()["exists"]
+    except AgentUnavailable:
+        raise
     except Exception:
         return False
 
 
+def check_health(server: BinaryServerConfig) -> dict:
+    """GET /health as a probe: sent even while the circuit is open, and closes it on success."""
+    resp = _request(server, "GET", "/health", timeout=3, idempotent=False, probe=True)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def check_listing(server: BinaryServerConfig) -> int:
+    """Number of directories at the binary root, listed uncached (a connection test of /files/list)."""
+    resp = _request(server, "GET", "/files/list", params={"path": "", "depth": 1}, timeout=3)
+    resp.raise_for_status()
+    return len(resp.json().get("entries", []))
+
+
 def invalidate_cache():
-    global _cache, _cache_time
-    _cache = {}
-    _cache_time = 0
+    """Expire cached listings; the next read revalidates them against the agent by ETag."""
+    _cache.clear()
+
+
+def _on_config_change(old: AppConfig | None, new: AppConfig, changed: set[str]) -> None:
+    """Close the connection pools (and forget the circuits and listings) of agents no server
+    uses any more, and expire cached reads of changed servers. Agents still in use keep
+    their warm pools."""
+    if not changed:
+        return
+    urls = {s.disk_agent_url.rstrip("/") for s in new.binary_servers}
+    with _clients_lock:
+        stale = [_clients.pop(url) for url in list(_clients) if url not in urls]
+        for url in [url for url in _breakers if url not in urls]:
+            del _breakers[url]
+    for client in stale:
+        client.close()
+    for key in [k for k in _listings if k[0].rstrip("/") not in urls]:
+        _listings.pop(key, None)
+    for key in [k for k in _cache if k.split(":", 1)[0] in changed]:
+        _cache.pop(key, None)
+
+
+on_config_change(_on_config_change)
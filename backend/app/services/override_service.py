@@ -0,0 +1,105 @@
+"""Build retention overrides - bulk upserts and removals, one statement per batch.
+
+An override replaces a build's retention days (see retention_engine.get_retention_days)
+until its optional expires_at; expired overrides are ignored, and purged after each cleanup."""
+
+import logging
+import re
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import delete, or_, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import BinaryServerConfig
+from ..models import Build, BuildRetentionOverride
+from .build_index import like_pattern
+
+logger = logging.getLogger(__name__)
+
+_BATCH = 1000  # rows per bulk statement
+_NUMBER = re.compile(r"\d+")
+
+
+def _batches(items: list, size: int = _BATCH):
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def unexpired(now: datetime | None = None):
+    """SQL condition on BuildRetentionOverride: no expiry, or one still in the future."""
+    expires_at = BuildRetentionOverride.expires_at
+    return or_(expires_at.is_(None), expires_at > (now or datetime.utcnow()))
+
+
+def set_overrides(rows: list[dict], db: Session) -> int:
+    """Insert overrides, replacing retention_days and expires_at of existing ones, in bulk
+    upserts (caller commits). Each row has server_name, project_name, build_number,
+    retention_days and expires_at. Returns the number of rows given."""
+    now = datetime.utcnow()
+    rows = [{**r, "created_at": now} for r in rows]
+    updated = ("retention_days", "expires_at")
+    dialect = db.get_bind().dialect.name
+    for batch in _batches(rows):
+        if dialect == "mysql":
+            stmt = mysql_insert(BuildRetentionOverride).values(batch)
+            stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in updated})
+        else:
+            stmt = sqlite_insert(BuildRetentionOverride).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["server_name", "project_name", "build_number"],
+                set_={c: stmt.excluded[c] for c in updated},
+            )
+        db.execute(stmt)
+    return len(rows)
+
+
+def remove_overrides(server_name: str, keys: list[tuple[str, str]], db: Session) -> int:
+    """Delete the overrides of (project, build) keys of a server (caller commits). Returns the count deleted."""
+    removed = 0
+    for batch in _batches(keys):
+        removed += db.execute(delete(BuildRetentionOverride).where(
+            BuildRetentionOverride.server_name == server_name,
+            tuple_(BuildRetentionOverride.project_name, BuildRetentionOverride.build_number).in_(batch),
+        )).rowcount
+    return removed
+
+
+def build_sort_key(build_number: str) -> tuple:
+    """Natural order of build names: "9" before "10", "1.2" before "1.10".
+
+    Text and number runs alternate, starting with text, so keys compare position by position."""
+    texts = _NUMBER.split(build_number)
+    numbers = [int(n) for n in _NUMBER.findall(build_number)]
+    return tuple(v for pair in zip(texts, numbers) for v in pair) + (texts[-1],)
+
+
+def select_builds(
+    server: BinaryServerConfig, project: str, db: Session, pattern: str = "*",
+    first: str | None = None, last: str | None = None,
+) -> list[str]:
+    """Cataloged build names of a project matching a glob (see build_index.glob_pattern) and
+    within [first, last] in natural build order, in one query."""
+    query = select(Build.build_number).where(Build.server_name == server.name, Build.project_name == project)
+    if pattern != "*":
+        query = query.where(Build.build_number.like(like_pattern(pattern), escape="\\"))
+    names = db.execute(query).scalars().all()
+    if first is not None:
+        names = [n for n in names if build_sort_key(n) >= build_sort_key(first)]
+    if last is not None:
+        names = [n for n in names if build_sort_key(n) <= build_sort_key(last)]
+    return sorted(names, key=build_sort_key)
+
+
+def purge_expired(db: Session) -> int:
+    """Delete expired overrides; they are already ignored when scoring."""
+    deleted = db.execute(delete(BuildRetentionOverride).where(
+        BuildRetentionOverride.expires_at.is_not(None), BuildRetentionOverride.expires_at <= datetime.utcnow(),
+    )).rowcount
+    db.commit()
+    if deleted:
+        logger.info("Purged %d expired retention overrides", deleted)
+    return deleted
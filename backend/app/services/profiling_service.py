@@ -0,0 +1,89 @@
+"""Sampling profiler for cleanup runs - produces collapsed stacks for flamegraphs."""
+
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_INTERVAL = 0.005  # seconds between samples
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+def collapse_stack(frame) -> str:
+    """Render a frame chain root-first as a single `a;b;c` line (Brendan Gregg format)."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Periodically samples the stack of one thread from a background thread.
+
+    Sampling keeps overhead flat regardless of how many calls the cleanup makes,
+    so it is safe to enable on production runs.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = _DEFAULT_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self.started_at: float | None = None
+        self.duration: float = 0.0
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="cleanup-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        if self.started_at is not None:
+            self.duration = time.perf_counter() - self.started_at
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples[collapse_stack(frame)] += 1
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text, one `stack count` line per unique stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def summary(self, limit: int = 30) -> str:
+        """Human-readable top-N self-time table derived from the leaf frames."""
+        leaf_counts: Counter[str] = Counter()
+        for stack, count in self.samples.items():
+            leaf_counts[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaf_counts.values()) or 1
+        lines = [
+            f"duration: {self.duration:.3f}s, samples: {sum(self.samples.values())}, "
+            f"interval: {self.interval * 1000:.1f}ms",
+            "",
+            f"{'self %':>7}  {'samples':>8}  function",
+        ]
+        for label, count in leaf_counts.most_common(limit):
+            lines.append(f"{count / total * 100:>6.1f}%  {count:>8}  {label}")
+        return "\n".join(lines) + "\n"
@@ -1,14 +1,27 @@
 import logging
+from collections.abc import Collection, Iterator
+from contextlib import closing
 from datetime import datetime, timedelta
+from typing import Literal
 
+import httpx
+from sqlalchemy import Row, and_, case, false, func, literal, or_, select, true
 from sqlalchemy.orm import Session
 
 from ..config import BinaryServerConfig, get_config
-from ..models import BuildRetentionOverride, CleanupLog, CleanupRun
-from . import disk_agent_service
+from ..models import Build, BuildRetentionOverride, CleanupLog, CleanupProfile, CleanupRun
+from . import catalog_service, disk_agent_service, override_service, simulation_service
+from .build_index import (
+    UPLOAD_GRACE_DAYS, BuildRecord, BuildTable, RetentionRules, ScoredBuild, ScoredBuilds, like_pattern,
+)
+from .profiling_service import SamplingProfiler
 
 logger = logging.getLogger(__name__)
 
+_CANDIDATE_BATCH = 500  # rows fetched per round trip while streaming candidates
+_EMERGENCY_BATCH = 50  # builds per agent delete-batch call in emergency mode
+_QUOTA_BATCH = 50  # builds per agent delete-batch call when trimming an over-quota project
+
 # Module-level state for cleanup status
 _cleanup_running = False
 _current_run_id: int | None = None
@@ -39,35 +52,66 @@ def request_abort():
 def get_retention_days(
     server: BinaryServerConfig, project_path: str, build_number: str | None = None, db: Session | None = None
 ) -> int:
-    """Returns retention_days. Priority: build override → project custom → global default."""
+    """Returns retention_days. Priority: build override (unexpired) → project custom → global default."""
     if build_number and db:
         override = db.query(BuildRetentionOverride).filter(
             BuildRetentionOverride.server_name == server.name,
             BuildRetentionOverride.project_name == project_path,
             BuildRetentionOverride.build_number == build_number,
+            override_service.unexpired(),
         ).first()
         if override:
             return override.retention_days
-    for cp in server.custom_projects:
-        if cp.path == project_path:
-            return cp.retention_days
-    return get_config().retention.default_days
+    cp = server.custom_project(project_path)
+    return cp.retention_days if cp else get_config().retention.default_days
+
+
+def load_overrides(server: BinaryServerConfig, db: Session) -> dict[tuple[str, str], int]:
+    """All unexpired build retention overrides of a server in one query, keyed by (project, build)."""
+    rows = db.query(
+        BuildRetentionOverride.project_name,
+        BuildRetentionOverride.build_number,
+        BuildRetentionOverride.retention_days,
+    ).filter(BuildRetentionOverride.server_name == server.name, override_service.unexpired()).all()
+    return {(r.project_name, r.build_number): r.retention_days for r in rows}
+
+
+def get_project_quota(server: BinaryServerConfig, project_path: str) -> tuple[int, int]:
+    """Returns (max_bytes, max_builds), 0 meaning no limit. Priority: project custom → server default."""
+    cp = server.custom_project(project_path)
+    if cp is None:
+        return server.project_max_bytes, server.project_max_builds
+    return (
+        server.project_max_bytes if cp.max_bytes is None else cp.max_bytes,
+        server.project_max_builds if cp.max_builds is None else cp.max_builds,
+    )
 
 
-def has_build_override(
-    server: BinaryServerConfig, project_path: str, build_number: str, db: Session
-) -> bool:
-    """Check if a build has a retention override."""
-    return db.query(BuildRetentionOverride).filter(
-        BuildRetentionOverride.server_name == server.name,
-        BuildRetentionOverride.project_name == project_path,
-        BuildRetentionOverride.build_number == build_number,
-    ).first() is not None
+def load_quota_usage(
+    server: BinaryServerConfig, db: Session
+) -> tuple[dict[str, list[int]], dict[str, tuple[int, int]], dict[str, int]]:
+    """[builds, size_bytes], quota and average measured build size of the server's projects
+    that are over quota, read from the catalog's project rollups (no build rows), as input
+    for simulation_service.trim_to_quota. Unmeasured builds count as the project's average
+    size; a project without measured builds is held to its build count quota only."""
+    usage: dict[str, list[int]] = {}
+    quotas: dict[str, tuple[int, int]] = {}
+    averages: dict[str, int] = {}
+    if not (server.project_max_bytes or server.project_max_builds
+            or any(cp.max_bytes or cp.max_builds for cp in server.custom_projects)):
+        return usage, quotas, averages
+    for r in catalog_service.get_rollups(server, db, level=server.project_depth):
+        measured = r.builds - (r.unsized_builds or 0)
+        average = r.size_bytes // measured if measured > 0 else 0
+        used, quota = [r.builds, r.size_bytes + (r.builds - measured) * average], get_project_quota(server, r.path)
+        if simulation_service.over_quota(used, quota):
+            usage[r.path], quotas[r.path], averages[r.path] = used, quota, average
+    return usage, quotas, averages
 
 
 def is_custom_project(server: BinaryServerConfig, project_path: str) -> bool:
     """Check if a project has a custom retention override."""
-    return any(cp.path == project_path for cp in server.custom_projects)
+    return server.custom_project(project_path) is not None
 
 
 def compute_score(retention_days: int, age_days: float) -> float:
@@ -76,41 +120,168 @@ def compute_score(retention_days: int, age_days: float) -> float:
     return retention_days - age_days
 
 
-def _collect_all_builds(server: BinaryServerConfig, db: Session) -> list[dict]:
-    """Collect all builds from all projects on a server with scoring info."""
+def load_build_table(server: BinaryServerConfig, db: Session) -> BuildTable:
+    """Load every cataloged build of a server, with its sizes, into a columnar table."""
+    listings = catalog_service.load_listings(server, db)
+    return BuildTable.from_listings(server.name, listings, load_overrides(server, db))
+
+
+def _collect_all_builds(server: BinaryServerConfig, db: Session) -> ScoredBuilds:
+    """Collect all builds from all projects on a server, scored and ordered lowest score first.
+    Builds protected by the server's retention rules are left out."""
     now = datetime.utcnow()
-    projects = disk_agent_service.list_projects(server)
-    all_builds = []
-
-    for project in projects:
-        builds = disk_agent_service.list_builds(server, project)
-
-        for build in builds:
-            modified = build["modified_at"]
-            age_days = (now - modified).total_seconds() / 86400
-
-            # Skip builds modified within last 10 minutes (may be in-progress upload)
-            age_minutes = (now - modified).total_seconds() / 60
-            if age_minutes < 10:
-                logger.info("Skipping %s/%s (modified %d min ago, possibly in-progress)",
-                            project, build["build_number"], int(age_minutes))
-                continue
-
-            retention_days = get_retention_days(server, project, build["build_number"], db)
-            score = compute_score(retention_days, age_days)
-            all_builds.append({
-                "server": server.name,
-                "project": project,
-                "build_number": build["build_number"],
-                "modified_at": modified,
-                "age_days": age_days,
-                "retention_days": retention_days,
-                "is_custom": is_custom_project(server, project),
-                "score": score,
-            })
-
-    all_builds.sort(key=lambda b: b["score"])
-    return all_builds
+    table = load_build_table(server, db)
+    project_days = [get_retention_days(server, project) for project in table.projects]
+    custom = [is_custom_project(server, project) for project in table.projects]
+    protected, extra_days = table.apply_rules(RetentionRules(server.rules))
+
+    ages = table.ages(now)
+    retention = table.retention(project_days, extra_days)
+    scores = table.scores(retention, ages)
+
+    # Skip builds modified within last 10 minutes (may be in-progress upload)
+    eligible = [i for i, age in enumerate(ages) if age >= UPLOAD_GRACE_DAYS and not protected[i]]
+    if len(eligible) + sum(protected) < len(table):
+        for i in (i for i, age in enumerate(ages) if age < UPLOAD_GRACE_DAYS):
+            logger.info("Skipping %s/%s (modified %d min ago, possibly in-progress)",
+                        table.projects[table.project_ids[i]], table.build_numbers[i], int(ages[i] * 1440))
+
+    return ScoredBuilds(table, table.argsort(scores, eligible), ages, retention, scores, custom)
+
+
+def _override_expr():
+    """SQL build override retention_days of a Build row (NULL without an unexpired override)."""
+    return (
+        select(BuildRetentionOverride.retention_days)
+        .where(
+            BuildRetentionOverride.server_name == Build.server_name,
+            BuildRetentionOverride.project_name == Build.project_name,
+            BuildRetentionOverride.build_number == Build.build_number,
+            override_service.unexpired(),
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _retention_expr(server: BinaryServerConfig, override=None, extra_days=None):
+    """SQL retention_days of a Build row, with get_retention_days' priority; extra_days
+    (the retention rules') is added to the project's retention, not to overrides."""
+    project_days = literal(get_config().retention.default_days)
+    if server.custom_projects:
+        # reversed: the first entry for a path wins, as in get_retention_days
+        custom = {cp.path: cp.retention_days for cp in reversed(server.custom_projects)}
+        project_days = case(custom, value=Build.project_name, else_=project_days)
+    if extra_days is not None:
+        project_days = project_days + extra_days
+    return func.coalesce(_override_expr() if override is None else override, project_days)
+
+
+def _rules_exprs(server: BinaryServerConfig):
+    """SQL (protected, extra_days) of a Build row under the server's retention rules, as
+    build_index.RetentionRules evaluates them: keep_last ranks are window functions over
+    each project's matching builds, newest first."""
+    protected, extra = [], []
+    for rule in server.rules:
+        conditions = [
+            column.like(like_pattern(glob), escape="\\")
+            for column, glob in ((Build.project_name, rule.projects), (Build.build_number, rule.builds))
+            if glob != "*"
+        ]
+        match = and_(*conditions) if conditions else None  # None: every build
+        if rule.extra_days:
+            extra.append(literal(rule.extra_days) if match is None else case((match, rule.extra_days), else_=0))
+        if rule.protect:
+            protected.append(true() if match is None else match)
+        elif rule.keep_last:
+            partition = (Build.project_name,) if match is None else (Build.project_name, case((match, 1), else_=0))
+            rank = func.row_number().over(
+                partition_by=partition, order_by=(Build.modified_epoch.desc(), Build.build_number.desc()),
+            )
+            protected.append(rank <= rule.keep_last if match is None else and_(match, rank <= rule.keep_last))
+    flag = case((or_(false(), *protected), 1), else_=0) if protected else literal(0)
+    return flag, sum(extra, literal(0)) if extra else None
+
+
+def _scored_builds(server: BinaryServerConfig, *where, override=None):
+    """Subquery of the server's Build columns with retention_days and protected. The rules'
+    rank windows see every build of a project, so callers filter on the subquery."""
+    protected, extra_days = _rules_exprs(server)
+    columns = [
+        *_BUILD_COLUMNS,
+        _retention_expr(server, override, extra_days).label("retention_days"),
+        protected.label("protected"),
+    ]
+    if override is not None:
+        columns.append(override.label("override_days"))
+    return select(*columns).where(Build.server_name == server.name, *where).subquery()
+
+
+def _stream_scored(server: BinaryServerConfig, db: Session, stmt, now_epoch: int) -> Iterator[tuple[ScoredBuild, Row]]:
+    """Execute a select of _scored_builds columns, streaming (ScoredBuild, row) pairs.
+
+    Uses a connection of its own: a streamed MySQL result holds its connection until it
+    is read to the end, while callers keep writing through db (or have closed it)."""
+    custom = {cp.path for cp in server.custom_projects}
+    with db.get_bind().connect() as conn:
+        for r in conn.execution_options(yield_per=_CANDIDATE_BATCH).execute(stmt):
+            age_days = (now_epoch - r.modified_epoch) / 86400
+            record = BuildRecord.create(
+                server.name, r.project_name, r.build_number, r.modified_at, r.size_bytes, r.exclusive_bytes,
+                r.compressed,
+            )
+            yield ScoredBuild(record, age_days, r.retention_days, r.project_name in custom,
+                              compute_score(r.retention_days, age_days), bool(r.protected)), r
+
+
+_BUILD_COLUMNS = (Build.project_name, Build.build_number, Build.modified_at, Build.modified_epoch,
+                  Build.size_bytes, Build.exclusive_bytes, Build.compressed)
+
+
+def iter_candidates(server: BinaryServerConfig, db: Session, now: datetime | None = None) -> Iterator[ScoredBuild]:
+    """Deletable builds of a server, lowest score first, streamed from the build catalog.
+
+    The score is computed and ordered in SQL, so the first candidate arrives without
+    loading or sorting the catalog. Builds modified within the upload grace period and
+    builds protected by retention rules are left out."""
+    now_epoch = catalog_service.epoch_seconds(now or datetime.utcnow())
+    builds = _scored_builds(server)
+    stmt = (
+        select(builds)
+        .where(builds.c.protected == 0, builds.c.modified_epoch <= now_epoch - int(UPLOAD_GRACE_DAYS * 86400))
+        # retention - age, in seconds and shifted by now: integer, same order as the score
+        .order_by(builds.c.retention_days * 86400 + builds.c.modified_epoch, builds.c.project_name,
+                  builds.c.build_number)
+    )
+    for build, _ in _stream_scored(server, db, stmt, now_epoch):
+        yield build
+
+
+BuildSort = Literal["build", "age", "remaining"]
+
+
+def iter_project_builds(
+    server: BinaryServerConfig, project: str, db: Session, sort: BuildSort = "build", descending: bool = False,
+    offset: int = 0, limit: int | None = None, now: datetime | None = None,
+) -> Iterator[tuple[ScoredBuild, bool]]:
+    """A page of one project's cataloged builds as (scored build, has_override), sorted in SQL.
+
+    "age" sorts youngest first and "remaining" lowest score first (before descending)."""
+    now_epoch = catalog_service.epoch_seconds(now or datetime.utcnow())
+    builds = _scored_builds(server, Build.project_name == project, override=_override_expr())
+    key = {
+        "build": builds.c.build_number,
+        "age": -builds.c.modified_epoch,
+        "remaining": builds.c.retention_days * 86400 + builds.c.modified_epoch,
+    }[sort]
+    stmt = (
+        select(builds)
+        .order_by(key.desc() if descending else key, builds.c.build_number)
+        .offset(offset)
+        .limit(limit)
+    )
+    for build, row in _stream_scored(server, db, stmt, now_epoch):
+        yield build, row.override_days is not None
 
 
 def _log(msg: str):
@@ -121,90 +292,307 @@ def _log(msg: str):
     logger.info(msg)
 
 
-def _run_cleanup_for_server(
-    server: BinaryServerConfig, db: Session, run: CleanupRun, dry_run: bool
-) -> tuple[int, int]:
-    """Run cleanup for a single server. Returns (builds_deleted, bytes_freed)."""
+def _cleanup_log(run: CleanupRun, server: BinaryServerConfig, build: ScoredBuild, size: int,
+                 action: str = "delete") -> CleanupLog:
+    return CleanupLog(
+        run_id=run.id,
+        server_name=server.name,
+        project_name=build.project,
+        build_number=build.build_number,
+        retention_type="custom" if build.is_custom else "default",
+        age_days=build.age_days,
+        size_bytes=size,
+        score=build.score,
+        dry_run=False,
+        action=action,
+    )
+
+
+def _run_cleanup_for_server(server: BinaryServerConfig, db: Session, run: CleanupRun) -> tuple[int, int]:
+    """Run cleanup for a single server: project quotas first, then the disk thresholds.
+    Returns (builds_deleted, bytes_freed); bytes freed by compressing cold builds count,
+    the compressed builds themselves don't."""
     global _abort_requested
 
     trigger_threshold = server.trigger_threshold_percent
     target_threshold = server.target_threshold_percent
 
-    disk_info = disk_agent_service.get_disk_usage(server)
-    current_usage = disk_info["usage_percent"]
+    disk_info = catalog_service.get_disk_usage(server, db)
+    total_bytes = disk_info["total_bytes"] or 1
+
+    builds_deleted, bytes_freed = _run_quota_for_server(server, db, run)
+    current_usage = disk_info["usage_percent"] - bytes_freed / total_bytes * 100
+    if _abort_requested:
+        return builds_deleted, bytes_freed
 
-    if current_usage < trigger_threshold and not dry_run:
-        _log(f"[{server.name}] Disk {current_usage}% < trigger {trigger_threshold}%, skipping")
-        return 0, 0
+    if current_usage < trigger_threshold:
+        _log(f"[{server.name}] Disk {current_usage:.1f}% < trigger {trigger_threshold}%, skipping")
+        return builds_deleted, bytes_freed
 
-    _log(f"[{server.name}] Collecting build list...")
-    all_builds = _collect_all_builds(server, db)
-    _log(f"[{server.name}] Found {len(all_builds)} deletable builds")
+    if current_usage >= server.emergency_threshold_percent:
+        _log(f"[{server.name}] Disk {current_usage:.1f}% >= emergency {server.emergency_threshold_percent}%, "
+             f"fast-path deletes down to trigger {trigger_threshold}%")
+        deleted, freed, current_usage = _run_emergency_for_server(server, db, run, current_usage, total_bytes)
+        builds_deleted += deleted
+        bytes_freed += freed
+        if current_usage < trigger_threshold or _abort_requested:
+            return builds_deleted, bytes_freed
 
+    _log(f"[{server.name}] Streaming cleanup candidates...")
+
+    try:
+        with closing(iter_candidates(server, db)) as candidates:  # releases the cursor on early exit
+            for i, build in enumerate(candidates):
+                if _abort_requested:
+                    _log(f"[{server.name}] Aborted by user")
+                    break
+
+                if current_usage <= target_threshold:
+                    # The projection says we're done; confirm with the agent, uploads may have landed
+                    current_usage = _settled_usage(server)
+                    if current_usage <= target_threshold:
+                        _log(f"[{server.name}] Target reached: {current_usage:.1f}% <= {target_threshold}%")
+                        break
+
+                remaining = build.score
+                action = build.action(server.cold_band_days)
+                if action == "compress":
+                    _log(f"[{server.name}] Compressing {build.project}/{build.build_number} "
+                         f"(remaining: {remaining:.1f}d) [#{i+1}]")
+                    result = disk_agent_service.compress_build(server, build.project, build.build_number)
+                    if result is None:
+                        _log(f"[{server.name}] Failed to compress {build.project}/{build.build_number}")
+                        continue
+                    # The original files are gone, the archive took their place
+                    before = build.freed_bytes if build.freed_bytes is not None else result["original_bytes"]
+                    size = max(before - result["size_bytes"], 0)
+                    catalog_service.mark_compressed(
+                        server, build.project, build.build_number, result["size_bytes"], result["exclusive_bytes"], db
+                    )
+                else:
+                    size = build.freed_bytes
+                    if size is None:  # not measured yet
+                        rel_path = f"{build.project}/{build.build_number}"
+                        _, size = disk_agent_service.get_directory_usage(server, rel_path)
+
+                    _log(f"[{server.name}] Deleting {build.project}/{build.build_number} "
+                         f"(remaining: {remaining:.1f}d) [#{i+1}]")
+
+                    success = disk_agent_service.delete_build(server, build.project, build.build_number)
+                    if not success:
+                        _log(f"[{server.name}] Failed to delete {build.project}/{build.build_number}")
+                        continue
+                    catalog_service.remove_build(server, build.project, build.build_number, db)
+                    builds_deleted += 1
+
+                db.add(_cleanup_log(run, server, build, size, action))
+                bytes_freed += size
+                current_usage -= size / total_bytes * 100
+    except disk_agent_service.AgentUnavailable as e:
+        # The agent stopped answering: keep what was deleted, leave the rest to the next run
+        _log(f"[{server.name}] Stopped: {e}")
+
+    return builds_deleted, bytes_freed
+
+
+def _run_quota_for_server(server: BinaryServerConfig, db: Session, run: CleanupRun) -> tuple[int, int]:
+    """Delete the lowest-score builds of each project over its quota until it fits, through the
+    agent's batch delete. Builds in the upload grace period or protected by retention rules
+    are kept, even if that leaves a project over quota. Returns (builds_deleted, bytes_freed)."""
+    usage, quotas, averages = load_quota_usage(server, db)
     builds_deleted = 0
     bytes_freed = 0
 
-    if dry_run and len(all_builds) > 0:
-        total_bytes = disk_info["total_bytes"]
-        simulated_usage = current_usage
-        estimated_size_per_build = total_bytes * (current_usage - target_threshold) / 100 / len(all_builds) * 2
-    else:
-        simulated_usage = current_usage
-        estimated_size_per_build = 0
-
-    for i, build in enumerate(all_builds):
-        if _abort_requested:
-            _log(f"[{server.name}] Aborted by user")
-            break
-
-        if dry_run:
-            if simulated_usage <= target_threshold:
-                _log(f"[{server.name}] Target reached (simulated): {simulated_usage:.1f}% <= {target_threshold}%")
-                break
-        else:
-            disk_info = disk_agent_service.get_disk_usage(server)
-            current_usage = disk_info["usage_percent"]
-            if current_usage <= target_threshold:
-                _log(f"[{server.name}] Target reached: {current_usage}% <= {target_threshold}%")
+    try:
+        for project in sorted(usage):
+            if _abort_requested:
                 break
+            builds, size = usage[project]
+            _log(f"[{server.name}] {project} over quota ({builds} builds, {size} bytes), trimming")
+            with closing(iter_project_builds(server, project, db, sort="remaining")) as rows:
+                settled = (b for b, _ in rows if b.age_days >= UPLOAD_GRACE_DAYS and not b.protected)
+                picked = list(simulation_service.trim_to_quota(settled, usage, quotas, averages))
+
+            for start in range(0, len(picked), _QUOTA_BATCH):
+                batch = picked[start:start + _QUOTA_BATCH]
+                results = disk_agent_service.delete_builds(server, [(b.project, b.build_number) for b in batch])
+                deleted = []
+                for build, success in zip(batch, results):
+                    if not success:
+                        _log(f"[{server.name}] Failed to delete {build.project}/{build.build_number}")
+                        continue
+                    catalog_service.remove_build(server, build.project, build.build_number, db)
+                    db.add(_cleanup_log(run, server, build, build.freed_bytes or 0))
+                    deleted.append(build)
+                catalog_service.shrink_rollups(
+                    server, project, len(deleted), sum(b.freed_bytes or 0 for b in deleted), db,
+                    unsized=sum(b.size_bytes is None for b in deleted),
+                )
+                db.commit()  # the next streamed pass reads on a connection of its own
+                builds_deleted += len(deleted)
+                bytes_freed += sum(b.freed_bytes or 0 for b in deleted)
+    except disk_agent_service.AgentUnavailable as e:
+        _log(f"[{server.name}] Stopped: {e}")
+
+    if usage:
+        _log(f"[{server.name}] Quota pass: {builds_deleted} builds, {bytes_freed} bytes")
+    return builds_deleted, bytes_freed
+
+
+def _expected_freed(build: ScoredBuild, fallback_size: int) -> int:
+    """The build's freed bytes, fallback_size when unmeasured (0 is measured: fully hard-linked)."""
+    return fallback_size if build.freed_bytes is None else build.freed_bytes
+
+
+def _settled_usage(server: BinaryServerConfig) -> float:
+    """The agent's disk usage once its trash is purged. Deleted builds are trashed at once but
+    purged at the throttled I/O pace, so the raw usage lags behind the deletes."""
+    disk = disk_agent_service.get_disk_usage(server)
+    if not disk.get("total_bytes"):
+        return disk["usage_percent"]
+    return max(disk["used_bytes"] - disk.get("trash_bytes", 0), 0) / disk["total_bytes"] * 100
 
-        rel_path = f"{build['project']}/{build['build_number']}"
-        size = disk_agent_service.get_directory_size(server, rel_path) if not dry_run else 0
-        remaining = build["score"]
 
-        _log(f"{'[DRY RUN] ' if dry_run else ''}[{server.name}] Deleting {build['project']}/{build['build_number']} (remaining: {remaining:.1f}d) [{i+1}/{len(all_builds)}]")
+def _run_emergency_for_server(
+    server: BinaryServerConfig, db: Session, run: CleanupRun, current_usage: float, total_bytes: int
+) -> tuple[int, int, float]:
+    """Delete candidates in score order, in batches, until the usage is below the trigger
+    threshold. Unlike the normal pass there are no per-build size lookups: unmeasured builds
+    are charged the server's average freed size, the agent trashes each batch at once, and
+    after every batch the projection is lowered to the agent's usage net of its trash when
+    that is lower. Returns (builds_deleted,
+    bytes_freed, usage)."""
+    builds_deleted = 0
+    bytes_freed = 0
+    trigger_threshold = server.trigger_threshold_percent
+    fallback_size = catalog_service.average_freed(server, db)
+    failed: set[tuple[str, str]] = set()
+
+    try:
+        while current_usage >= trigger_threshold and not _abort_requested:
+            # Just enough builds to get below the trigger. Every batch streams afresh after the
+            # previous one is committed: the stream's connection only sees committed deletes
+            batch, projected = [], current_usage
+            with closing(iter_candidates(server, db)) as candidates:
+                for build in candidates:
+                    if (build.project, build.build_number) in failed:
+                        continue
+                    batch.append(build)
+                    projected -= _expected_freed(build, fallback_size) / total_bytes * 100
+                    if len(batch) == _EMERGENCY_BATCH or projected < trigger_threshold:
+                        break
+            if not batch:
+                break
+            _log(f"[{server.name}] Emergency: deleting {len(batch)} builds "
+                 f"(first: {batch[0].project}/{batch[0].build_number}) [#{builds_deleted + 1}]")
+            results = disk_agent_service.delete_builds(server, [(b.project, b.build_number) for b in batch])
+            for build, success in zip(batch, results):
+                if not success:
+                    _log(f"[{server.name}] Failed to delete {build.project}/{build.build_number}")
+                    failed.add((build.project, build.build_number))
+                    continue
+                catalog_service.remove_build(server, build.project, build.build_number, db)
+                size = build.freed_bytes or 0
+                db.add(_cleanup_log(run, server, build, size))
+                builds_deleted += 1
+                bytes_freed += size
+                current_usage -= _expected_freed(build, fallback_size) / total_bytes * 100
+            db.commit()
+            if not any(results):
+                break  # the agent deletes nothing: don't walk the whole catalog in failed batches
+            try:
+                # Estimated sizes can be far off: the real usage (less the trash still being
+                # purged) ends the pass when it is lower than the projection
+                current_usage = min(current_usage, _settled_usage(server))
+            except httpx.HTTPError as e:
+                _log(f"[{server.name}] Disk usage unavailable, using the projection: {e}")
+    except disk_agent_service.AgentUnavailable as e:
+        _log(f"[{server.name}] Stopped: {e}")
+
+    _log(f"[{server.name}] Emergency pass: {builds_deleted} builds, {bytes_freed} bytes, disk {current_usage:.1f}%")
+    return builds_deleted, bytes_freed, current_usage
+
+
+def simulate_cleanup(
+    db: Session, trigger: str = "manual", persist: bool = False, profile: bool = False
+) -> tuple[list[dict], CleanupRun | None]:
+    """Plan a cleanup for every server in memory, using real build sizes.
+
+    Nothing is written unless persist=True, in which case a dry-run CleanupRun and its
+    CleanupLog rows are bulk-inserted. profile=True implies persist (the profile is
+    linked to the run). Returns (per-server plans, run or None)."""
+    config = get_config()
+    persist = persist or profile
 
-        if not dry_run:
-            success = disk_agent_service.delete_build(server, build["project"], build["build_number"])
-            if not success:
-                _log(f"[{server.name}] Failed to delete {build['project']}/{build['build_number']}")
-                continue
+    profiler = SamplingProfiler() if profile else None
+    if profiler:
+        profiler.start()
+    try:
+        started_at = datetime.utcnow()
+        plans = []
+        for server in config.binary_servers:
+            disk_info = catalog_service.get_disk_usage(server, db)
+            builds = _collect_all_builds(server, db)
+            usage, quotas, averages = load_quota_usage(server, db)
+            # Only walk the builds when a project is over quota: plan_server stops at the target
+            trims = list(simulation_service.trim_to_quota(builds, usage, quotas, averages)) if usage else []
+            plans.append(simulation_service.plan_server(server, builds, disk_info, builds.average_size(), trims))
+    finally:
+        if profiler:
+            profiler.stop()
+
+    if not persist:
+        return plans, None
 
-        log = CleanupLog(
+    run = CleanupRun(
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        trigger=trigger,
+        dry_run=True,
+        disk_usage_before=plans[0]["usage_before"] if plans else 0,
+        disk_usage_after=plans[0]["usage_after"] if plans else 0,
+        builds_deleted=sum(p["builds_deleted"] for p in plans),
+        bytes_freed=sum(p["bytes_freed"] for p in plans),
+        status="completed",
+    )
+    db.add(run)
+    db.flush()
+    db.add_all([
+        CleanupLog(
             run_id=run.id,
-            server_name=server.name,
-            project_name=build["project"],
-            build_number=build["build_number"],
-            retention_type="custom" if build["is_custom"] else "default",
-            age_days=build["age_days"],
-            size_bytes=size,
-            score=remaining,
-            dry_run=dry_run,
+            server_name=t["server"],
+            project_name=t["project"],
+            build_number=t["build_number"],
+            retention_type=t["retention_type"],
+            age_days=t["age_days"],
+            size_bytes=t["size_bytes"],
+            score=t["score"],
+            dry_run=True,
+            action=t["action"],
         )
-        db.add(log)
-        builds_deleted += 1
-        bytes_freed += size
-
-        if dry_run:
-            simulated_usage -= estimated_size_per_build / disk_info["total_bytes"] * 100
+        for plan in plans
+        for t in plan["targets"]
+    ])
+    db.commit()
+    if profiler:
+        _save_profile(db, run, profiler)
+    return plans, run
 
-    return builds_deleted, bytes_freed
 
+def run_cleanup(
+    db: Session, trigger: str = "manual", dry_run: bool = False, profile: bool = False,
+    servers: Collection[str] | None = None,
+) -> CleanupRun:
+    """Execute the cleanup algorithm across all servers, or only the named ones.
 
-def run_cleanup(db: Session, trigger: str = "manual", dry_run: bool = False) -> CleanupRun:
-    """Execute the cleanup algorithm across all servers."""
+    Dry runs are planned in memory by simulate_cleanup and recorded as a run.
+    With profile=True the run is sampled and a CleanupProfile row is stored for it."""
     global _cleanup_running, _current_run_id, _progress, _abort_requested, _progress_logs
 
+    if dry_run:
+        _, run = simulate_cleanup(db, trigger=trigger, persist=True, profile=profile)
+        return run
+
     if _cleanup_running:
         raise RuntimeError("Cleanup already in progress")
 
@@ -213,15 +601,18 @@ def run_cleanup(db: Session, trigger: str = "manual", dry_run: bool = False) ->
     _progress_logs = []
     _log("Starting...")
 
-    config = get_config()
-    first_server = config.binary_servers[0] if config.binary_servers else None
-    disk_info = disk_agent_service.get_disk_usage(first_server) if first_server else {
+    targets = [s for s in get_config().binary_servers if servers is None or s.name in servers]
+    if trigger != "emergency":  # the scheduler has just synced before raising an emergency
+        _log("Syncing build catalog...")
+        catalog_service.sync_all(db, targets)
+    first_server = targets[0] if targets else None
+    disk_info = catalog_service.get_disk_usage(first_server, db) if first_server else {
         "usage_percent": 0, "total_bytes": 0, "used_bytes": 0, "free_bytes": 0
     }
 
     run = CleanupRun(
         trigger=trigger,
-        dry_run=dry_run,
+        dry_run=False,
         disk_usage_before=disk_info["usage_percent"],
         status="running",
     )
@@ -230,12 +621,17 @@ def run_cleanup(db: Session, trigger: str = "manual", dry_run: bool = False) ->
     db.refresh(run)
     _current_run_id = run.id
 
+    profiler = SamplingProfiler() if profile else None
+    if profiler:
+        profiler.start()
+
     try:
         total_deleted = 0
         total_freed = 0
 
-        for server in config.binary_servers:
-            deleted, freed = _run_cleanup_for_server(server, db, run, dry_run)
+        for server in targets:
+            deleted, freed = _run_cleanup_for_server(server, db, run)
+            db.commit()
             total_deleted += deleted
             total_freed += freed
 
@@ -244,16 +640,19 @@ def run_cleanup(db: Session, trigger: str = "manual", dry_run: bool = False) ->
         run.finished_at = datetime.utcnow()
         run.status = "aborted" if _abort_requested else "completed"
 
-        if not dry_run and first_server:
-            final_disk = disk_agent_service.get_disk_usage(first_server)
+        if first_server:
+            try:
+                final_disk = disk_agent_service.get_disk_usage(first_server)
+            except (disk_agent_service.AgentUnavailable, httpx.HTTPError):
+                final_disk = catalog_service.get_disk_usage(first_server, db)
             run.disk_usage_after = final_disk["usage_percent"]
             disk_agent_service.invalidate_cache()
         else:
             run.disk_usage_after = disk_info["usage_percent"]
 
         db.commit()
-        if not dry_run:
-            _purge_old_logs(db, config.retention.log_retention_days)
+        _purge_old_logs(db, get_config().retention.log_retention_days)
+        override_service.purge_expired(db)
 
         status_msg = "Aborted" if _abort_requested else "Completed"
         _log(f"{status_msg}: {total_deleted} builds deleted, {total_freed} bytes freed")
@@ -267,15 +666,36 @@ def run_cleanup(db: Session, trigger: str = "manual", dry_run: bool = False) ->
         db.commit()
         raise
     finally:
+        if profiler:
+            profiler.stop()
+            _save_profile(db, run, profiler)
         _cleanup_running = False
         _current_run_id = None
 
 
+def _save_profile(db: Session, run: CleanupRun, profiler: SamplingProfiler) -> None:
+    """Persist the sampled profile of a run; never fails the run itself."""
+    try:
+        db.add(CleanupProfile(
+            run_id=run.id,
+            duration_seconds=profiler.duration,
+            sample_count=sum(profiler.samples.values()),
+            summary=profiler.summary(),
+            collapsed_stacks=profiler.collapsed(),
+        ))
+        db.commit()
+        logger.info("Profile saved for run %s (%d samples)", run.id, sum(profiler.samples.values()))
+    except Exception:
+        logger.exception("Failed to save profile for run %s", run.id)
+        db.rollback()
+
+
 def _purge_old_logs(db: Session, retention_days: int) -> None:
     """Delete cleanup runs and logs older than retention_days."""
     cutoff = datetime.utcnow() - timedelta(days=retention_days)
     old_run_ids = db.query(CleanupRun.id).filter(CleanupRun.started_at < cutoff).scalar_subquery()
     deleted_logs = db.query(CleanupLog).filter(CleanupLog.run_id.in_(old_run_ids)).delete(synchronize_session=False)
+    db.query(CleanupProfile).filter(CleanupProfile.run_id.in_(old_run_ids)).delete(synchronize_session=False)
     deleted_runs = db.query(CleanupRun).filter(CleanupRun.started_at < cutoff).delete(synchronize_session=False)
     db.commit()
     if deleted_runs:
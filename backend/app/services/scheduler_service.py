@@ -1,47 +1,106 @@
 import logging
+from datetime import datetime
 
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from ..config import get_config
+from ..config import AppConfig, BinaryServerConfig, get_config, on_config_change
 from ..database import SessionLocal
-from . import retention_engine
+from . import catalog_service, retention_engine
 
 logger = logging.getLogger(__name__)
 
 _scheduler: BackgroundScheduler | None = None
+_CATALOG_SYNC_SECONDS = 60
+_CHECK_JOB = "disk_check:{}"  # one job per server, every check_interval_minutes
 
 
-def _scheduled_check():
-    """Periodic disk check and cleanup if threshold exceeded."""
-    logger.info("Running scheduled disk check")
+def _scheduled_check(server_name: str):
+    """Periodic disk check of one server and cleanup if its threshold is exceeded."""
+    logger.info("Running scheduled disk check of %s", server_name)
     if retention_engine.is_running():
         logger.info("Cleanup already running, skipping")
         return
     db = SessionLocal()
     try:
-        retention_engine.run_cleanup(db, trigger="scheduled", dry_run=False)
+        retention_engine.run_cleanup(db, trigger="scheduled", dry_run=False, servers=[server_name])
     except Exception:
         logger.exception("Scheduled cleanup failed")
     finally:
         db.close()
 
 
+def _sync_catalog():
+    """Apply each agent's journal deltas to the build catalog, and start an emergency
+    cleanup of the servers whose disk is past its emergency threshold right away."""
+    db = SessionLocal()
+    try:
+        catalog_service.sync_all(db)
+        critical = [
+            s.name for s in get_config().binary_servers
+            if catalog_service.get_disk_usage(s, db)["usage_percent"] >= s.emergency_threshold_percent
+        ]
+        if critical and not retention_engine.is_running():
+            logger.warning("Disk critically full on %s, starting emergency cleanup", ", ".join(critical))
+            retention_engine.run_cleanup(db, trigger="emergency", dry_run=False, servers=critical)
+    except Exception:
+        logger.exception("Catalog sync failed")
+    finally:
+        db.close()
+
+
+def _add_check(server: BinaryServerConfig):
+    # The single-thread "checks" executor runs one server's check at a time, so checks
+    # falling due together queue up instead of skipping each other
+    _scheduler.add_job(
+        _scheduled_check,
+        "interval",
+        minutes=server.check_interval_minutes,
+        args=(server.name,),
+        id=_CHECK_JOB.format(server.name),
+        replace_existing=True,
+        executor="checks",
+        coalesce=True,
+        misfire_grace_time=None,
+    )
+
+
+def _on_config_change(old: AppConfig | None, new: AppConfig, changed: set[str]):
+    """Add, reschedule or remove the disk check jobs of servers that changed."""
+    if _scheduler is None:
+        return
+    previous = {s.name: s for s in old.binary_servers} if old else {}
+    current = {s.name: s for s in new.binary_servers}
+    for name in changed:
+        server = current.get(name)
+        if server is None:
+            if _scheduler.get_job(_CHECK_JOB.format(name)):
+                _scheduler.remove_job(_CHECK_JOB.format(name))
+            logger.info("Removed disk check of %s", name)
+        elif name not in previous or previous[name].check_interval_minutes != server.check_interval_minutes:
+            _add_check(server)
+            logger.info("Scheduled disk check of %s every %d minutes", name, server.check_interval_minutes)
+
+
 def start_scheduler():
     global _scheduler
     config = get_config()
-    intervals = [s.check_interval_minutes for s in config.binary_servers] or [5]
-    interval = min(intervals)
 
-    _scheduler = BackgroundScheduler()
+    _scheduler = BackgroundScheduler(executors={"default": ThreadPoolExecutor(), "checks": ThreadPoolExecutor(1)})
+    for server in config.binary_servers:
+        _add_check(server)
     _scheduler.add_job(
-        _scheduled_check,
+        _sync_catalog,
         "interval",
-        minutes=interval,
-        id="disk_check",
+        seconds=_CATALOG_SYNC_SECONDS,
+        id="catalog_sync",
         replace_existing=True,
+        max_instances=1,
+        next_run_time=datetime.now(),
     )
     _scheduler.start()
-    logger.info("Scheduler started with %d minute interval", interval)
+    on_config_change(_on_config_change)
+    logger.info("Scheduler started with %d disk checks", len(config.binary_servers))
 
 
 def stop_scheduler():
@@ -50,10 +109,3 @@ def stop_scheduler():
         _scheduler.shutdown(wait=False)
         _scheduler = None
         logger.info("Scheduler stopped")
-
-
-def reschedule(interval_minutes: int):
-    global _scheduler
-    if _scheduler:
-        _scheduler.reschedule_job("disk_check", trigger="interval", minutes=interval_minutes)
-        logger.info("Rescheduled disk check to %d minute interval", interval_minutes)
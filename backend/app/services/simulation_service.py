@@ -0,0 +1,221 @@
+"""Cleanup simulation - in-memory deletion plans and projected disk usage, no DB writes."""
+
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from itertools import chain, compress
+from typing import Sequence
+
+from ..config import BinaryServerConfig
+from .build_index import COMPRESSED_FRACTION, UPLOAD_GRACE_DAYS, BuildTable, RetentionRules, ScoredBuild
+
+_CURVE_POINTS = 100  # max points kept in the per-server usage curve summary
+
+
+def over_quota(usage: list[int], quota: tuple[int, int]) -> bool:
+    """Whether a project's [builds, size_bytes] exceeds its (max_bytes, max_builds) quota (0 = no limit)."""
+    max_bytes, max_builds = quota
+    return bool(max_builds and usage[0] > max_builds or max_bytes and usage[1] > max_bytes)
+
+
+def trim_to_quota(
+    builds: Iterable[ScoredBuild], usage: dict[str, list[int]], quotas: dict[str, tuple[int, int]],
+    fallback_sizes: dict[str, int] | None = None,
+) -> Iterator[ScoredBuild]:
+    """The builds to delete, in the order given (lowest score first), to bring every project
+    within its quota.
+
+    usage maps a project to its [builds, size_bytes] and is updated as builds are picked;
+    projects without a usage or quota entry are left alone. A build takes its freed
+    (exclusive) bytes off: the rollup counts hard-linked files once. Unmeasured builds are
+    charged the project's fallback_sizes entry (its average measured size), 0 without one."""
+    fallback_sizes = fallback_sizes or {}
+    for build in builds:
+        used = usage.get(build.project)
+        if used is None or not over_quota(used, quotas.get(build.project, (0, 0))):
+            continue
+        used[0] -= 1
+        used[1] -= build.freed_bytes if build.freed_bytes is not None else fallback_sizes.get(build.project, 0)
+        yield build
+
+
+def plan_server(
+    server: BinaryServerConfig, builds: Sequence[ScoredBuild], disk_info: dict, fallback_size: int = 0,
+    quota_trims: Sequence[ScoredBuild] = (),
+) -> dict:
+    """Plan deletions and compressions for one server from score-ordered builds.
+
+    The quota_trims builds (see trim_to_quota) are deleted first, whatever the usage.
+    The rest are consumed lowest score first; each action lowers the projected usage
+    by the bytes it frees until the target threshold is reached. A deletion frees the
+    build's exclusive bytes (files hard-linked from other builds stay); builds in the
+    server's cold band are compressed instead, freeing those bytes minus the estimated
+    archive (build_index.COMPRESSED_FRACTION). Builds without a known size are charged
+    fallback_size (the server's average freed size). Target size_bytes are freed bytes."""
+    total_bytes = disk_info["total_bytes"] or 1
+    usage_before = disk_info["usage_percent"]
+    target = server.target_threshold_percent
+
+    usage = usage_before
+    bytes_freed = 0
+    targets = []
+    trimmed = {(b.project, b.build_number) for b in quota_trims}
+    rest = (b for b in builds if (b.project, b.build_number) not in trimmed)
+    for build in chain(quota_trims, rest):
+        quota = len(targets) < len(trimmed)
+        if usage <= target and not quota:
+            break
+        action = "delete" if quota else build.action(server.cold_band_days)
+        if action == "compress":
+            size = build.build.compression_savings
+            if size is None:
+                size = int(fallback_size * (1 - COMPRESSED_FRACTION))
+        else:
+            size = fallback_size if build.freed_bytes is None else build.freed_bytes
+        usage -= size / total_bytes * 100
+        bytes_freed += size
+        targets.append({
+            "server": server.name,
+            "project": build.project,
+            "build_number": build.build_number,
+            "action": action,
+            "quota": quota,
+            "retention_type": "custom" if build.is_custom else "default",
+            "age_days": build.age_days,
+            "score": build.score,
+            "size_bytes": size,
+            "usage_after": usage,
+        })
+
+    compressed = sum(t["action"] == "compress" for t in targets)
+    return {
+        "server": server.name,
+        "usage_before": usage_before,
+        "usage_after": usage,
+        "trigger_percent": server.trigger_threshold_percent,
+        "target_percent": target,
+        "would_trigger": usage_before >= server.trigger_threshold_percent,
+        "target_reached": usage <= target,
+        "candidates": len(builds),
+        "builds_deleted": len(targets) - compressed,
+        "builds_compressed": compressed,
+        "builds_over_quota": len(trimmed),
+        "bytes_freed": bytes_freed,
+        "usage_curve": usage_curve(usage_before, targets),
+        "targets": targets,
+    }
+
+
+def usage_curve(usage_before: float, targets: list[dict], points: int = _CURVE_POINTS) -> list[dict]:
+    """Downsample the projected usage after each deletion to at most `points` entries."""
+    curve = [{"builds_deleted": 0, "usage_percent": round(usage_before, 2)}]
+    if not targets:
+        return curve
+    step = max(1, len(targets) // points)
+    for i in range(step - 1, len(targets), step):
+        curve.append({"builds_deleted": i + 1, "usage_percent": round(targets[i]["usage_after"], 2)})
+    if curve[-1]["builds_deleted"] != len(targets):
+        curve.append({"builds_deleted": len(targets), "usage_percent": round(targets[-1]["usage_after"], 2)})
+    return curve
+
+
+# --- Policy what-if evaluation ---
+
+_INGEST_WINDOW_DAYS = 7  # recent window used to estimate each project's daily ingest
+
+
+def evaluate_policy(
+    server: BinaryServerConfig,
+    table: BuildTable,
+    disk_info: dict,
+    default_days: int,
+    now: datetime,
+    include_projects: bool = True,
+) -> dict:
+    """Evaluate a retention policy (server custom projects and rules + default_days) over a build table.
+
+    Reports, per server and per project, the builds/bytes that are expired (score < 0)
+    and that a cleanup would delete to reach the target threshold, plus a projected
+    steady-state usage: each project's recent daily ingest times its retention,
+    on top of the bytes on disk that are not builds."""
+    project_days = [cp.retention_days if (cp := server.custom_project(p)) else default_days for p in table.projects]
+
+    protected, extra_days = table.apply_rules(RetentionRules(server.rules))
+
+    ages = table.ages(now)
+    scores = table.scores(table.retention(project_days, extra_days), ages)
+    sizes = table.filled_sizes()
+    freed = table.filled_freed()
+    spans = table.project_spans()
+
+    eligible = [i for i, age in enumerate(ages) if age >= UPLOAD_GRACE_DAYS and not protected[i]]
+    expired = bytearray(len(table))
+    for i in eligible:
+        if scores[i] < 0:
+            expired[i] = 1
+
+    total_bytes = disk_info["total_bytes"] or 1
+    usage = disk_info["usage_percent"]
+    target = server.target_threshold_percent
+    deletable = bytearray(len(table))
+    for i in table.argsort(scores, eligible):
+        if usage <= target:
+            break
+        usage -= freed[i] / total_bytes * 100
+        deletable[i] = 1
+
+    builds = [end - start for start, end in spans]
+    stored = _project_sums(spans, sizes)
+    expired_builds = _project_sums(spans, expired)
+    expired_bytes = _project_sums(spans, freed, expired)
+    deletable_builds = _project_sums(spans, deletable)
+    deletable_bytes = _project_sums(spans, freed, deletable)
+
+    recent = bytes(age < _INGEST_WINDOW_DAYS for age in ages)
+    recent_bytes = _project_sums(spans, sizes, recent)
+    oldest_age = [max(ages[start:end], default=0.0) for start, end in spans]
+    steady_bytes = [
+        int(recent_bytes[p] / max(min(_INGEST_WINDOW_DAYS, oldest_age[p]), 1.0) * project_days[p])
+        for p in range(len(spans))
+    ]
+    used_bytes = disk_info.get("used_bytes", disk_info["usage_percent"] * total_bytes / 100)
+    other_bytes = max(used_bytes - sum(stored), 0)
+
+    result = {
+        "name": server.name,
+        "usage_percent": disk_info["usage_percent"],
+        "would_trigger": disk_info["usage_percent"] >= server.trigger_threshold_percent,
+        "builds": len(table),
+        "bytes": sum(stored),
+        "expired_builds": sum(expired_builds),
+        "expired_bytes": sum(expired_bytes),
+        "deletable_builds": sum(deletable_builds),
+        "deletable_bytes": sum(deletable_bytes),
+        "usage_after_cleanup": round(usage, 2),
+        "steady_state_usage_percent": round((other_bytes + sum(steady_bytes)) / total_bytes * 100, 2),
+        "projects": [],
+    }
+    if include_projects:
+        result["projects"] = [
+            {
+                "project": table.projects[p],
+                "retention_days": project_days[p],
+                "is_custom": server.custom_project(table.projects[p]) is not None,
+                "builds": builds[p],
+                "bytes": stored[p],
+                "expired_builds": expired_builds[p],
+                "expired_bytes": expired_bytes[p],
+                "deletable_builds": deletable_builds[p],
+                "deletable_bytes": deletable_bytes[p],
+                "steady_state_bytes": steady_bytes[p],
+            }
+            for p in range(len(spans))
+        ]
+    return result
+
+
+def _project_sums(spans: list[tuple[int, int]], values, mask=None) -> list[int]:
+    """Per-project sum of values over the rows where mask is set (all rows without one).
+    A project's rows are contiguous, so each sum is a C-level pass over a slice."""
+    if mask is None:
+        return [sum(values[start:end]) for start, end in spans]
+    return [sum(compress(values[start:end], mask[start:end])) for start, end in spans]
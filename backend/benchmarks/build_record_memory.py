@@ -0,0 +1,82 @@
+"""Memory benchmark: build listings as dicts vs. slotted BuildRecords.
+
+Usage (from backend/):
+    python -m benchmarks.build_record_memory [--projects 300] [--builds 1000]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app.services.build_index import BuildRecord
+
+
+def _project_names(count: int) -> list[str]:
+    # Names built at runtime, as when decoded from agent JSON - not shared constants
+    return ["/".join(["automotive", f"project-{i:04d}"]) for i in range(count)]
+
+
+def _as_dicts(projects: list[str], builds: int, now: datetime) -> list[list[dict]]:
+    return [
+        [
+            {
+                "server": "".join(["binary-", "server"]),
+                "project": "".join(project),
+                "build_number": str(100000 + b),
+                "modified_at": now - timedelta(hours=b),
+                "size_bytes": 512 * 1024**2,
+            }
+            for b in range(builds)
+        ]
+        for project in projects
+    ]
+
+
+def _as_records(projects: list[str], builds: int, now: datetime) -> list[list[BuildRecord]]:
+    return [
+        [
+            BuildRecord.create(
+                "".join(["binary-", "server"]), "".join(project), str(100000 + b),
+                now - timedelta(hours=b), 512 * 1024**2,
+            )
+            for b in range(builds)
+        ]
+        for project in projects
+    ]
+
+
+def _measure(factory, *args) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = factory(*args)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=300)
+    parser.add_argument("--builds", type=int, default=1000, help="builds per project")
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    projects = _project_names(args.projects)
+    total = args.projects * args.builds
+
+    dict_bytes, dicts = _measure(_as_dicts, projects, args.builds, now)
+    del dicts
+    record_bytes, records = _measure(_as_records, projects, args.builds, now)
+    del records
+
+    print(f"builds:         {total:,}")
+    print(f"dicts:          {dict_bytes / 1024**2:8.1f} MiB  ({dict_bytes / total:6.0f} B/build)")
+    print(f"BuildRecords:   {record_bytes / 1024**2:8.1f} MiB  ({record_bytes / total:6.0f} B/build)")
+    print(f"reduction:      {(1 - record_bytes / dict_bytes) * 100:8.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+import pytest
+import yaml
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app import auth, config
+
+
+def _credentials(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_plaintext_passwords_are_hashed_on_load(tmp_path, monkeypatch):
+    """A plaintext password still logs in, and the config file is rewritten with its hash only."""
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.dump({"auth": {"users": [{"username": "ops", "password": "s3cret", "role": "admin"}]}}))
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(config, "_config_path", None)
+    config.load_config(path)
+
+    saved = yaml.safe_load(path.read_text())["auth"]["users"][0]
+    assert "password" not in saved and saved["password_hash"].startswith("$pbkdf2-sha256$")
+    assert auth.verify_user("ops", "s3cret") == "admin"
+    assert auth.verify_user("ops", "wrong") is None
+    assert auth.verify_user("nobody", "s3cret") is None
+
+
+def test_verified_tokens_are_cached_until_expiry_or_secret_change(monkeypatch):
+    monkeypatch.setattr(config, "_config", config.AppConfig())
+    decodes = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: decodes.append(1) or decode(*a, **kw))
+
+    token = auth.create_access_token("ops", "admin")
+    assert auth._decode_token(_credentials(token))["sub"] == "ops"
+    assert auth._decode_token(_credentials(token))["role"] == "admin"
+    assert len(decodes) == 1
+
+    expired = auth.create_access_token("ops", "admin", expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException):
+        auth._decode_token(_credentials(expired))
+
+    config.get_config().auth.jwt_secret = "rotated"
+    with pytest.raises(HTTPException):
+        auth._decode_token(_credentials(token))  # signed with the old secret
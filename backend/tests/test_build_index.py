@@ -0,0 +1,53 @@
+import dataclasses
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.build_index import BuildRecord, BuildTable
+
+
+def _listings(now):
+    return {
+        "a": [BuildRecord.create("s", "a", "1", now - timedelta(days=3), 100)],
+        "b": [
+            BuildRecord.create("s", "b", "1", now - timedelta(days=1)),
+            BuildRecord.create("s", "b", "2", now - timedelta(days=9), 300),
+        ],
+    }
+
+
+def test_scores_use_override_then_project_retention():
+    now = datetime.utcnow()
+    table = BuildTable.from_listings("s", _listings(now), {("b", "2"): 30})
+    scores = table.scores(table.retention([7, 5]), table.ages(now))
+
+    assert [round(s, 3) for s in scores] == [4.0, 4.0, 21.0]
+
+
+def test_argsort_orders_rows_by_score():
+    now = datetime.utcnow()
+    table = BuildTable.from_listings("s", _listings(now))
+    scores = table.scores(table.retention([7, 7]), table.ages(now))
+
+    assert table.argsort(scores) == [2, 0, 1]
+    assert table.argsort(scores, [0, 1]) == [0, 1]
+
+
+def test_rows_materialize_lazily_with_unknown_sizes():
+    now = datetime.utcnow()
+    table = BuildTable.from_listings("s", _listings(now))
+
+    row = table.row(1)
+    assert row.project == "b" and row.build_number == "1"
+    assert row.size_bytes is None
+    assert abs((row.modified_at - (now - timedelta(days=1))).total_seconds()) < 0.01
+    assert table.filled_sizes()[1] == 200
+
+
+def test_build_records_are_immutable_and_share_names():
+    a = BuildRecord.create("srv", "".join(["and", "roid"]), "1", datetime.utcnow())
+    b = BuildRecord.create("srv", "".join(["andr", "oid"]), "2", datetime.utcnow())
+    assert a.project is b.project
+    assert not hasattr(a, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        a.build_number = "3"
@@ -0,0 +1,72 @@
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import Base
+from app.models import Build, BuildCatalogSync, ProjectRollup
+from app.services import catalog_service, disk_agent_service
+
+
+def test_catalog_applies_deltas_and_resets(monkeypatch):
+    """Deltas should be applied on top of the catalog; a reset payload should rebuild it."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    changes = [
+        {"epoch": "e1", "seq": 4, "reset": True, "changes": [
+            {"seq": 4, "op": "add", "path": "app/B1", "modified_at": "2024-01-01T00:00:00+00:00",
+             "size_bytes": 100, "exclusive_bytes": 40},
+            {"seq": 4, "op": "add", "path": "app/B2", "modified_at": "2024-01-02T00:00:00+00:00",
+             "size_bytes": 100, "exclusive_bytes": 40},
+        ]},
+        {"epoch": "e1", "seq": 6, "reset": False, "changes": [
+            {"seq": 5, "op": "remove", "path": "app/B1"},
+            {"seq": 6, "op": "add", "path": "app/B3", "modified_at": "2024-01-03T00:00:00+00:00"},
+        ]},
+        {"epoch": "e2", "seq": 1, "reset": True, "changes": [
+            {"seq": 1, "op": "add", "path": "app/B9", "modified_at": "2024-01-09T00:00:00+00:00"},
+        ]},
+    ]
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/files/changes":
+            requests.append(dict(request.url.params))
+            return httpx.Response(200, json=changes[len(requests) - 1])
+        if request.url.path == "/disk-usage":
+            return httpx.Response(200, json={"total_bytes": 1000, "used_bytes": 900, "free_bytes": 100,
+                                             "usage_percent": 90.0})
+        if request.url.path == "/files/list":  # B1 is gone: B2 no longer shares its files
+            return httpx.Response(200, json={"path": "app", "entries": [
+                {"name": "B2", "modified_at": "2024-01-02T00:00:00+00:00", "size_bytes": 100, "exclusive_bytes": 100},
+                {"name": "B3", "modified_at": "2024-01-03T00:00:00+00:00", "size_bytes": 70, "exclusive_bytes": 70},
+            ]})
+        return httpx.Response(200, json={"entries": [
+            {"path": "app", "level": 1, "builds": 2, "size_bytes": 170, "unsized_builds": 0,
+             "oldest_modified_at": "2024-01-02T00:00:00+00:00", "newest_modified_at": "2024-01-03T00:00:00+00:00",
+             "first_build": "B2", "last_build": "B3"},
+        ]})
+
+    server = config.BinaryServerConfig(name="delta-test", disk_agent_url="http://catalog.test")
+    disk_agent_service._clients["http://catalog.test"] = httpx.Client(
+        base_url="http://catalog.test", transport=httpx.MockTransport(handler)
+    )
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as db:
+        catalog_service.sync_server(server, db)
+        catalog_service.sync_server(server, db)
+        builds = {b.build_number: b for b in catalog_service.list_builds(server, "app", db)}
+        assert sorted(builds) == ["B2", "B3"]
+        assert (builds["B2"].size_bytes, builds["B2"].exclusive_bytes) == (100, 100)
+        assert builds["B3"].size_bytes == 70
+        assert requests[1]["since"] == "4" and requests[1]["epoch"] == "e1"
+        assert requests[1]["depth"] == "2"
+        assert catalog_service.get_disk_usage(server, db)["usage_percent"] == 90.0
+        assert [r.builds for r in catalog_service.get_rollups(server, db)] == [2]
+
+        catalog_service.sync_server(server, db)
+        assert [b.build_number for b in catalog_service.list_builds(server, "app", db)] == ["B9"]
+        state = db.get(BuildCatalogSync, "delta-test")
+        assert (state.epoch, state.seq) == ("e2", 1)
+        assert db.query(Build).count() == 1 and db.query(ProjectRollup).count() == 1
@@ -0,0 +1,51 @@
+import time
+
+import yaml
+
+from app import config
+
+
+def _server(name, interval=5, custom=()):
+    return {"name": name, "disk_agent_url": f"http://{name}:9090", "check_interval_minutes": interval,
+            "custom_projects": [{"path": p, "retention_days": d} for p, d in custom]}
+
+
+def test_reload_swaps_valid_changes_and_keeps_unchanged_servers(tmp_path, monkeypatch):
+    """Edits on disk are picked up by the watcher; servers that did not change keep their
+    instance, listeners hear which did, and an invalid file leaves the config in place."""
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.dump({"binary_servers": [_server("a", custom=[("app", 30), ("app", 60)]), _server("b")]}))
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(config, "_config_path", None)
+    monkeypatch.setattr(config, "_listeners", [])
+    changes = []
+    config.on_config_change(lambda old, new, changed: changes.append(changed))
+
+    first = config.load_config(path)
+    a, b = first.binary_servers
+    assert a.custom_project("app").retention_days == 30  # the first entry for a path wins
+    assert changes == [{"a", "b"}]
+
+    config.watch_config(interval=0.05)
+    try:
+        path.write_text(yaml.dump({"binary_servers": [_server("a", custom=[("app", 30), ("app", 60)]),
+                                                      _server("b", interval=10), _server("c")]}))
+        deadline = time.time() + 5
+        while len(changes) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        config.stop_watching()
+
+    assert changes[1] == {"b", "c"}
+    current = config.get_config()
+    assert current.binary_servers[0] is a
+    assert current.binary_servers[1] is not b and current.binary_servers[1].check_interval_minutes == 10
+
+    path.write_text("binary_servers: [{name: x, check_interval_minutes: often}]")
+    assert not config.reload_config()
+    assert config.get_config() is current
+
+    config.save_config(current)
+    assert yaml.safe_load(path.read_text())["binary_servers"][2]["name"] == "c"
+    assert [p.name for p in tmp_path.iterdir()] == ["config.yaml"]  # no temporary file left behind
+    assert not config.reload_config()  # the file matches the current config
@@ -0,0 +1,33 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import models  # noqa: F401  (registers the tables)
+from app.database import Base, migrate
+
+
+def test_migrate_adds_missing_columns_and_unique_constraints():
+    """Tables from an older version get new columns (with defaults) and unique keys, duplicates dropped."""
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE build_retention_overrides (id INTEGER PRIMARY KEY, server_name VARCHAR(100), "
+            "project_name VARCHAR(255), build_number VARCHAR(50), retention_days INTEGER, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO build_retention_overrides (id, server_name, project_name, build_number, retention_days) "
+            "VALUES (1, 's', 'app', '1', 10), (2, 's', 'app', '1', 20), (3, 's', 'app', '2', 30)"
+        ))
+        conn.execute(text("CREATE TABLE cleanup_logs (id INTEGER PRIMARY KEY, run_id INTEGER, project_name TEXT)"))
+        conn.execute(text("INSERT INTO cleanup_logs (id, run_id, project_name) VALUES (1, 1, 'app')"))
+    Base.metadata.create_all(engine)
+
+    migrate(engine)
+    migrate(engine)  # idempotent
+
+    inspector = inspect(engine)
+    assert "expires_at" in {c["name"] for c in inspector.get_columns("build_retention_overrides")}
+    indexes = {i["name"] for i in inspector.get_indexes("build_retention_overrides")}
+    assert "uq_overrides_server_project_build" in indexes
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, retention_days FROM build_retention_overrides ORDER BY id")).all()
+        assert [tuple(r) for r in rows] == [(2, 20), (3, 30)]
+        assert conn.execute(text("SELECT action, dry_run FROM cleanup_logs")).one() == ("delete", 0)
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import config
+from app.database import Base
+from app.models import Build, CleanupLog, ProjectRollup
+from app.services import delete_job_service, disk_agent_service
+
+
+def test_delete_job_deletes_in_batches_and_logs_in_bulk(monkeypatch):
+    """Catalog sizes are used (no walks), agent failures and unknown builds are reported, and
+    every deleted build gets a CleanupLog row."""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    server = config.BinaryServerConfig(name="mobile")
+    old = datetime.utcnow() - timedelta(days=10)
+
+    with Session(engine) as db:
+        for n in range(120):
+            db.add(Build(server_name="mobile", project_name="app", build_number=str(n),
+                         modified_at=old, modified_epoch=0, size_bytes=100, exclusive_bytes=10))
+        db.add(ProjectRollup(server_name="mobile", path="app", level=1, builds=120, size_bytes=12000))
+        db.commit()
+
+    calls = []
+
+    def delete_builds(srv, builds):
+        calls.append(len(builds))
+        return [b != ("app", "7") for b in builds]
+
+    monkeypatch.setattr(delete_job_service, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(disk_agent_service, "delete_builds", delete_builds)
+    monkeypatch.setattr(disk_agent_service, "invalidate_cache", lambda: None)
+
+    builds = [("app", str(n)) for n in range(120)] + [("app", "missing"), ("app", "0")]
+    job = delete_job_service.submit(server, builds)
+    snapshot, _ = delete_job_service.wait(job, -1, 0)
+    while snapshot["state"] not in ("completed", "failed"):
+        snapshot, _ = delete_job_service.wait(job, job.version, 5)
+
+    assert snapshot["state"] == "completed", snapshot["error"]
+    assert snapshot["total"] == 121  # the duplicate "0" was dropped
+    assert snapshot["deleted"] == 119
+    assert snapshot["failed"] == ["app/missing", "app/7"]
+    assert snapshot["bytes_freed"] == 119 * 10
+    assert calls == [50, 50, 20]
+    assert delete_job_service.get_job(job.id) is job
+
+    with Session(engine) as db:
+        assert db.query(Build).count() == 1
+        logs = db.query(CleanupLog).all()
+        assert len(logs) == 119
+        assert all(log.run_id == 0 and log.size_bytes == 10 and log.age_days > 9 for log in logs)
+        rollup = db.query(ProjectRollup).one()
+        assert (rollup.builds, rollup.size_bytes) == (1, 12000 - 119 * 10)  # hard-linked files stay
@@ -0,0 +1,92 @@
+import httpx
+import pytest
+
+from app import config
+from app.services import disk_agent_service
+
+
+def _server_with_transport(handler) -> config.BinaryServerConfig:
+    server = config.BinaryServerConfig(name="etag-test", disk_agent_url="http://agent.test")
+    disk_agent_service._clients["http://agent.test"] = httpx.Client(
+        base_url="http://agent.test", transport=httpx.MockTransport(handler)
+    )
+    return server
+
+
+def test_expired_listing_is_revalidated_by_etag(monkeypatch):
+    """After the TTL expires the client should send If-None-Match and reuse the parsed listing on 304."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    seen_etags = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_etags.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        entries = [{"name": "B2", "modified_at": "2024-01-02T00:00:00+00:00"},
+                   {"name": "B1", "modified_at": "2024-01-01T00:00:00+00:00"}]
+        return httpx.Response(200, json={"path": "app", "entries": entries}, headers={"ETag": '"v1"'})
+
+    server = _server_with_transport(handler)
+    first = disk_agent_service.list_builds(server, "app")
+    disk_agent_service.invalidate_cache()
+    second = disk_agent_service.list_builds(server, "app")
+
+    assert seen_etags == [None, '"v1"']
+    assert second is first
+    assert [b.build_number for b in second] == ["B1", "B2"]
+
+
+
+def test_idempotent_calls_retry_transient_errors(monkeypatch):
+    """A 503 followed by a success should be retried transparently."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    monkeypatch.setattr(disk_agent_service, "_BACKOFF", 0)
+    statuses = [503, 200]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(statuses.pop(0), json={"total_bytes": 10, "used_bytes": 5, "free_bytes": 5,
+                                                     "usage_percent": 50.0})
+
+    server = config.BinaryServerConfig(name="retry-test", disk_agent_url="http://retry.test")
+    disk_agent_service._clients["http://retry.test"] = httpx.Client(
+        base_url="http://retry.test", transport=httpx.MockTransport(handler)
+    )
+    assert disk_agent_service.get_disk_usage(server)["usage_percent"] == 50.0
+    assert statuses == []
+    assert disk_agent_service.agent_status(server)["state"] == "closed"
+
+
+def test_circuit_opens_fails_fast_and_recovers(monkeypatch):
+    """After repeated failures calls fail fast; after the cooldown one probe may close it again."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    monkeypatch.setattr(disk_agent_service, "_BACKOFF", 0)
+    calls = []
+    healthy = False
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if not healthy:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200, json={"exists": True})
+
+    server = config.BinaryServerConfig(name="breaker-test", disk_agent_url="http://breaker.test")
+    disk_agent_service._clients["http://breaker.test"] = httpx.Client(
+        base_url="http://breaker.test", transport=httpx.MockTransport(handler)
+    )
+    assert disk_agent_service.list_projects(server) == []
+    assert disk_agent_service.agent_status(server)["state"] == "open"
+    attempts = len(calls)
+    assert attempts == disk_agent_service._BREAKER_FAILURES
+
+    with pytest.raises(disk_agent_service.AgentUnavailable):
+        disk_agent_service.build_exists(server, "app", "B1")
+    with pytest.raises(disk_agent_service.AgentUnavailable):
+        disk_agent_service.check_listing(server)  # the connection test's listing, too
+    assert len(calls) == attempts
+
+    monkeypatch.setattr(disk_agent_service, "_BREAKER_COOLDOWN", 0)
+    healthy = True
+    assert disk_agent_service.build_exists(server, "app", "B1") is True
+    assert disk_agent_service.agent_status(server) == {
+        "state": "closed", "failures": 0, "last_error": None, "retry_in_seconds": 0.0,
+    }
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import Base
+from app.models import Build, BuildRetentionOverride
+from app.services import override_service, retention_engine
+
+
+def test_bulk_overrides_upsert_select_and_expire():
+    """A range/pattern selection is upserted in bulk; expired overrides are ignored and purged."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    server = config.BinaryServerConfig(name="mobile")
+    now = datetime.utcnow()
+
+    with Session(engine) as db:
+        for n in ["8", "9", "10", "11", "rc-10"]:
+            db.add(Build(server_name="mobile", project_name="app", build_number=n,
+                         modified_at=now, modified_epoch=0))
+        db.commit()
+
+        selected = override_service.select_builds(server, "app", db, first="9", last="10")
+        assert selected == ["9", "10"]  # natural order: "10" sorts after "9"
+        assert override_service.select_builds(server, "app", db, pattern="rc-*") == ["rc-10"]
+
+        def row(build, days, expires_at=None):
+            return {"server_name": "mobile", "project_name": "app", "build_number": build,
+                    "retention_days": days, "expires_at": expires_at}
+
+        override_service.set_overrides([row("9", 30), row("10", 30)], db)
+        override_service.set_overrides([row("10", 60), row("11", 90, now - timedelta(seconds=1))], db)
+        db.commit()
+
+        assert db.query(BuildRetentionOverride).count() == 3  # "10" was updated in place
+        assert retention_engine.load_overrides(server, db) == {("app", "9"): 30, ("app", "10"): 60}
+        assert override_service.purge_expired(db) == 1
+        assert override_service.remove_overrides("mobile", [("app", "9"), ("app", "8")], db) == 1
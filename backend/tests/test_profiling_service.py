@@ -0,0 +1,29 @@
+import sys
+import threading
+import time
+
+from app.services.profiling_service import SamplingProfiler, collapse_stack
+
+
+def _busy_leaf(deadline: float):
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_collapse_stack_is_root_first():
+    """Collapsed stack should list the outermost frame first and the current frame last."""
+    stack = collapse_stack(sys._getframe())
+    assert stack.split(";")[-1].split(":")[1] == "test_collapse_stack_is_root_first"
+
+
+def test_profiler_samples_target_thread():
+    """Samples should be taken from the profiled thread and rendered as `stack count` lines."""
+    with SamplingProfiler(thread_id=threading.get_ident(), interval=0.001) as profiler:
+        _busy_leaf(time.perf_counter() + 0.1)
+
+    assert sum(profiler.samples.values()) > 0
+    assert any("_busy_leaf" in stack for stack in profiler.samples)
+    for line in profiler.collapsed().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+    assert "_busy_leaf" in profiler.summary()
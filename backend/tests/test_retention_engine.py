@@ -1,3 +1,14 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import config
+from app.database import Base
+from app.models import Build, BuildRetentionOverride, ProjectRollup
+from app.services import retention_engine
+from app.services.catalog_service import epoch_seconds
 from app.services.retention_engine import compute_score
 
 
@@ -34,3 +45,244 @@ def test_ordering_expired_then_unexpired():
     assert expired < unexpired
     assert expired < 0
     assert unexpired > 0
+
+
+def _catalog(now: datetime, url: str = "") -> Session:
+    """Catalog of server "mobile": android 1-4 (4 has a 60-day override), custom ios 1. In memory,
+    on one shared connection, unless a database url is given."""
+    engine = create_engine(url) if url else create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    for project, build, age_days in [("android", "1", 10), ("android", "2", 5), ("android", "3", 0.001),
+                                     ("ios", "1", 20), ("android", "4", 12)]:
+        modified = now - timedelta(days=age_days)
+        db.add(Build(server_name="mobile", project_name=project, build_number=build,
+                     modified_at=modified, modified_epoch=epoch_seconds(modified), size_bytes=100))
+    db.add(Build(server_name="other", project_name="android", build_number="9",
+                 modified_at=now, modified_epoch=epoch_seconds(now - timedelta(days=99))))
+    db.add(BuildRetentionOverride(server_name="mobile", project_name="android", build_number="4",
+                                  retention_days=60))
+    db.commit()
+    return db
+
+
+def _server() -> config.BinaryServerConfig:
+    return config.BinaryServerConfig(name="mobile", custom_projects=[config.CustomProject(path="ios", retention_days=30)])
+
+
+def test_candidates_are_streamed_in_score_order(monkeypatch):
+    """SQL scoring should honor build overrides, custom projects and the upload grace period."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    now = datetime(2024, 3, 1)
+
+    with _catalog(now) as db:
+        candidates = list(retention_engine.iter_candidates(_server(), db, now))
+
+    assert [(c.project, c.build_number) for c in candidates] == [
+        ("android", "1"), ("android", "2"), ("ios", "1"), ("android", "4"),
+    ]
+    assert [c.score for c in candidates] == [-3, 2, 10, 48]
+    assert [c.is_custom for c in candidates] == [False, False, True, False]
+
+
+def test_project_builds_are_sorted_and_paged_in_sql(monkeypatch):
+    """A page of one project's builds, sorted by remaining days, with override flags."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    now = datetime(2024, 3, 1)
+
+    with _catalog(now) as db:
+        page = list(retention_engine.iter_project_builds(
+            _server(), "android", db, sort="remaining", descending=True, offset=1, limit=2, now=now
+        ))
+        by_age = [b.build_number for b, _ in retention_engine.iter_project_builds(_server(), "android", db, "age")]
+
+    assert [(b.build_number, round(b.score), override) for b, override in page] == [("3", 7, False), ("2", 2, False)]
+    assert by_age == ["3", "2", "1", "4"]
+
+
+def test_emergency_pass_batches_deletes_down_to_trigger(monkeypatch):
+    """Emergency mode hands candidates to the agent in score-ordered batches until the usage is below trigger."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    monkeypatch.setattr(retention_engine, "_EMERGENCY_BATCH", 2)
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.append(builds) or [b != ("ios", "1") for b in builds])
+    # 100 bytes of 4000 = 2.5% per build, as the agent sees it
+    monkeypatch.setattr(retention_engine.disk_agent_service, "get_disk_usage",
+                        lambda server: {"usage_percent": 99.0 - 2.5 * sum(len(c) for c in calls)})
+
+    with _catalog(datetime.utcnow()) as db:
+        run = retention_engine.CleanupRun(trigger="emergency")
+        db.add(run)
+        db.commit()
+        # the catalog runs out before 99% gets below the 90% trigger
+        deleted, freed, usage = retention_engine._run_emergency_for_server(_server(), db, run, 99.0, 4000)
+
+    assert calls == [[("android", "1"), ("android", "2")], [("ios", "1"), ("android", "4")]]
+    assert (deleted, freed, usage) == (3, 300, 89.0)  # the failed ios delete is not counted
+
+
+def test_emergency_pass_stops_on_real_usage_when_sizes_are_unknown(monkeypatch):
+    """Unmeasured builds are charged the average measured size, and the agent's usage after a
+    batch ends the pass, so missing sizes don't make it delete every candidate."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    monkeypatch.setattr(retention_engine, "_EMERGENCY_BATCH", 3)
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.append(builds) or [True] * len(builds))
+    monkeypatch.setattr(retention_engine.disk_agent_service, "get_disk_usage", lambda server: {"usage_percent": 85.0})
+
+    with _catalog(datetime.utcnow()) as db:
+        db.query(Build).filter(Build.build_number != "4").update({Build.size_bytes: None})
+        db.query(Build).filter(Build.build_number == "4").update({Build.size_bytes: 4000})
+        run = retention_engine.CleanupRun(trigger="emergency")
+        db.add(run)
+        db.commit()
+        # the average (4000 bytes of 100000 = 4%) projects two unmeasured builds to get 97% below 90%
+        deleted, freed, usage = retention_engine._run_emergency_for_server(_server(), db, run, 97.0, 100000)
+
+    assert calls == [[("android", "1"), ("android", "2")]]
+    assert (deleted, usage) == (2, 85.0)
+
+
+def test_emergency_pass_discounts_the_trash_still_being_purged(monkeypatch):
+    """The agent frees trashed builds later, so its raw usage lags the deletes: the pass goes
+    by the usage net of trash_bytes and never raises its own projection to the raw usage."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    monkeypatch.setattr(retention_engine, "_EMERGENCY_BATCH", 1)
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.append(builds) or [True] * len(builds))
+    # nothing purged yet: df still says 92%
+    monkeypatch.setattr(retention_engine.disk_agent_service, "get_disk_usage", lambda server: {
+        "total_bytes": 4000, "used_bytes": 3680, "usage_percent": 92.0, "trash_bytes": 100 * len(calls),
+    })
+
+    with _catalog(datetime.utcnow()) as db:
+        run = retention_engine.CleanupRun(trigger="emergency")
+        db.add(run)
+        db.commit()
+        deleted, _, usage = retention_engine._run_emergency_for_server(_server(), db, run, 92.0, 4000)
+
+    assert calls == [[("android", "1")]]
+    assert (deleted, usage) == (1, 89.5)
+
+
+def test_quota_pass_trims_projects_over_their_rollup_quota(monkeypatch):
+    """Over-quota projects lose their lowest-score settled builds, via the agent's batch delete."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.append(builds) or [True] * len(builds))
+    server = config.BinaryServerConfig(
+        name="mobile", project_max_builds=2,
+        custom_projects=[config.CustomProject(path="ios", retention_days=30, max_bytes=50)],
+    )
+
+    with _catalog(datetime.utcnow()) as db:
+        db.add_all([
+            ProjectRollup(server_name="mobile", path="android", level=1, builds=4, size_bytes=400),
+            ProjectRollup(server_name="mobile", path="ios", level=1, builds=1, size_bytes=100),
+        ])
+        run = retention_engine.CleanupRun(trigger="scheduled")
+        db.add(run)
+        db.commit()
+        deleted, freed = retention_engine._run_quota_for_server(server, db, run)
+
+    # android 3 is still in its upload grace period and android 4 has the highest score
+    assert calls == [[("android", "1"), ("android", "2")], [("ios", "1")]]
+    assert (deleted, freed) == (3, 300)
+
+
+def test_quota_pass_takes_exclusive_bytes_off_the_rollup(monkeypatch):
+    """The rollup counts hard-linked files once, so a delete only takes the build's exclusive
+    bytes off it: trimming goes on until those bring the project within its quota."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.append(builds) or [True] * len(builds))
+    server = config.BinaryServerConfig(name="mobile", project_max_bytes=150)
+
+    with _catalog(datetime.utcnow()) as db:
+        db.query(Build).filter(Build.project_name == "android").update({Build.exclusive_bytes: 50})
+        db.add(ProjectRollup(server_name="mobile", path="android", level=1, builds=4, size_bytes=250))
+        run = retention_engine.CleanupRun(trigger="scheduled")
+        db.add(run)
+        db.commit()
+        deleted, freed = retention_engine._run_quota_for_server(server, db, run)
+        rollup = db.query(ProjectRollup).one()
+
+    # full sizes (100 each) would have stopped after android 1
+    assert calls == [[("android", "1"), ("android", "2")]]
+    assert (deleted, freed) == (2, 100)
+    assert (rollup.builds, rollup.size_bytes) == (2, 150)
+
+
+def test_quota_pass_charges_unmeasured_builds_the_project_average(monkeypatch):
+    """A bytes quota is judged with unmeasured builds at the rollup's average measured size,
+    so trimming stops once the estimate fits instead of running out of candidates."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.append(builds) or [True] * len(builds))
+    server = config.BinaryServerConfig(name="mobile", project_max_bytes=250)
+
+    with _catalog(datetime.utcnow()) as db:
+        db.query(Build).filter(Build.project_name == "android", Build.build_number != "4").update(
+            {Build.size_bytes: None})
+        db.add(ProjectRollup(server_name="mobile", path="android", level=1, builds=4, size_bytes=100,
+                             unsized_builds=3))
+        run = retention_engine.CleanupRun(trigger="scheduled")
+        db.add(run)
+        db.commit()
+        deleted, _ = retention_engine._run_quota_for_server(server, db, run)
+        rollup = db.query(ProjectRollup).one()
+
+    # 3 unmeasured builds at 100 bytes each: 400 bytes, two deletes bring it to 200
+    assert calls == [[("android", "1"), ("android", "2")]]
+    assert deleted == 2
+    assert (rollup.builds, rollup.size_bytes, rollup.unsized_builds) == (2, 100, 1)
+
+
+def test_passes_commit_their_deletes_before_the_next_stream(monkeypatch, tmp_path):
+    """Candidates stream on a connection of their own, so on a file database the emergency pass
+    must not be handed builds the quota pass (or its own previous batch) already deleted."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    monkeypatch.setattr(retention_engine, "_EMERGENCY_BATCH", 1)
+    calls = []
+    monkeypatch.setattr(retention_engine.disk_agent_service, "delete_builds",
+                        lambda server, builds: calls.extend(builds) or [True] * len(builds))
+    monkeypatch.setattr(retention_engine.disk_agent_service, "get_disk_usage",
+                        lambda server: {"usage_percent": 99.0 - len(calls)})
+    server = config.BinaryServerConfig(name="mobile", project_max_builds=3)
+
+    with _catalog(datetime.utcnow(), f"sqlite:///{tmp_path / 'catalog.db'}") as db:
+        db.add(ProjectRollup(server_name="mobile", path="android", level=1, builds=4, size_bytes=400))
+        run = retention_engine.CleanupRun(trigger="emergency")
+        db.add(run)
+        db.commit()
+        retention_engine._run_quota_for_server(server, db, run)
+        retention_engine._run_emergency_for_server(server, db, run, 99.0, 4000)
+
+    # quota: android 1; emergency, one build per batch, until the candidates run out (android 3 is new)
+    assert calls == [("android", "1"), ("ios", "1"), ("android", "2"), ("android", "4")]
+
+
+def test_rules_protect_and_extend_builds_in_sql_and_in_memory(monkeypatch):
+    """keep_last windows and extra days give the same candidates streamed from SQL and scored in memory."""
+    monkeypatch.setattr(config, "_config", config.AppConfig(demo_mode=False))
+    server = _server()
+    server.rules = [
+        config.RetentionRule(projects="android", keep_last=2),  # android 3 and 2 are the newest
+        config.RetentionRule(builds="1", extra_days=10),
+    ]
+
+    with _catalog(datetime.utcnow()) as db:
+        streamed = list(retention_engine.iter_candidates(server, db))
+        in_memory = list(retention_engine._collect_all_builds(server, db))
+        page = [(b.build_number, b.protected) for b, _ in retention_engine.iter_project_builds(server, "android", db)]
+
+    expected = [("android", "1", 7), ("ios", "1", 20), ("android", "4", 48)]  # android 4 has a 60-day override
+    assert [(c.project, c.build_number, round(c.score)) for c in streamed] == expected
+    assert [(c.project, c.build_number, round(c.score)) for c in in_memory] == expected
+    assert page == [("1", False), ("2", True), ("3", True), ("4", False)]
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+from app.config import BinaryServerConfig, CustomProject
+from app.services.build_index import BuildRecord, BuildTable, ScoredBuild
+from app.services.simulation_service import evaluate_policy, plan_server, usage_curve
+
+GB = 1024**3
+
+
+def _build(n: int, score: float, size: int | None) -> ScoredBuild:
+    record = BuildRecord.create("mobile", "android", str(n), datetime.utcnow(), size)
+    return ScoredBuild(record, age_days=7 - score, retention_days=7, is_custom=False, score=score)
+
+
+def _disk(usage_percent: float, total: int = 100 * GB) -> dict:
+    return {"total_bytes": total, "usage_percent": usage_percent}
+
+
+def test_plan_stops_at_target():
+    """Deletions should stop as soon as projected usage reaches the target."""
+    server = BinaryServerConfig(trigger_threshold_percent=90, target_threshold_percent=80)
+    builds = [_build(i, score=i - 10, size=5 * GB) for i in range(10)]
+    plan = plan_server(server, builds, _disk(92.0))
+
+    assert plan["builds_deleted"] == 3  # 92 -> 87 -> 82 -> 77
+    assert plan["bytes_freed"] == 15 * GB
+    assert plan["target_reached"]
+    assert [t["build_number"] for t in plan["targets"]] == ["0", "1", "2"]
+
+
+def test_plan_charges_fallback_size_for_unknown_builds():
+    """Builds without a size should be charged the fallback (average known) size."""
+    server = BinaryServerConfig(target_threshold_percent=80)
+    builds = [_build(0, -5, None), _build(1, -4, 2 * GB), _build(2, -3, 4 * GB)]
+    plan = plan_server(server, builds, _disk(85.0), fallback_size=3 * GB)
+
+    assert plan["targets"][0]["size_bytes"] == 3 * GB
+
+
+def test_plan_charges_exclusive_bytes_of_hard_linked_builds():
+    """A build sharing hard-linked files frees only its exclusive bytes."""
+    server = BinaryServerConfig(target_threshold_percent=80)
+    shared = BuildRecord.create("mobile", "android", "0", datetime.utcnow(), 10 * GB, GB)
+    builds = [ScoredBuild(shared, 8, 7, False, -1), _build(1, 0, 5 * GB)]
+    plan = plan_server(server, builds, _disk(85.0))
+
+    assert plan["builds_deleted"] == 2  # 85 -> 84 -> 79, not 85 -> 75
+    assert plan["targets"][0]["size_bytes"] == GB
+    assert plan["bytes_freed"] == 6 * GB
+
+
+def test_plan_charges_nothing_for_fully_hard_linked_builds():
+    """An exclusive size of 0 is measured (every file is linked elsewhere), not unknown."""
+    server = BinaryServerConfig(target_threshold_percent=80)
+    linked = BuildRecord.create("mobile", "android", "0", datetime.utcnow(), 10 * GB, 0)
+    builds = [ScoredBuild(linked, 8, 7, False, -1), _build(1, 0, 5 * GB), _build(2, 1, 5 * GB)]
+    plan = plan_server(server, builds, _disk(85.0), fallback_size=10 * GB)
+
+    assert [t["size_bytes"] for t in plan["targets"]] == [0, 5 * GB]  # 85 -> 85 -> 80, not 85 -> 75
+    assert plan["bytes_freed"] == 5 * GB
+
+
+def test_plan_below_target_deletes_nothing():
+    server = BinaryServerConfig(trigger_threshold_percent=90, target_threshold_percent=80)
+    plan = plan_server(server, [_build(0, -1, GB)], _disk(50.0))
+
+    assert plan["builds_deleted"] == 0
+    assert not plan["would_trigger"]
+
+
+def test_plan_compresses_cold_builds_and_deletes_compressed_ones():
+    """Cold-band builds free their size minus the estimated archive; compressed and expired builds are deleted."""
+    server = BinaryServerConfig(target_threshold_percent=80, cold_band_days=3)
+    compressed = BuildRecord.create("mobile", "android", "1", datetime.utcnow(), GB, compressed=True)
+    builds = [_build(0, -1, 10 * GB), ScoredBuild(compressed, 5, 7, False, 2), _build(2, 2, 10 * GB),
+              _build(3, 5, 10 * GB)]
+    plan = plan_server(server, builds, _disk(99.0))
+
+    assert [t["action"] for t in plan["targets"]] == ["delete", "delete", "compress", "delete"]
+    assert plan["targets"][2]["size_bytes"] == 6 * GB  # 10 GB minus a 40% archive
+    assert (plan["builds_deleted"], plan["builds_compressed"]) == (3, 1)
+    assert plan["bytes_freed"] == 27 * GB
+
+
+def test_usage_curve_is_bounded_and_ends_at_last_target():
+    targets = [{"usage_after": 90 - i * 0.001} for i in range(1000)]
+    curve = usage_curve(90.0, targets, points=50)
+
+    assert len(curve) <= 52
+    assert curve[0]["builds_deleted"] == 0
+    assert curve[-1]["builds_deleted"] == 1000
+
+
+def _table(now):
+    listings = {
+        project: [BuildRecord.create("mobile", project, str(i), now - timedelta(days=i), GB) for i in range(1, 11)]
+        for project in ("android", "release")
+    }
+    return BuildTable.from_listings("mobile", listings, {("android", "9"): 30})
+
+
+def test_policy_counts_expired_builds_per_project():
+    """Raising a project's retention should shrink its expired set; overrides are honored."""
+    now = datetime.utcnow()
+    table = _table(now)
+    server = BinaryServerConfig(name="mobile", target_threshold_percent=80,
+                                custom_projects=[CustomProject(path="release", retention_days=8),
+                                                 CustomProject(path="release", retention_days=1)])  # first wins
+    impact = evaluate_policy(server, table, _disk(50.0), default_days=5, now=now)
+    by_project = {p["project"]: p for p in impact["projects"]}
+
+    # android: ages 6..10 expired under 5 days, except build 9 (30 day override)
+    assert by_project["android"]["expired_builds"] == 4
+    assert by_project["release"]["expired_builds"] == 2
+    assert impact["expired_bytes"] == 6 * GB
+    assert impact["deletable_builds"] == 0  # already below target
+
+
+def test_policy_deletable_walks_score_order_to_target():
+    now = datetime.utcnow()
+    impact = evaluate_policy(BinaryServerConfig(target_threshold_percent=80), _table(now),
+                             _disk(83.0), default_days=7, now=now)
+
+    assert impact["deletable_builds"] == 3
+    assert impact["usage_after_cleanup"] == 80.0
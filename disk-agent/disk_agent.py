@@ -9,31 +9,150 @@ Usage:
     uvicorn disk_agent:app --reload --host 0.0.0.0 --port 9090
 
     # Production
-    uvicorn disk_agent:app --host 0.0.0.0 --port 9090
+    uvicorn disk_agent:app --host 0.0.0.0 --port 9090 --workers 4
 
     # CLI mode
-    python3 disk_agent.py --path /data/binaries --port 9090
+    python3 disk_agent.py --path /data/binaries --port 9090 --workers 4
 
 Endpoints:
-    GET  /disk-usage                → overall disk usage for the monitored path
-    GET  /dir-size?path=sub/dir     → size of a subdirectory (relative to root)
-    GET  /files/list?path=&depth=1  → list directories with mtime
+    GET  /disk-usage                → overall disk usage for the monitored path, and trash_bytes:
+                                      what the background purge of trashed builds is still to free
+    GET  /dir-size?path=sub/dir     → size and exclusive (freeable) bytes of a subdirectory
+                                      (relative to root; &blocks=true for allocated size)
+    GET  /files/list?path=&depth=1  → list directories with mtime (&sizes=true adds size/exclusive bytes)
+                                      ETag / If-None-Match → 304 when nothing changed
+    GET  /files/changes?since=0&depth=2 → build additions/removals/changes after a journal seq
+    GET  /files/rollup?depth=2      → build count, bytes and mtime range per directory down to depth
     GET  /files/exists?path=sub/dir → check if a path exists
     DELETE /files?path=sub/dir      → delete a directory
+    POST /files/delete-batch        → delete many directories in parallel (JSON {paths, trash});
+                                      trashed ones are renamed away at once and purged in the background
+    POST /files/compress?path=sub/dir   → replace a directory's contents with a zstd tarball, mtime kept
+    POST /files/decompress?path=sub/dir → extract it again
+    GET  /dedup?depth=1             → dedup store state, last pass and bytes saved per directory
+    POST /dedup/run                 → start a dedup pass in the background
+    GET  /admin/throttle            → I/O priority, rate limits and throttling counters
+    PUT  /admin/throttle            → change them at runtime (JSON body, any subset of fields)
     GET  /health                    → health check
+
+Responses larger than 1 KiB are gzip-compressed when the client accepts it.
+
+Filesystem scans and deletes run on a small dedicated thread pool, so /health and
+/disk-usage keep answering while they are busy. That pool runs at a lowered I/O
+priority (DISK_AGENT_IO_CLASS/IO_LEVEL/NICE) and is paced by token buckets
+(DISK_AGENT_FILES_PER_SEC, DISK_AGENT_BYTES_PER_SEC) so cleanups don't starve
+uploads. Worker processes share build sizes, change journals and throttle
+settings through a SQLite index (DISK_AGENT_INDEX_PATH, default
+<root>/.disk-agent/index.sqlite); hidden directories are never listed.
+
+Directory sizes are walked in parallel (DISK_AGENT_WALK_THREADS), count hard-linked
+files once and, with DISK_AGENT_SIZE_BLOCKS=1, report allocated blocks so predicted
+savings match what `df` shows after a delete. Exclusive bytes leave out inodes that
+are still hard-linked from outside the directory, i.e. they are what deleting it frees.
+
+Compression needs the optional `zstandard` package (501 without it). A compressed
+build keeps its directory and mtime and holds a single .build.tar.zst; listings and
+journal entries mark it `compressed`, and its sizes are those of the archive.
+
+With DISK_AGENT_DEDUP_INTERVAL (seconds) set, a background pass hashes files of
+the same size in parallel (DISK_AGENT_HASH_THREADS) and replaces identical ones
+with hard links to an object in the content-addressed store <root>/.cas. Hashes
+are kept per inode/size/mtime, so a pass only reads new files. The store's own
+link is left out of the hard-link accounting, and deleting the last build linking
+an object removes the object too.
 """
 
 import argparse
+import asyncio
+import ctypes
+import errno
+import fcntl
+import hashlib
+import json
+import logging
 import os
+import platform
 import shutil
+import sqlite3
+import sys
+import tarfile
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone
+from typing import Literal, NamedTuple
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, Field
+
+try:
+    import zstandard
+except ImportError:  # optional: only /files/compress and /files/decompress need it
+    zstandard = None
+
+logger = logging.getLogger("uvicorn.error")
 
 ROOT_PATH = os.environ.get("DISK_AGENT_PATH", "/data/binaries")
 
-app = FastAPI(title="Disk Agent", description="Binary Server Disk Usage & File Management Agent")
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Finish purging whatever a previous run left in the trash
+    asyncio.get_running_loop().run_in_executor(_heavy_pool, _throttled, _purge_trash)
+    dedup = asyncio.create_task(_dedup_loop()) if _DEDUP_INTERVAL > 0 else None
+    yield
+    if dedup:
+        dedup.cancel()
+
+
+app = FastAPI(
+    title="Disk Agent", description="Binary Server Disk Usage & File Management Agent", lifespan=_lifespan
+)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Filesystem-heavy requests (walks, listings, deletes) run here instead of the
+# request threadpool, so they can't starve the cheap endpoints
+_heavy_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("DISK_AGENT_HEAVY_THREADS", "4")), thread_name_prefix="disk-agent-fs"
+)
+
+# Directory-size walks fan out over this pool, one task per directory
+_walk_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("DISK_AGENT_WALK_THREADS", "8")), thread_name_prefix="disk-agent-walk"
+)
+
+_SIZE_CACHE_MIN_AGE = 600  # seconds; don't cache directories that may still be uploading
+# Report allocated blocks instead of apparent sizes, i.e. what deleting a build frees
+_SIZE_BLOCKS = os.environ.get("DISK_AGENT_SIZE_BLOCKS", "").lower() in ("1", "true", "yes")
+
+# Last encoded listing per (base, depth, sizes) -> (etag, body), reused while the ETag matches
+_listing_cache: dict[tuple[str, int, bool], tuple[str, bytes]] = {}
+
+_JOURNAL_MAX_ENTRIES = int(os.environ.get("DISK_AGENT_JOURNAL_SIZE", "100000"))
+_JOURNAL_MIN_RESCAN = 5  # seconds between rescans triggered by /files/changes
+_HOT_BUILD_AGE = 3600  # seconds; builds this young are re-stat'ed on every rescan
+
+_DEDUP_INTERVAL = int(os.environ.get("DISK_AGENT_DEDUP_INTERVAL", "0"))  # seconds between passes, 0 = off
+_DEDUP_MIN_SIZE = int(os.environ.get("DISK_AGENT_DEDUP_MIN_SIZE", str(64 * 1024)))  # smaller files aren't worth it
+_DEDUP_REPORT_LEVELS = 3  # directory levels below the root with a savings total
+_HASH_CHUNK = 1024 * 1024
+
+# Files are hashed here, several at a time; reads are paced by the byte token bucket
+_hash_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("DISK_AGENT_HASH_THREADS", "4")), thread_name_prefix="disk-agent-hash"
+)
+
+_ARCHIVE_NAME = ".build.tar.zst"  # a compressed build directory holds only this file
+_ZSTD_LEVEL = int(os.environ.get("DISK_AGENT_ZSTD_LEVEL", "3"))
+_ZSTD_THREADS = int(os.environ.get("DISK_AGENT_ZSTD_THREADS", "0")) or os.cpu_count() or 1
+
+
+async def _run_heavy(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_heavy_pool, _throttled, fn, *args)
 
 
 def _safe_full_path(rel_path: str) -> str:
@@ -44,10 +163,423 @@ def _safe_full_path(rel_path: str) -> str:
     return full
 
 
+# --- Shared scan index ---
+
+class ScanIndex:
+    """SQLite file shared by every agent worker process.
+
+    Holds directory sizes keyed by root-relative path (build directories are
+    write-once, so a size stays valid until the directory mtime changes), the
+    change journals, the builds compressed in place (`archives`, valid for the
+    same mtime) and the dedup state: file digests by inode, the store objects and
+    the savings of the last pass. WAL mode lets all workers read while one writes; each thread
+    gets its own connection.
+
+    For hard-link accounting a size also stores `unique_bytes` (entries with a
+    single link) and, per multiply-linked inode, how many of its links lie in the
+    directory. An inode is exclusive to a build when all its links are in it,
+    judged against the link count last seen in `inodes`, which deletes made
+    through the agent decrement; `build_usage` adds those up."""
+
+    VERSION = 2  # bump to drop and rebuild the cache tables on upgrade
+    CACHE_TABLES = ("sizes", "build_inodes", "inodes")
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sizes (
+            path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size_bytes INTEGER NOT NULL,
+            unique_bytes INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS build_inodes (
+            path TEXT NOT NULL, dev INTEGER NOT NULL, ino INTEGER NOT NULL, links INTEGER NOT NULL,
+            PRIMARY KEY (path, dev, ino));
+        CREATE INDEX IF NOT EXISTS build_inodes_inode ON build_inodes (dev, ino);
+        CREATE TABLE IF NOT EXISTS inodes (
+            dev INTEGER NOT NULL, ino INTEGER NOT NULL, nlink INTEGER NOT NULL, size_bytes INTEGER NOT NULL,
+            PRIMARY KEY (dev, ino));
+        CREATE VIEW IF NOT EXISTS build_usage AS
+            SELECT s.path, s.mtime_ns, s.size_bytes, s.unique_bytes + COALESCE((
+                SELECT SUM(i.size_bytes) FROM build_inodes b JOIN inodes i ON i.dev = b.dev AND i.ino = b.ino
+                WHERE b.path = s.path AND b.links >= i.nlink), 0) AS exclusive_bytes
+            FROM sizes s;
+        CREATE TABLE IF NOT EXISTS journals (
+            depth INTEGER PRIMARY KEY, epoch TEXT NOT NULL, seq INTEGER NOT NULL, last_scan REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS journal_entries (
+            depth INTEGER NOT NULL, seq INTEGER NOT NULL, op TEXT NOT NULL, path TEXT NOT NULL,
+            mtime_ns INTEGER, PRIMARY KEY (depth, seq));
+        CREATE TABLE IF NOT EXISTS builds (
+            depth INTEGER NOT NULL, path TEXT NOT NULL, parent TEXT NOT NULL, mtime_ns INTEGER NOT NULL,
+            PRIMARY KEY (depth, path));
+        CREATE INDEX IF NOT EXISTS builds_parent ON builds (depth, parent);
+        CREATE TABLE IF NOT EXISTS parents (
+            depth INTEGER NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER NOT NULL, PRIMARY KEY (depth, path));
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS archives (
+            path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, original_bytes INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            dev INTEGER NOT NULL, ino INTEGER NOT NULL, size_bytes INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+            digest TEXT NOT NULL, PRIMARY KEY (dev, ino));
+        CREATE TABLE IF NOT EXISTS cas_objects (
+            digest TEXT PRIMARY KEY, dev INTEGER NOT NULL, ino INTEGER NOT NULL, size_bytes INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS cas_objects_inode ON cas_objects (dev, ino);
+        CREATE TABLE IF NOT EXISTS dedup_savings (
+            path TEXT PRIMARY KEY, level INTEGER NOT NULL, files INTEGER NOT NULL, bytes_saved INTEGER NOT NULL);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit; multi-statement writes use write() for an explicit transaction
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._upgrade(conn)
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _upgrade(self, conn: sqlite3.Connection) -> None:
+        if conn.execute("PRAGMA user_version").fetchone()[0] == self.VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            conn.execute("DROP VIEW IF EXISTS build_usage")
+            for table in self.CACHE_TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"PRAGMA user_version = {self.VERSION}")
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def write(self):
+        """Transaction holding the database write lock, which serializes writers across processes."""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def read(self):
+        """Transaction giving a consistent snapshot across several queries."""
+        conn = self.conn()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def get_usage(self, rel: str, mtime_ns: int) -> tuple[int, int] | None:
+        """(size_bytes, exclusive_bytes) stored for this directory mtime."""
+        return self.conn().execute(
+            "SELECT size_bytes, exclusive_bytes FROM build_usage WHERE path = ? AND mtime_ns = ?", (rel, mtime_ns)
+        ).fetchone()
+
+    def put_usage(self, rel: str, mtime_ns: int, usage: "DirUsage") -> None:
+        with self.write() as conn:
+            old = conn.execute("SELECT dev, ino FROM build_inodes WHERE path = ?", (rel,)).fetchall()
+            conn.execute("DELETE FROM build_inodes WHERE path = ?", (rel,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sizes (path, mtime_ns, size_bytes, unique_bytes) VALUES (?, ?, ?, ?)",
+                (rel, mtime_ns, usage.size_bytes, usage.unique_bytes),
+            )
+            conn.executemany(
+                "INSERT INTO build_inodes (path, dev, ino, links) VALUES (?, ?, ?, ?)",
+                [(rel, dev, ino, links) for (dev, ino), (links, _, _) in usage.shared.items()],
+            )
+            # A fresh stat is the best link count we have, also for the other builds sharing the inode
+            conn.executemany(
+                "INSERT OR REPLACE INTO inodes (dev, ino, nlink, size_bytes) VALUES (?, ?, ?, ?)",
+                [(dev, ino, nlink, amount) for (dev, ino), (_, nlink, amount) in usage.shared.items()],
+            )
+            self._drop_orphan_inodes(conn, old)
+            self._bump_usage_generation(conn)
+
+    def reset_sizes_on_mode_change(self, mode: str) -> None:
+        """Drop cached sizes measured in another size mode (apparent vs blocks)."""
+        with self.write() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'size_mode'").fetchone()
+            if row and row[0] == mode:
+                return
+            conn.execute("DELETE FROM sizes")
+            conn.execute("INSERT OR REPLACE INTO settings (key, value, version) VALUES ('size_mode', ?, 1)", (mode,))
+
+    def drop_sizes(self, rel: str) -> None:
+        """Forget the size of `rel` and of every directory below it after they were deleted.
+
+        The links they held are subtracted from the shared inodes' link counts, which
+        can make those inodes exclusive to the builds still linking them."""
+        # '0' sorts right after '/', so the range covers exactly the "rel/..." paths
+        with self.write() as conn:
+            self._drop_sizes(conn, "path = ? OR (path > ? AND path < ?)", (rel, f"{rel}/", f"{rel}0"))
+
+    def forget_sizes(self, paths: set[str]) -> None:
+        """Forget the sizes of exactly these directories, whose files changed under a restored mtime."""
+        with self.write() as conn:
+            for path in paths:
+                self._drop_sizes(conn, "path = ?", (path,))
+
+    def _drop_sizes(self, conn: sqlite3.Connection, where: str, params: tuple) -> None:
+        removed = conn.execute(
+            f"SELECT dev, ino, SUM(links) FROM build_inodes WHERE {where} GROUP BY dev, ino", params
+        ).fetchall()
+        conn.executemany(
+            "UPDATE inodes SET nlink = nlink - ? WHERE dev = ? AND ino = ?",
+            [(links, dev, ino) for dev, ino, links in removed],
+        )
+        conn.execute(f"DELETE FROM build_inodes WHERE {where}", params)
+        conn.execute(f"DELETE FROM sizes WHERE {where}", params)
+        self._drop_orphan_inodes(conn, [(dev, ino) for dev, ino, _ in removed])
+        self._bump_usage_generation(conn)
+
+    def archived(self) -> dict[str, int]:
+        """{path: mtime_ns} of the directories compressed by the agent."""
+        return dict(self.conn().execute("SELECT path, mtime_ns FROM archives"))
+
+    def put_archive(self, rel: str, mtime_ns: int, original_bytes: int) -> None:
+        with self.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO archives (path, mtime_ns, original_bytes) VALUES (?, ?, ?)",
+                (rel, mtime_ns, original_bytes),
+            )
+            self._bump_usage_generation(conn)
+
+    def drop_archives(self, rel: str) -> None:
+        """Forget that `rel`, or directories below it, are compressed."""
+        with self.write() as conn:
+            conn.execute("DELETE FROM archives WHERE path = ? OR (path > ? AND path < ?)", (rel, f"{rel}/", f"{rel}0"))
+            self._bump_usage_generation(conn)
+
+    def usage_generation(self) -> int:
+        """Counter bumped whenever stored exclusive bytes or archives may have changed without a directory
+        mtime change."""
+        row = self.conn().execute("SELECT version FROM settings WHERE key = 'usage_generation'").fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _bump_usage_generation(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "INSERT INTO settings (key, value, version) VALUES ('usage_generation', '', 1)"
+            " ON CONFLICT (key) DO UPDATE SET version = version + 1"
+        )
+
+    @staticmethod
+    def _drop_orphan_inodes(conn: sqlite3.Connection, candidates: list[tuple[int, int]]) -> None:
+        conn.executemany(
+            "DELETE FROM inodes WHERE dev = ? AND ino = ?"
+            " AND NOT EXISTS (SELECT 1 FROM build_inodes b WHERE b.dev = inodes.dev AND b.ino = inodes.ino)",
+            candidates,
+        )
+
+
+_index: ScanIndex | None = None
+_index_lock = threading.Lock()
+
+
+def _scan_index() -> ScanIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = os.environ.get("DISK_AGENT_INDEX_PATH") or os.path.join(ROOT_PATH, ".disk-agent", "index.sqlite")
+            _index = ScanIndex(path)
+            _index.reset_sizes_on_mode_change("blocks" if _SIZE_BLOCKS else "apparent")
+    return _index
+
+
+def _rel_path(full_path: str) -> str:
+    return os.path.relpath(full_path, ROOT_PATH)
+
+
+# --- I/O priority and throttling ---
+
+_IOPRIO_CLASSES = {"none": 0, "realtime": 1, "best-effort": 2, "idle": 3}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1  # with a thread id, targets just that thread
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i386": 289, "i686": 289}
+_THROTTLE_RELOAD = 2  # seconds between checks for settings changed through another worker
+# Worker processes sharing the throttle rates. main() exports it; plain `uvicorn --workers N`
+# needs DISK_AGENT_WORKERS=N set too, or each worker takes the full rate
+_WORKERS = int(os.environ.get("DISK_AGENT_WORKERS", "1"))
+
+
+class TokenBucket:
+    """Limits a quantity to `rate` units per second, with bursts of up to one second's worth.
+
+    take() lets the bucket go into debt and sleeps the caller until the debt is
+    repaid, so an item larger than the burst (a big file) still goes through.
+    A rate of 0 disables the limit but keeps counting."""
+
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.consumed = 0
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self.rate = rate
+            self.tokens = min(self.tokens, rate)
+
+    def take(self, amount: int) -> None:
+        with self.lock:
+            self.consumed += amount
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - amount
+            self.updated = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+
+
+class ThrottleUpdate(BaseModel):
+    files_per_second: float | None = Field(None, ge=0, description="Agent-wide file limit, 0 = unlimited")
+    bytes_per_second: float | None = Field(None, ge=0, description="Agent-wide delete byte limit, 0 = unlimited")
+    io_class: Literal["none", "best-effort", "idle"] | None = None
+    io_level: int | None = Field(None, ge=0, le=7, description="Priority within the best-effort class")
+    nice: int | None = Field(None, ge=0, le=19)
+
+
+class Throttle:
+    """I/O priority and rate limits for the heavy filesystem pool.
+
+    Settings are agent-wide: they are stored in the scan index so a change made
+    through any worker reaches the others within _THROTTLE_RELOAD seconds, and
+    the rates are split evenly across worker processes. The priority is applied
+    per pool thread (ioprio_set/setpriority take thread ids on Linux) the next
+    time the thread picks up work. Raising niceness back down needs CAP_SYS_NICE."""
+
+    def __init__(self):
+        self.settings = {
+            "files_per_second": float(os.environ.get("DISK_AGENT_FILES_PER_SEC", "0")),
+            "bytes_per_second": float(os.environ.get("DISK_AGENT_BYTES_PER_SEC", "0")),
+            "io_class": os.environ.get("DISK_AGENT_IO_CLASS", "best-effort"),
+            "io_level": int(os.environ.get("DISK_AGENT_IO_LEVEL", "7")),
+            "nice": int(os.environ.get("DISK_AGENT_NICE", "10")),
+        }
+        self.files = TokenBucket()
+        self.bytes = TokenBucket()
+        self.version = 0
+        self.generation = 0  # bumped whenever the priority settings change
+        self.checked = 0.0
+        self.active = 0
+        self.lock = threading.Lock()
+        self._thread = threading.local()
+        self._apply(self.settings)
+
+    def _apply(self, settings: dict) -> None:
+        if any(settings[k] != self.settings[k] for k in ("io_class", "io_level", "nice")):
+            self.generation += 1
+        self.settings = settings
+        self.files.set_rate(settings["files_per_second"] / _WORKERS)
+        self.bytes.set_rate(settings["bytes_per_second"] / _WORKERS)
+
+    def reload(self) -> None:
+        """Pick up settings stored by any worker; at most once per _THROTTLE_RELOAD seconds."""
+        now = time.monotonic()
+        if now - self.checked < _THROTTLE_RELOAD:
+            return
+        self.checked = now
+        row = _scan_index().conn().execute("SELECT value, version FROM settings WHERE key = 'throttle'").fetchone()
+        if row and row[1] != self.version:
+            with self.lock:
+                self._apply({**self.settings, **json.loads(row[0])})
+                self.version = row[1]
+
+    def update(self, changes: ThrottleUpdate) -> dict:
+        with _scan_index().write() as conn:
+            row = conn.execute("SELECT value, version FROM settings WHERE key = 'throttle'").fetchone()
+            settings = {**self.settings, **(json.loads(row[0]) if row else {})}
+            settings.update(changes.model_dump(exclude_none=True))
+            version = (row[1] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value, version) VALUES ('throttle', ?, ?)",
+                (json.dumps(settings), version),
+            )
+        with self.lock:
+            self._apply(settings)
+            self.version = version
+        return settings
+
+    def enter_thread(self) -> None:
+        """Apply the current priority to the calling pool thread if it changed."""
+        if getattr(self._thread, "generation", -1) == self.generation:
+            return
+        self._thread.generation = self.generation
+        _set_thread_priority(self.settings["io_class"], self.settings["io_level"], self.settings["nice"])
+
+    def stats(self) -> dict:
+        return {
+            **self.settings,
+            "pid": os.getpid(),
+            "workers": _WORKERS,
+            "active_tasks": self.active,
+            "files_total": self.files.consumed,
+            "bytes_total": self.bytes.consumed,
+            "files_wait_seconds": round(self.files.waited, 3),
+            "bytes_wait_seconds": round(self.bytes.waited, 3),
+        }
+
+
+def _set_thread_priority(io_class: str, io_level: int, nice: int) -> None:
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, nice)
+    except (AttributeError, OSError) as e:
+        logger.warning("Could not set niceness %d: %s", nice, e)
+
+    syscall_nr = _SYS_IOPRIO_SET.get(platform.machine())
+    if syscall_nr is None or not sys.platform.startswith("linux"):
+        return
+    level = io_level if io_class == "best-effort" else 0
+    ioprio = (_IOPRIO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT) | level
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(syscall_nr, _IOPRIO_WHO_PROCESS, tid, ioprio) != 0:
+        logger.warning("Could not set I/O class %s: %s", io_class, os.strerror(ctypes.get_errno()))
+
+
+_throttle = Throttle()
+
+
+def _throttled(fn, *args):
+    _throttle.reload()
+    _throttle.enter_thread()
+    with _throttle.lock:
+        _throttle.active += 1
+    try:
+        return fn(*args)
+    finally:
+        with _throttle.lock:
+            _throttle.active -= 1
+
+
+@app.get("/admin/throttle")
+def get_throttle():
+    """Current throttle settings and this worker's counters (see `pid`)."""
+    _throttle.reload()
+    return _throttle.stats()
+
+
+@app.put("/admin/throttle")
+def update_throttle(update: ThrottleUpdate):
+    """Change the limits/priority of heavy filesystem work for all workers."""
+    _throttle.update(update)
+    return _throttle.stats()
+
+
 # --- Disk usage endpoints ---
 
 @app.get("/disk-usage")
-def disk_usage():
+async def disk_usage():
     try:
         usage = shutil.disk_usage(ROOT_PATH)
         return {
@@ -55,79 +587,546 @@ def disk_usage():
             "used_bytes": usage.used,
             "free_bytes": usage.free,
             "usage_percent": round(usage.used / usage.total * 100, 1),
+            "trash_bytes": _trash_bytes(),
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/dir-size")
-def dir_size(path: str = Query(..., description="Relative path to measure")):
+async def dir_size(
+    path: str = Query(..., description="Relative path to measure"),
+    blocks: bool | None = Query(None, description="Allocated blocks instead of apparent size (default: agent setting)"),
+):
+    """Size of a directory, and `exclusive_bytes`: what deleting it alone would free."""
     full_path = _safe_full_path(path)
     if not os.path.exists(full_path):
         raise HTTPException(status_code=404, detail="Path not found")
 
     try:
-        total_size = 0
-        for dirpath, _, filenames in os.walk(full_path):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                if os.path.isfile(fp):
-                    total_size += os.path.getsize(fp)
-        return {"path": path, "size_bytes": total_size}
+        usage = await _run_heavy(_dir_usage, full_path, _SIZE_BLOCKS if blocks is None else blocks)
+        return {"path": path, "size_bytes": usage.size_bytes, "exclusive_bytes": usage.exclusive_bytes}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class DirUsage(NamedTuple):
+    size_bytes: int  # every inode counted once
+    unique_bytes: int  # singly-linked entries (and directories in blocks mode)
+    shared: dict[tuple[int, int], tuple[int, int, int]]  # (dev, ino) -> (links in tree, st_nlink, size)
+
+    @property
+    def exclusive_bytes(self) -> int:
+        """Bytes freed by deleting the tree: hard-linked inodes count only if no link is outside it."""
+        return self.unique_bytes + sum(size for links, nlink, size in self.shared.values() if links >= nlink)
+
+
+def _dir_usage(full_path: str, blocks: bool = _SIZE_BLOCKS) -> DirUsage:
+    """Usage of a directory tree: apparent file sizes, or allocated blocks including directories.
+
+    Each directory is scanned as its own task on _walk_pool, since on NFS every
+    scandir/stat is a round trip. Symlinks are not followed, and an inode with
+    several hard links is counted once."""
+    unique = os.lstat(full_path).st_blocks * 512 if blocks else 0
+    shared: dict[tuple[int, int], tuple[int, int, int]] = {}
+    pending = {_walk_pool.submit(_scan_dir_usage, full_path, blocks)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                size, linked, subdirs = future.result()
+                unique += size
+                for inode, nlink, amount in linked:
+                    links = shared[inode][0] + 1 if inode in shared else 1
+                    shared[inode] = (links, nlink, amount)
+                pending.update(_walk_pool.submit(_scan_dir_usage, d, blocks) for d in subdirs)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+    for inode in _store_inodes(list(shared)):  # the store's link doesn't keep a build's file alive
+        links, nlink, amount = shared[inode]
+        shared[inode] = (links, nlink - 1, amount)
+    return DirUsage(unique + sum(amount for _, _, amount in shared.values()), unique, shared)
+
+
+def _scan_dir_usage(path: str, blocks: bool) -> tuple[int, list[tuple[tuple[int, int], int, int]], list[str]]:
+    """One directory's (size of singly-linked entries, [(inode, nlink, size)] of hard-linked files, subdirs)."""
+    _throttle.enter_thread()
+    size = 0
+    linked: list[tuple[tuple[int, int], int, int]] = []
+    subdirs: list[str] = []
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return size, linked, subdirs  # removed or unreadable while walking
+    _throttle.files.take(len(entries))
+
+    for entry in entries:
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.path)
+            if blocks:
+                size += st.st_blocks * 512
+            continue
+        amount = st.st_blocks * 512 if blocks else st.st_size
+        if st.st_nlink > 1:
+            linked.append(((st.st_dev, st.st_ino), st.st_nlink, amount))
+        else:
+            size += amount
+    return size, linked, subdirs
+
+
+def _cached_dir_usage(full_path: str, mtime_ns: int) -> tuple[int, int]:
+    """(size_bytes, exclusive_bytes) of a directory, reusing the indexed values while its mtime is unchanged."""
+    index = _scan_index()
+    rel = _rel_path(full_path)
+    cached = index.get_usage(rel, mtime_ns)
+    if cached is not None:
+        return cached
+
+    usage = _dir_usage(full_path)
+    if time.time() - mtime_ns / 1e9 >= _SIZE_CACHE_MIN_AGE:
+        index.put_usage(rel, mtime_ns, usage)
+    return usage.size_bytes, usage.exclusive_bytes
+
+
 # --- File management endpoints ---
 
 @app.get("/files/list")
-def list_files(
+async def list_files(
+    request: Request,
     path: str = Query("", description="Relative path (empty = root)"),
     depth: int = Query(1, ge=1, le=10, description="Directory depth to scan"),
+    sizes: bool = Query(False, description="Include size_bytes and exclusive_bytes for each entry"),
 ):
-    """List directories at a given depth with modification times."""
+    """List directories at a given depth with modification times.
+
+    The ETag is a digest of the name and mtime of every directory scanned, so it
+    changes whenever a directory is added, removed or modified at any level.
+    With sizes each entry also has `exclusive_bytes`, the bytes deleting it alone frees."""
     base = ROOT_PATH if not path else _safe_full_path(path)
     if not os.path.isdir(base):
         raise HTTPException(status_code=404, detail="Path not found")
 
     try:
-        entries = _list_dirs_at_depth(base, depth, prefix="")
-        return {"path": path, "entries": entries}
+        return await _run_heavy(_list_files, base, path, depth, sizes, request.headers.get("if-none-match"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _list_dirs_at_depth(base: str, depth: int, prefix: str) -> list[dict]:
-    """Recursively list directories at a given depth."""
+def _list_files(base: str, path: str, depth: int, sizes: bool, if_none_match: str | None) -> Response:
+    scanned: list[tuple[str, str, int, bool]] = []
+    _scan_dirs(base, depth, prefix="", out=scanned)
+    # Sizes also change inside builds (uploads, in-place compression) without touching the
+    # scanned mtimes: the journal of the listed builds' depth tracks those
+    rel = _rel_path(base)
+    position = _journal((0 if rel == "." else rel.count("/") + 1) + depth).position() if sizes else ""
+    etag = _listing_etag(scanned, sizes, _scan_index().usage_generation(), position)
+    if etag in _parse_if_none_match(if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cache_key = (base, depth, sizes)
+    cached = _listing_cache.get(cache_key)
+    if cached and cached[0] == etag:
+        body = cached[1]
+    else:
+        archived = _scan_index().archived()
+        entries = []
+        for rel, full, mtime_ns, is_leaf in scanned:
+            if not is_leaf:
+                continue
+            entry = {
+                "name": rel,
+                "modified_at": datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc).isoformat(),
+            }
+            if archived.get(_rel_path(full)) == mtime_ns:
+                entry["compressed"] = True
+            if sizes:
+                entry["size_bytes"], entry["exclusive_bytes"] = _cached_dir_usage(full, mtime_ns)
+            entries.append(entry)
+        body = json.dumps({"path": path, "entries": entries}).encode()
+        _listing_cache[cache_key] = (etag, body)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+def _scan_dirs(base: str, depth: int, prefix: str, out: list[tuple[str, str, int, bool]]) -> None:
+    """Collect (rel, full, mtime_ns, is_leaf) for every directory down to `depth`, sorted by name.
+
+    Leaves are the directories at exactly `depth`; the intermediate ones are kept
+    for the ETag only."""
     if depth <= 0:
-        return []
+        return
 
     try:
-        items = sorted(os.listdir(base))
+        with os.scandir(base) as it:
+            dirs = sorted((e for e in it if e.is_dir() and not e.name.startswith(".")), key=lambda e: e.name)
     except PermissionError:
-        return []
-
-    if depth == 1:
-        results = []
-        for item in items:
-            full = os.path.join(base, item)
-            if os.path.isdir(full):
-                stat = os.stat(full)
-                mtime = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
-                rel = f"{prefix}{item}" if prefix else item
-                results.append({
-                    "name": rel,
-                    "modified_at": mtime.isoformat(),
-                })
-        return results
-
-    results = []
-    for item in items:
-        full = os.path.join(base, item)
-        if os.path.isdir(full):
-            sub_prefix = f"{prefix}{item}/" if prefix else f"{item}/"
-            results.extend(_list_dirs_at_depth(full, depth - 1, sub_prefix))
-    return results
+        return
+    _throttle.files.take(len(dirs))
+
+    for entry in dirs:
+        rel = f"{prefix}{entry.name}"
+        out.append((rel, entry.path, entry.stat().st_mtime_ns, depth == 1))
+        if depth > 1:
+            _scan_dirs(entry.path, depth - 1, f"{rel}/", out)
+
+
+def _listing_etag(
+    scanned: list[tuple[str, str, int, bool]], sizes: bool, usage_generation: int, journal_position: str = "",
+) -> str:
+    """Digest of the scanned directories, plus the hard-link accounting, archives and (for sized
+    listings) the change journal position, which change without touching a directory mtime."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{'sizes' if sizes else 'plain'}{usage_generation}\0{journal_position}".encode())
+    for rel, _, mtime_ns, _ in scanned:
+        digest.update(f"\0{rel}\0{mtime_ns}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _parse_if_none_match(header: str | None) -> set[str]:
+    if not header:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+# --- Change journal ---
+
+class ChangeJournal:
+    """Monotonic journal of build directory changes at a fixed depth below ROOT_PATH.
+
+    Stored in the shared scan index, so every worker process serves the same
+    epoch/seq. A rescan only re-lists a parent (project) directory when its mtime
+    changed, which is what adding or removing a build does; builds younger than
+    _HOT_BUILD_AGE are re-stat'ed on every rescan to catch in-progress uploads.
+    Rescans hold the index write lock, so only one worker scans at a time. The
+    epoch changes whenever the index is recreated, so clients know to resync."""
+
+    def __init__(self, index: ScanIndex, depth: int):
+        self.index = index
+        self.depth = depth
+
+    def refresh(self, force: bool = False) -> None:
+        if not force and not self._stale(self.index.conn()):
+            return
+        with self.index.write() as conn:
+            if not force and not self._stale(conn):
+                return  # another worker rescanned while we waited for the lock
+            row = conn.execute("SELECT seq, last_scan FROM journals WHERE depth = ?", (self.depth,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO journals (depth, epoch, seq, last_scan) VALUES (?, ?, 0, 0)",
+                    (self.depth, uuid.uuid4().hex),
+                )
+                row = (0, 0.0)
+            scan = _Rescan(conn, self.depth, row[0], initial=row[1] == 0)
+            scan.run()
+            conn.execute(
+                "UPDATE journals SET seq = ?, last_scan = ? WHERE depth = ?", (scan.seq, time.time(), self.depth)
+            )
+            conn.execute(
+                "DELETE FROM journal_entries WHERE depth = ? AND seq <= ?",
+                (self.depth, scan.seq - _JOURNAL_MAX_ENTRIES),
+            )
+
+    def _stale(self, conn: sqlite3.Connection) -> bool:
+        row = conn.execute("SELECT last_scan FROM journals WHERE depth = ?", (self.depth,)).fetchone()
+        return row is None or time.time() - row[0] >= _JOURNAL_MIN_RESCAN
+
+    def record_removal(self, build: str) -> None:
+        """Journal a build deleted through the agent without waiting for the next rescan."""
+        self._record_now("remove", build)
+
+    def record_update(self, build: str, mtime_ns: int) -> None:
+        """Journal a build rewritten in place through the agent; its mtime was restored, so a rescan would miss it."""
+        self._record_now("update", build, mtime_ns)
+
+    def _record_now(self, op: str, build: str, mtime_ns: int | None = None) -> None:
+        with self.index.write() as conn:
+            row = conn.execute("SELECT seq, last_scan FROM journals WHERE depth = ?", (self.depth,)).fetchone()
+            if row is None:
+                return
+            scan = _Rescan(conn, self.depth, row[0], initial=row[1] == 0)
+            if scan.known(build):
+                scan.record(op, build, mtime_ns)
+                conn.execute("UPDATE journals SET seq = ? WHERE depth = ?", (scan.seq, self.depth))
+
+    def position(self) -> str:
+        """"epoch:seq" after a rescan (if due): changes whenever a build is added, removed or updated."""
+        self.refresh()
+        row = self.index.conn().execute("SELECT epoch, seq FROM journals WHERE depth = ?", (self.depth,)).fetchone()
+        return f"{row[0]}:{row[1]}" if row else ""
+
+    def changes_since(self, epoch: str, since: int) -> dict:
+        with self.index.read() as conn:
+            current_epoch, seq = conn.execute(
+                "SELECT epoch, seq FROM journals WHERE depth = ?", (self.depth,)
+            ).fetchone()
+            oldest = conn.execute(
+                "SELECT MIN(seq) FROM journal_entries WHERE depth = ?", (self.depth,)
+            ).fetchone()[0] or seq + 1
+            if epoch != current_epoch or since > seq or since + 1 < oldest:
+                # Unknown position: send the full snapshot for the client to rebuild from
+                rows = conn.execute(
+                    "SELECT b.path, b.mtime_ns, u.size_bytes, u.exclusive_bytes, a.path IS NOT NULL FROM builds b"
+                    " LEFT JOIN build_usage u ON u.path = b.path AND u.mtime_ns = b.mtime_ns"
+                    " LEFT JOIN archives a ON a.path = b.path AND a.mtime_ns = b.mtime_ns"
+                    " WHERE b.depth = ? ORDER BY b.path",
+                    (self.depth,),
+                )
+                changes = [_change_entry(seq, "add", *row) for row in rows]
+                return {"epoch": current_epoch, "seq": seq, "reset": True, "changes": changes}
+            rows = conn.execute(
+                "SELECT e.seq, e.op, e.path, e.mtime_ns, u.size_bytes, u.exclusive_bytes, a.path IS NOT NULL"
+                " FROM journal_entries e"
+                " LEFT JOIN build_usage u ON u.path = e.path AND u.mtime_ns = e.mtime_ns"
+                " LEFT JOIN archives a ON a.path = e.path AND a.mtime_ns = e.mtime_ns"
+                " WHERE e.depth = ? AND e.seq > ? ORDER BY e.seq",
+                (self.depth, since),
+            )
+            changes = [_change_entry(*row) for row in rows]
+            return {"epoch": current_epoch, "seq": seq, "reset": False, "changes": changes}
+
+    def rollup(self) -> list[dict]:
+        """Totals per parent directory of the builds, summed into every ancestor level."""
+        with self.index.read() as conn:
+            rows = conn.execute(
+                "SELECT p.path, COUNT(b.path), COALESCE(SUM(s.unique_bytes), 0), COUNT(b.path) - COUNT(s.path),"
+                " MIN(b.mtime_ns), MAX(b.mtime_ns), MIN(b.path), MAX(b.path)"
+                " FROM parents p"
+                " LEFT JOIN builds b ON b.depth = p.depth AND b.parent = p.path"
+                " LEFT JOIN sizes s ON s.path = b.path AND s.mtime_ns = b.mtime_ns"
+                " WHERE p.depth = ? GROUP BY p.path",
+                (self.depth,),
+            ).fetchall()
+            shared = conn.execute(
+                "SELECT DISTINCT b.parent, i.dev, i.ino, i.size_bytes FROM builds b"
+                " JOIN sizes s ON s.path = b.path AND s.mtime_ns = b.mtime_ns"
+                " JOIN build_inodes bi ON bi.path = b.path"
+                " JOIN inodes i ON i.dev = bi.dev AND i.ino = bi.ino"
+                " WHERE b.depth = ?",
+                (self.depth,),
+            ).fetchall()
+
+        totals: dict[str, dict] = {}
+        for parent, builds, unique, unsized, oldest, newest, first, last in rows:
+            for ancestor in _ancestors(parent):
+                total = totals.get(ancestor)
+                if total is None:
+                    total = totals[ancestor] = {
+                        "path": ancestor, "level": ancestor.count("/") + 1, "builds": 0, "size_bytes": 0,
+                        "unsized_builds": 0, "oldest_mtime_ns": None, "newest_mtime_ns": None,
+                    }
+                total["builds"] += builds
+                total["size_bytes"] += unique
+                total["unsized_builds"] += unsized
+                if oldest is not None:
+                    total["oldest_mtime_ns"] = min(oldest, total["oldest_mtime_ns"] or oldest)
+                    total["newest_mtime_ns"] = max(newest, total["newest_mtime_ns"] or newest)
+            if first is not None:
+                totals[parent]["first_build"] = first.rpartition("/")[2]
+                totals[parent]["last_build"] = last.rpartition("/")[2]
+
+        counted: set[tuple[str, int, int]] = set()
+        for parent, dev, ino, size in shared:
+            for ancestor in _ancestors(parent):
+                if (ancestor, dev, ino) not in counted:
+                    counted.add((ancestor, dev, ino))
+                    totals[ancestor]["size_bytes"] += size
+
+        entries = []
+        for path in sorted(totals):
+            entry = totals[path]
+            for field in ("oldest", "newest"):
+                mtime_ns = entry.pop(f"{field}_mtime_ns")
+                entry[f"{field}_modified_at"] = (
+                    None if mtime_ns is None else datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc).isoformat()
+                )
+            entries.append(entry)
+        return entries
+
+
+def _ancestors(path: str) -> list[str]:
+    """'a/b/c' -> ['a', 'a/b', 'a/b/c']."""
+    parts = path.split("/")
+    return ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class _Rescan:
+    """One journal update inside an index write transaction."""
+
+    def __init__(self, conn: sqlite3.Connection, depth: int, seq: int, initial: bool):
+        self.conn = conn
+        self.depth = depth
+        self.seq = seq
+        self.initial = initial  # the initial scan only builds the snapshot
+
+    def run(self) -> None:
+        if self.depth == 1:
+            parents = [("", ROOT_PATH, os.stat(ROOT_PATH).st_mtime_ns)]
+        else:
+            scanned: list[tuple[str, str, int, bool]] = []
+            _scan_dirs(ROOT_PATH, self.depth - 1, prefix="", out=scanned)
+            parents = [(rel, full, mtime_ns) for rel, full, mtime_ns, is_leaf in scanned if is_leaf]
+
+        known_parents = dict(self.conn.execute("SELECT path, mtime_ns FROM parents WHERE depth = ?", (self.depth,)))
+        unchanged = set()
+        for rel, full, mtime_ns in parents:
+            if known_parents.pop(rel, None) == mtime_ns:
+                unchanged.add(rel)
+                continue
+            self._relist_parent(rel, full)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO parents (depth, path, mtime_ns) VALUES (?, ?, ?)", (self.depth, rel, mtime_ns)
+            )
+
+        hot_cutoff = time.time_ns() - _HOT_BUILD_AGE * 10**9
+        hot = self.conn.execute(
+            "SELECT path, parent, mtime_ns FROM builds WHERE depth = ? AND mtime_ns >= ?", (self.depth, hot_cutoff)
+        ).fetchall()
+        for build, parent, mtime_ns in hot:
+            if parent in unchanged:
+                self._restat_build(build, mtime_ns)
+
+        for rel in known_parents:  # parents that disappeared
+            for build in self._children(rel):
+                self.record("remove", build)
+            self.conn.execute("DELETE FROM parents WHERE depth = ? AND path = ?", (self.depth, rel))
+
+    def _children(self, parent: str) -> dict[str, int]:
+        return dict(self.conn.execute(
+            "SELECT path, mtime_ns FROM builds WHERE depth = ? AND parent = ?", (self.depth, parent)
+        ))
+
+    def _relist_parent(self, rel: str, full: str) -> None:
+        prefix = f"{rel}/" if rel else ""
+        current: dict[str, int] = {}
+        try:
+            with os.scandir(full) as it:
+                for entry in it:
+                    if entry.is_dir() and not entry.name.startswith("."):
+                        current[f"{prefix}{entry.name}"] = entry.stat().st_mtime_ns
+        except FileNotFoundError:
+            pass
+        _throttle.files.take(len(current))
+
+        known = self._children(rel)
+        for build in known.keys() - current.keys():
+            self.record("remove", build)
+        for build, mtime_ns in current.items():
+            if build not in known:
+                self.record("add", build, mtime_ns)
+            elif known[build] != mtime_ns:
+                self.record("update", build, mtime_ns)
+
+    def _restat_build(self, build: str, known_mtime_ns: int) -> None:
+        try:
+            mtime_ns = os.stat(os.path.join(ROOT_PATH, build)).st_mtime_ns
+        except FileNotFoundError:
+            self.record("remove", build)
+            return
+        if mtime_ns != known_mtime_ns:
+            self.record("update", build, mtime_ns)
+
+    def known(self, build: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM builds WHERE depth = ? AND path = ?", (self.depth, build)
+        ).fetchone() is not None
+
+    def record(self, op: str, build: str, mtime_ns: int | None = None) -> None:
+        if op == "remove":
+            self.conn.execute("DELETE FROM builds WHERE depth = ? AND path = ?", (self.depth, build))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO builds (depth, path, parent, mtime_ns) VALUES (?, ?, ?, ?)",
+                (self.depth, build, build.rpartition("/")[0], mtime_ns),
+            )
+        if self.initial:
+            return
+        self.seq += 1
+        self.conn.execute(
+            "INSERT INTO journal_entries (depth, seq, op, path, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+            (self.depth, self.seq, op, build, mtime_ns),
+        )
+
+
+def _change_entry(
+    seq: int, op: str, build: str, mtime_ns: int | None, size_bytes: int | None = None,
+    exclusive_bytes: int | None = None, compressed: bool = False,
+) -> dict:
+    entry = {"seq": seq, "op": op, "path": build}
+    if mtime_ns is not None:
+        entry["modified_at"] = datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc).isoformat()
+        if compressed:
+            entry["compressed"] = True
+        if size_bytes is not None:
+            entry["size_bytes"] = size_bytes
+            entry["exclusive_bytes"] = exclusive_bytes
+    return entry
+
+
+def _journal(depth: int) -> ChangeJournal:
+    return ChangeJournal(_scan_index(), depth)
+
+
+@app.get("/files/changes")
+async def file_changes(
+    since: int = Query(0, ge=0, description="Last journal seq the client has applied"),
+    epoch: str = Query("", description="Journal epoch the client's seq belongs to"),
+    depth: int = Query(2, ge=1, le=10, description="Depth of build directories below the root"),
+):
+    """Build additions, removals and mtime changes after `since`.
+
+    `reset: true` means the client's position is unknown (first sync, index
+    recreated or the journal wrapped) and `changes` is the full set of builds as additions."""
+    try:
+        return await _run_heavy(_file_changes, depth, epoch, since)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _file_changes(depth: int, epoch: str, since: int) -> dict:
+    journal = _journal(depth)
+    journal.refresh()
+    return journal.changes_since(epoch, since)
+
+
+# Last rollup per project depth -> ((journal seq, parent count, usage generation), response)
+_rollup_cache: dict[int, tuple[tuple[int, int, int], dict]] = {}
+
+
+@app.get("/files/rollup")
+async def file_rollup(depth: int = Query(1, ge=1, le=9, description="Project depth; builds are one level below")):
+    """Build count, bytes and mtime range of every directory down to `depth`, in one response.
+
+    Aggregated from the change journal's build index and the cached build sizes,
+    so nothing is walked; builds whose size is not cached yet are counted in
+    `unsized_builds`. Hard-linked files are counted once per directory."""
+    try:
+        return await _run_heavy(_file_rollup, depth)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _file_rollup(depth: int) -> dict:
+    journal = _journal(depth + 1)
+    journal.refresh()
+    index = journal.index
+    with index.read() as conn:
+        seq = conn.execute("SELECT seq FROM journals WHERE depth = ?", (depth + 1,)).fetchone()[0]
+        parents = conn.execute("SELECT COUNT(*) FROM parents WHERE depth = ?", (depth + 1,)).fetchone()[0]
+    key = (seq, parents, index.usage_generation())
+    cached = _rollup_cache.get(depth)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    response = {"depth": depth, "seq": seq, "entries": journal.rollup()}
+    _rollup_cache[depth] = (key, response)
+    return response
 
 
 @app.get("/files/exists")
@@ -138,23 +1137,614 @@ def file_exists(path: str = Query(..., description="Relative path to check")):
 
 
 @app.delete("/files")
-def delete_file(path: str = Query(..., description="Relative path to delete")):
+async def delete_file(path: str = Query(..., description="Relative path to delete")):
     """Delete a directory and all its contents."""
     full_path = _safe_full_path(path)
     if not os.path.exists(full_path):
         raise HTTPException(status_code=404, detail="Path not found")
 
     try:
-        shutil.rmtree(full_path)
+        await _run_heavy(_delete_tree, full_path)
         return {"path": path, "deleted": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class BatchDelete(BaseModel):
+    paths: list[str] = Field(..., max_length=1000)
+    trash: bool = True  # rename into the trash and purge in the background, where possible
+
+
+@app.post("/files/delete-batch")
+async def delete_batch(body: BatchDelete):
+    """Delete several directories in parallel; one result per path, in order.
+
+    With trash=true a directory is renamed into the trash directory (instant on the
+    same filesystem) and its files are removed in the background; otherwise, or when
+    the rename is not possible, it is removed in place."""
+    full_paths = [_safe_full_path(path) for path in body.paths]
+    results = await asyncio.gather(*(_run_heavy(_delete_one, full, body.trash) for full in full_paths))
+    if any(r["trashed"] for r in results):
+        asyncio.get_running_loop().run_in_executor(_heavy_pool, _throttled, _purge_trash)
+    return {"results": results}
+
+
+def _delete_one(full_path: str, trash: bool) -> dict:
+    result = {"path": _rel_path(full_path), "deleted": False, "trashed": False, "error": None}
+    if not os.path.isdir(full_path):
+        result["error"] = "Path not found"
+        return result
+    try:
+        result["trashed"] = trash and _move_to_trash(full_path, _cached_exclusive(full_path))
+        if not result["trashed"]:
+            _remove_tree(full_path)
+    except OSError as e:
+        result["error"] = str(e)
+        return result
+    _forget_tree(full_path)
+    result["deleted"] = True
+    return result
+
+
+def _delete_tree(full_path: str) -> None:
+    _remove_tree(full_path)
+    _forget_tree(full_path)
+
+
+def _forget_tree(full_path: str) -> None:
+    """Drop a deleted directory's cached sizes and record it in the change journals."""
+    index = _scan_index()
+    rel = _rel_path(full_path)
+    index.drop_sizes(rel)
+    index.drop_archives(rel)
+    for (depth,) in index.conn().execute("SELECT depth FROM journals").fetchall():
+        ChangeJournal(index, depth).record_removal(rel)
+
+
+def _trash_dir() -> str:
+    return os.environ.get("DISK_AGENT_TRASH_PATH") or os.path.join(ROOT_PATH, ".disk-agent", "trash")
+
+
+def _cached_exclusive(full_path: str) -> int:
+    """What deleting a directory frees, from the scan index; 0 when it was never measured."""
+    usage = _scan_index().get_usage(_rel_path(full_path), os.stat(full_path).st_mtime_ns)
+    return usage[1] if usage else 0
+
+
+def _move_to_trash(full_path: str, freed_bytes: int = 0) -> bool:
+    """Rename a directory into the trash, its name ending in the bytes purging it will free;
+    False when it is on another filesystem."""
+    os.makedirs(_trash_dir(), exist_ok=True)
+    try:
+        os.rename(full_path, os.path.join(_trash_dir(), f"{uuid.uuid4().hex}.{freed_bytes}"))
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return False
+        raise
+    return True
+
+
+def _trash_bytes() -> int:
+    """Bytes the trash purge is still to free, as recorded in the entry names (shared by all
+    worker processes). A directory counts in full until it is removed completely."""
+    try:
+        names = os.listdir(_trash_dir())
+    except FileNotFoundError:
+        return 0
+    return sum(int(ext) for name in names for ext in [name.partition(".")[2]] if ext.isdigit())
+
+
+def _purge_trash() -> None:
+    """Remove everything in the trash. One worker process purges at a time (flock);
+    the others return at once, the purging one picks up what they trashed."""
+    trash = _trash_dir()
+    if not os.path.isdir(trash):
+        return
+    with open(os.path.join(trash, ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        while entries := [e for e in os.listdir(trash) if e != ".lock"]:
+            for name in entries:
+                try:
+                    _remove_tree(os.path.join(trash, name))
+                except OSError as e:
+                    logger.warning("Failed to purge %s from the trash: %s", name, e)
+                    return
+
+
+def _remove_tree(full_path: str) -> None:
+    """shutil.rmtree, paced by the file and byte token buckets."""
+    with os.scandir(full_path) as it:
+        entries = list(it)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            _remove_tree(entry.path)
+            continue
+        st = entry.stat(follow_symlinks=False)
+        _throttle.files.take(1)
+        _throttle.bytes.take(st.st_size)
+        _unlink(entry.path, st)
+    os.rmdir(full_path)
+
+
+def _unlink(path: str, st: os.stat_result) -> None:
+    """os.unlink, also removing the file's store object when it held the last other link."""
+    os.unlink(path)
+    if st.st_nlink == 2 and os.path.isdir(_cas_dir()):
+        _release_object(st.st_dev, st.st_ino)
+
+
+# --- Compression ---
+
+@app.post("/files/compress")
+async def compress_dir(path: str = Query(..., description="Relative path of the directory to compress")):
+    """Replace a directory's contents with a single zstd-compressed tarball, in place.
+
+    The tar stream is compressed with DISK_AGENT_ZSTD_THREADS threads as it is
+    written, so nothing is staged. The directory keeps its mtime (builds keep their
+    age); `size_bytes` and `exclusive_bytes` are the archive's, `original_bytes` what
+    the contents took before."""
+    full_path = _compressible(path)
+    if os.path.exists(os.path.join(full_path, _ARCHIVE_NAME)):
+        raise HTTPException(status_code=409, detail="Already compressed")
+    try:
+        return {"path": path, **await _run_heavy(_compress_tree, full_path)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/files/decompress")
+async def decompress_dir(path: str = Query(..., description="Relative path of a compressed directory")):
+    """Extract a compressed directory's tarball back in place (mtime kept)."""
+    full_path = _compressible(path)
+    if not os.path.isfile(os.path.join(full_path, _ARCHIVE_NAME)):
+        raise HTTPException(status_code=409, detail="Not compressed")
+    try:
+        return {"path": path, **await _run_heavy(_decompress_tree, full_path)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _compressible(path: str) -> str:
+    if zstandard is None:
+        raise HTTPException(status_code=501, detail="Compression needs the zstandard package")
+    full_path = _safe_full_path(path)
+    if not os.path.isdir(full_path):
+        raise HTTPException(status_code=404, detail="Path not found")
+    return full_path
+
+
+def _compress_tree(full_path: str) -> dict:
+    st = os.stat(full_path)
+    original = _dir_usage(full_path)
+    names = sorted(os.listdir(full_path))
+    archive = os.path.join(full_path, _ARCHIVE_NAME)
+    partial = f"{archive}.partial"
+
+    def pace(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        _throttle.files.take(1)
+        _throttle.bytes.take(info.size)
+        return info
+
+    try:
+        with open(partial, "wb") as f:
+            compressor = zstandard.ZstdCompressor(level=_ZSTD_LEVEL, threads=_ZSTD_THREADS)
+            with compressor.stream_writer(f, closefd=False) as writer, tarfile.open(fileobj=writer, mode="w|") as tar:
+                for name in names:
+                    tar.add(os.path.join(full_path, name), arcname=name, filter=pace)
+            os.fsync(f.fileno())
+        os.rename(partial, archive)
+    except BaseException:
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+
+    _remove_entries(full_path, names)
+    os.utime(full_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    usage = _rewritten(full_path, st.st_mtime_ns, original.size_bytes)
+    return {"original_bytes": original.size_bytes, "size_bytes": usage.size_bytes,
+            "exclusive_bytes": usage.exclusive_bytes}
+
+
+def _decompress_tree(full_path: str) -> dict:
+    st = os.stat(full_path)
+    archive = os.path.join(full_path, _ARCHIVE_NAME)
+    with open(archive, "rb") as f:
+        with zstandard.ZstdDecompressor().stream_reader(f) as reader, tarfile.open(fileobj=reader, mode="r|") as tar:
+            tar.extractall(full_path, filter="tar")
+    os.unlink(archive)
+    os.utime(full_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    usage = _rewritten(full_path, st.st_mtime_ns, None)
+    return {"size_bytes": usage.size_bytes, "exclusive_bytes": usage.exclusive_bytes}
+
+
+def _remove_entries(full_path: str, names: list[str]) -> None:
+    for name in names:
+        entry = os.path.join(full_path, name)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            _remove_tree(entry)
+        else:
+            _throttle.files.take(1)
+            _unlink(entry, os.lstat(entry))
+
+
+def _rewritten(full_path: str, mtime_ns: int, original_bytes: int | None) -> DirUsage:
+    """Re-measure a directory whose contents changed under a restored mtime, record whether it is
+    compressed (original_bytes) and journal it as updated."""
+    index = _scan_index()
+    rel = _rel_path(full_path)
+    index.drop_sizes(rel)  # its old files are gone, along with the hard links they held
+    usage = _dir_usage(full_path)
+    index.put_usage(rel, mtime_ns, usage)
+    if original_bytes is None:
+        index.drop_archives(rel)
+    else:
+        index.put_archive(rel, mtime_ns, original_bytes)
+    for (depth,) in index.conn().execute("SELECT depth FROM journals").fetchall():
+        ChangeJournal(index, depth).record_update(rel, mtime_ns)
+    return usage
+
+
+# --- Dedup store ---
+
+@app.get("/dedup")
+def dedup_stats(depth: int = Query(1, ge=1, le=_DEDUP_REPORT_LEVELS, description="Directory level of the totals")):
+    """Content-addressed store size, the last pass, and per directory at `depth` the files
+    sharing their content with another file and the bytes that saves (first copy excluded)."""
+    conn = _scan_index().conn()
+    objects, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cas_objects").fetchone()
+    row = conn.execute("SELECT value FROM settings WHERE key = 'dedup'").fetchone()
+    rows = conn.execute(
+        "SELECT path, files, bytes_saved FROM dedup_savings WHERE level = ? ORDER BY path", (depth,)
+    ).fetchall()
+    return {
+        "interval_seconds": _DEDUP_INTERVAL,
+        "store": {"objects": objects, "bytes": stored},
+        "last_pass": json.loads(row[0]) if row else None,
+        "entries": [{"path": path, "files": files, "bytes_saved": saved} for path, files, saved in rows],
+    }
+
+
+@app.post("/dedup/run", status_code=202)
+async def dedup_run():
+    """Start a dedup pass now (in the background; a pass already running in any worker wins)."""
+    asyncio.get_running_loop().run_in_executor(_heavy_pool, _throttled, _dedup_pass)
+    return {"started": True}
+
+
+async def _dedup_loop() -> None:
+    while True:
+        await asyncio.sleep(_DEDUP_INTERVAL)
+        try:
+            await _run_heavy(_dedup_pass)
+        except Exception:
+            logger.exception("Dedup pass failed")
+
+
+def _cas_dir() -> str:
+    return os.path.join(ROOT_PATH, ".cas")
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(_cas_dir(), digest[:2], digest)
+
+
+def _store_inodes(inodes: list[tuple[int, int]]) -> set[tuple[int, int]]:
+    """The given (dev, ino) that are store objects."""
+    if not inodes or not os.path.isdir(_cas_dir()):
+        return set()
+    conn = _scan_index().conn()
+    found = set()
+    for i in range(0, len(inodes), 400):
+        batch = inodes[i:i + 400]
+        found.update(conn.execute(
+            f"SELECT dev, ino FROM cas_objects WHERE (dev, ino) IN (VALUES {', '.join(['(?, ?)'] * len(batch))})",
+            [n for inode in batch for n in inode],
+        ))
+    return found
+
+
+def _release_object(dev: int, ino: int) -> None:
+    """Remove the store object of an inode no build links any more."""
+    index = _scan_index()
+    row = index.conn().execute("SELECT digest FROM cas_objects WHERE dev = ? AND ino = ?", (dev, ino)).fetchone()
+    if row is None:
+        return
+    path = _object_path(row[0])
+    try:
+        if os.stat(path).st_nlink == 1:
+            os.unlink(path)
+            os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass  # already gone, or other objects share the fan-out directory
+    with index.write() as conn:
+        conn.execute("DELETE FROM cas_objects WHERE digest = ? AND dev = ? AND ino = ?", (row[0], dev, ino))
+
+
+def _dedup_pass() -> dict | None:
+    """One dedup pass over the tree. One worker process runs it at a time (flock); None when
+    another one is."""
+    os.makedirs(_cas_dir(), exist_ok=True)
+    with open(os.path.join(_cas_dir(), ".lock"), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return _DedupPass(_scan_index()).run()
+
+
+class _DedupPass:
+    """Walk, hash what may be duplicated, link duplicates to store objects, drop unused objects
+    and recompute the savings.
+
+    Only files of a size shared by another inode are hashed, and a digest stored for the
+    same inode, size and mtime is reused. A duplicate is only linked when its mode and
+    owner match the object's, since hard links share them. Files modified in the last
+    _SIZE_CACHE_MIN_AGE seconds may still be uploading and are left alone. Directories
+    keep their mtime (build ages are directory mtimes); the sizes cached for them and
+    their parents are dropped and their builds journaled as updated."""
+
+    def __init__(self, index: ScanIndex):
+        self.index = index
+        self.stats = {
+            "started_at": datetime.now(timezone.utc).isoformat(), "files": 0, "hashed": 0, "linked": 0,
+            "bytes_linked": 0, "objects_removed": 0,
+        }
+        self.dir_times: dict[str, tuple[int, int]] = {}  # directories changed -> their (atime, mtime) before
+        self.shared: set[tuple[int, int]] = set()  # inodes now stored once: objects and those linked to them
+        self.relinked: set[str] = set()  # directories whose files gained a link elsewhere (a new object)
+
+    def run(self) -> dict:
+        inodes = self._walk()  # (dev, ino) -> (stat, [paths])
+        objects = self._objects()  # digest -> (dev, ino)
+        digests = self._hash(inodes, {inode for inode in objects.values()})
+        try:
+            self._link(inodes, objects, digests)
+        finally:
+            self._restore_dirs()
+        self._collect_garbage()
+        self._save_savings(inodes, digests)
+        self.stats["finished_at"] = datetime.now(timezone.utc).isoformat()
+        with self.index.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (key, value, version) VALUES ('dedup', ?, 1)",
+                (json.dumps(self.stats),),
+            )
+        return self.stats
+
+    def _walk(self) -> dict[tuple[int, int], tuple[os.stat_result, list[str]]]:
+        inodes: dict[tuple[int, int], tuple[os.stat_result, list[str]]] = {}
+        young = time.time_ns() - _SIZE_CACHE_MIN_AGE * 10**9
+        pending = {_walk_pool.submit(_scan_files, ROOT_PATH, True)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for path, st in files:
+                    if st.st_size < _DEDUP_MIN_SIZE or st.st_mtime_ns > young:
+                        continue
+                    entry = inodes.setdefault((st.st_dev, st.st_ino), (st, []))
+                    entry[1].append(path)
+                pending.update(_walk_pool.submit(_scan_files, d, False) for d in subdirs)
+        self.stats["files"] = sum(len(paths) for _, paths in inodes.values())
+        return inodes
+
+    def _objects(self) -> dict[str, tuple[int, int]]:
+        objects = {}
+        for digest, dev, ino in self.index.conn().execute("SELECT digest, dev, ino FROM cas_objects").fetchall():
+            try:
+                st = os.stat(_object_path(digest))
+            except FileNotFoundError:
+                continue
+            if (st.st_dev, st.st_ino) == (dev, ino):
+                objects[digest] = (dev, ino)
+        return objects
+
+    def _hash(self, inodes: dict, object_inodes: set[tuple[int, int]]) -> dict[tuple[int, int], str]:
+        """Digest of every inode whose size another inode (or a store object) also has."""
+        sizes: dict[int, int] = {}
+        for st, _ in inodes.values():
+            sizes[st.st_size] = sizes.get(st.st_size, 0) + 1
+        conn = self.index.conn()
+        for dev, ino, size in conn.execute("SELECT dev, ino, size_bytes FROM cas_objects").fetchall():
+            if (dev, ino) not in inodes:
+                sizes[size] = sizes.get(size, 0) + 1
+        wanted = {inode for inode, (st, _) in inodes.items() if sizes[st.st_size] > 1 or inode in object_inodes}
+
+        known = {
+            (dev, ino): (size, mtime_ns, digest)
+            for dev, ino, size, mtime_ns, digest in conn.execute(
+                "SELECT dev, ino, size_bytes, mtime_ns, digest FROM file_hashes"
+            )
+        }
+        digests: dict[tuple[int, int], str] = {}
+        todo = []
+        for inode in wanted:
+            st, paths = inodes[inode]
+            cached = known.get(inode)
+            if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+                digests[inode] = cached[2]
+            else:
+                todo.append((inode, _hash_pool.submit(_hash_file, paths[0])))
+        for inode, future in todo:
+            digest = future.result()
+            if digest is not None:
+                digests[inode] = digest
+        self.stats["hashed"] = len(todo)
+
+        with self.index.write() as conn:
+            conn.execute("DELETE FROM file_hashes")
+            conn.executemany(
+                "INSERT INTO file_hashes (dev, ino, size_bytes, mtime_ns, digest) VALUES (?, ?, ?, ?, ?)",
+                [(*inode, inodes[inode][0].st_size, inodes[inode][0].st_mtime_ns, d) for inode, d in digests.items()],
+            )
+        return digests
+
+    def _link(self, inodes: dict, objects: dict[str, tuple[int, int]], digests: dict) -> None:
+        groups: dict[str, list[tuple[int, int]]] = {}
+        for inode, digest in digests.items():
+            groups.setdefault(digest, []).append(inode)
+        for digest, group in groups.items():
+            if digest not in objects:
+                if len(group) < 2:
+                    continue  # unique content, nothing to share
+                source = max(group, key=lambda inode: len(inodes[inode][1]))
+                if not self._add_object(digest, inodes[source]):
+                    continue
+                objects[digest] = source
+            self.shared.add(objects[digest])
+            target = _object_path(digest)
+            object_st = os.stat(target)
+            for inode in group:
+                st, paths = inodes[inode]
+                if inode == objects[digest] or (st.st_mode, st.st_uid, st.st_gid) != (
+                    object_st.st_mode, object_st.st_uid, object_st.st_gid
+                ):
+                    continue
+                replaced = sum(self._replace(path, st, target) for path in paths)
+                if replaced:
+                    self.shared.add(inode)
+                self.stats["linked"] += replaced
+                if replaced == st.st_nlink:  # every link of the old inode is gone, so is its data
+                    self.stats["bytes_linked"] += st.st_size
+
+    def _add_object(self, digest: str, source: tuple[os.stat_result, list[str]]) -> bool:
+        st, paths = source
+        target = _object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(paths[0], target)
+        except FileExistsError:
+            os.unlink(target)  # left by a pass that died before recording it
+            os.link(paths[0], target)
+        except FileNotFoundError:
+            return False
+        self.relinked.update(os.path.dirname(path) for path in paths)
+        with self.index.write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cas_objects (digest, dev, ino, size_bytes) VALUES (?, ?, ?, ?)",
+                (digest, st.st_dev, st.st_ino, st.st_size),
+            )
+        return True
+
+    def _replace(self, path: str, st: os.stat_result, target: str) -> bool:
+        """Swap `path` for a hard link to `target`, unless it changed since the walk."""
+        try:
+            current = os.lstat(path)
+        except FileNotFoundError:
+            return False
+        if (current.st_ino, current.st_mtime_ns, current.st_size) != (st.st_ino, st.st_mtime_ns, st.st_size):
+            return False
+        parent = os.path.dirname(path)
+        if parent not in self.dir_times:
+            parent_st = os.stat(parent)
+            self.dir_times[parent] = (parent_st.st_atime_ns, parent_st.st_mtime_ns)
+        temp = f"{path}.dedup-{uuid.uuid4().hex[:8]}"
+        _throttle.files.take(1)
+        os.link(target, temp)
+        os.replace(temp, path)
+        return True
+
+    def _restore_dirs(self) -> None:
+        for path, times in self.dir_times.items():
+            try:
+                os.utime(path, ns=times)
+            except FileNotFoundError:
+                pass
+        # Hard links changed under unchanged mtimes: re-measure these directories and their parents
+        changed = {_rel_path(path) for path in self.dir_times.keys() | self.relinked}
+        if not changed:
+            return
+        self.index.forget_sizes({ancestor for rel in changed for ancestor in _ancestors(rel)})
+        for (depth,) in self.index.conn().execute("SELECT depth FROM journals").fetchall():
+            journal = ChangeJournal(self.index, depth)
+            for build in {"/".join(rel.split("/")[:depth]) for rel in changed if rel.count("/") + 1 >= depth}:
+                try:
+                    journal.record_update(build, os.stat(os.path.join(ROOT_PATH, build)).st_mtime_ns)
+                except FileNotFoundError:
+                    pass
+
+    def _collect_garbage(self) -> None:
+        """Drop objects no file outside the store links any more (builds deleted by other means)."""
+        for digest, in self.index.conn().execute("SELECT digest FROM cas_objects").fetchall():
+            path = _object_path(digest)
+            try:
+                if os.stat(path).st_nlink > 1:
+                    continue
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            with self.index.write() as conn:
+                conn.execute("DELETE FROM cas_objects WHERE digest = ?", (digest,))
+            self.stats["objects_removed"] += 1
+
+    def _save_savings(self, inodes: dict, digests: dict) -> None:
+        """Per directory: files whose content is stored once for several paths, except the first
+        path (in name order) of each content, and their bytes."""
+        contents: dict[str | tuple[int, int], tuple[int, list[str]]] = {}
+        for inode, (st, paths) in inodes.items():
+            key = digests[inode] if inode in self.shared else inode
+            size, all_paths = contents.setdefault(key, (st.st_size, []))
+            all_paths.extend(paths)
+        totals: dict[str, list[int]] = {}
+        for size, paths in contents.values():
+            for path in sorted(paths)[1:]:
+                parts = _rel_path(path).split("/")[:-1]
+                for level in range(1, min(len(parts), _DEDUP_REPORT_LEVELS) + 1):
+                    total = totals.setdefault("/".join(parts[:level]), [0, 0])
+                    total[0] += 1
+                    total[1] += size
+        with self.index.write() as conn:
+            conn.execute("DELETE FROM dedup_savings")
+            conn.executemany(
+                "INSERT INTO dedup_savings (path, level, files, bytes_saved) VALUES (?, ?, ?, ?)",
+                [(path, path.count("/") + 1, files, saved) for path, (files, saved) in totals.items()],
+            )
+
+
+def _scan_files(path: str, root: bool) -> tuple[list[tuple[str, os.stat_result]], list[str]]:
+    """One directory's regular files with their stat, and its subdirectories (hidden ones skipped at the root)."""
+    _throttle.enter_thread()
+    files: list[tuple[str, os.stat_result]] = []
+    subdirs: list[str] = []
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return files, subdirs
+    _throttle.files.take(len(entries))
+    for entry in entries:
+        if root and entry.name.startswith("."):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files.append((entry.path, entry.stat(follow_symlinks=False)))
+        except FileNotFoundError:
+            continue
+    return files, subdirs
+
+
+def _hash_file(path: str) -> str | None:
+    _throttle.enter_thread()
+    digest = hashlib.blake2b(digest_size=32)
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK):
+                _throttle.bytes.take(len(chunk))
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
 # --- Health ---
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
@@ -163,6 +1753,8 @@ def main():
     parser = argparse.ArgumentParser(description="Disk Agent for Binary Server")
     parser.add_argument("--path", default="/data/binaries", help="Path to monitor")
     parser.add_argument("--port", type=int, default=9090, help="HTTP port")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("DISK_AGENT_WORKERS", "1")),
+                        help="Number of worker processes")
     parser.add_argument("--reload", action="store_true", help="Enable auto-reload for development")
     args = parser.parse_args()
 
@@ -170,13 +1762,18 @@ def main():
     if not os.path.isdir(ROOT_PATH):
         print(f"Error: {ROOT_PATH} is not a directory")
         exit(1)
+    # uvicorn imports disk_agent afresh in each worker; they read the root and the worker
+    # count (which splits the throttle rates) from the environment
+    os.environ["DISK_AGENT_PATH"] = ROOT_PATH
+    os.environ["DISK_AGENT_WORKERS"] = str(1 if args.reload else args.workers)
 
-    print(f"Disk Agent monitoring: {ROOT_PATH}")
+    print(f"Disk Agent monitoring: {ROOT_PATH} ({args.workers} worker(s))")
     uvicorn.run(
         "disk_agent:app",
         host="0.0.0.0",
         port=args.port,
         reload=args.reload,
+        workers=None if args.reload else args.workers,
     )
 
 
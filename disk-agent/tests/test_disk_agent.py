@@ -0,0 +1,160 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import disk_agent
+
+HOUR = 3600
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """An empty binary root with its own scan index and trash."""
+    monkeypatch.setattr(disk_agent, "ROOT_PATH", str(tmp_path))
+    monkeypatch.setattr(disk_agent, "_index", None)
+    monkeypatch.setattr(disk_agent, "_listing_cache", {})
+    monkeypatch.setattr(disk_agent, "_rollup_cache", {})
+    monkeypatch.setattr(disk_agent, "_JOURNAL_MIN_RESCAN", 0)
+    monkeypatch.delenv("DISK_AGENT_INDEX_PATH", raising=False)
+    monkeypatch.delenv("DISK_AGENT_TRASH_PATH", raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def client(root):
+    return TestClient(disk_agent.app)
+
+
+def _build(root, rel: str, files: dict[str, bytes], age: float = HOUR) -> str:
+    """Write a build directory; its files and directories are backdated by `age` seconds."""
+    full = os.path.join(root, rel)
+    for name, data in files.items():
+        os.makedirs(os.path.dirname(os.path.join(full, name)), exist_ok=True)
+        with open(os.path.join(full, name), "wb") as f:
+            f.write(data)
+    _backdate(root, rel, age)
+    return full
+
+
+def _backdate(root, rel: str, age: float) -> None:
+    """Set the mtime of everything under rel, and of its parents, to `age` seconds ago."""
+    when = time.time() - age
+    for dirpath, _, filenames in os.walk(os.path.join(root, rel), topdown=False):
+        for name in filenames:
+            os.utime(os.path.join(dirpath, name), (when, when))
+        os.utime(dirpath, (when, when))
+    parent = os.path.dirname(rel)
+    while parent:
+        os.utime(os.path.join(root, parent), (when, when))
+        parent = os.path.dirname(parent)
+
+
+def _trash(root) -> list[str]:
+    trash = os.path.join(root, ".disk-agent", "trash")
+    return sorted(name for name in os.listdir(trash) if name != ".lock")
+
+
+def test_deleted_builds_go_to_the_trash_and_are_purged(root, client, monkeypatch):
+    """A batch delete renames the build into the trash at once, /disk-usage reports the bytes
+    still to be freed, and the purge empties the trash."""
+    _build(root, "app/1", {"payload.bin": b"x" * 1000})
+    listed = client.get("/files/list", params={"path": "app", "depth": 1, "sizes": "true"}).json()
+    assert listed["entries"][0]["exclusive_bytes"] == 1000  # measured and cached
+
+    purge = disk_agent._purge_trash
+    monkeypatch.setattr(disk_agent, "_purge_trash", lambda: None)  # keep the background purge out of the way
+    results = client.post("/files/delete-batch", json={"paths": ["app/1", "app/9"]}).json()["results"]
+
+    assert [(r["deleted"], r["trashed"], r["error"]) for r in results] == [
+        (True, True, None), (False, False, "Path not found"),
+    ]
+    assert not os.path.exists(os.path.join(root, "app", "1"))
+    assert [name.partition(".")[2] for name in _trash(root)] == ["1000"]
+    assert client.get("/disk-usage").json()["trash_bytes"] == 1000
+
+    purge()
+    assert _trash(root) == []
+    assert client.get("/disk-usage").json()["trash_bytes"] == 0
+
+
+def test_compress_and_decompress_round_trip(root, client):
+    """Compressing leaves only the archive under the same mtime; decompressing restores the bytes."""
+    if disk_agent.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    files = {"app.apk": os.urandom(50_000), "symbols/app.sym": b"symbols" * 1000, "empty.txt": b""}
+    full = _build(root, "app/1", files)
+    mtime_ns = os.stat(full).st_mtime_ns
+
+    compressed = client.post("/files/compress", params={"path": "app/1"})
+    assert compressed.status_code == 200
+    assert os.listdir(full) == [disk_agent._ARCHIVE_NAME]
+    assert os.stat(full).st_mtime_ns == mtime_ns
+    assert compressed.json()["original_bytes"] == sum(len(data) for data in files.values())
+    assert client.post("/files/compress", params={"path": "app/1"}).status_code == 409
+
+    assert client.post("/files/decompress", params={"path": "app/1"}).status_code == 200
+    for name, data in files.items():
+        with open(os.path.join(full, name), "rb") as f:
+            assert f.read() == data
+    assert disk_agent._ARCHIVE_NAME not in os.listdir(full)
+    assert os.stat(full).st_mtime_ns == mtime_ns
+
+
+def test_dedup_links_identical_files_and_releases_the_object_on_delete(root, client):
+    """Identical files become hard links to one store object, and deleting the last build
+    linking it removes the object from the store."""
+    data = os.urandom(disk_agent._DEDUP_MIN_SIZE)
+    first = _build(root, "app/1", {"lib.so": data, "own.txt": os.urandom(disk_agent._DEDUP_MIN_SIZE)})
+    second = _build(root, "app/2", {"lib.so": data})
+
+    stats = disk_agent._dedup_pass()
+
+    assert stats["linked"] == 1
+    a, b = os.stat(os.path.join(first, "lib.so")), os.stat(os.path.join(second, "lib.so"))
+    assert a.st_ino == b.st_ino and a.st_nlink == 3  # both builds and the store object
+    assert os.stat(os.path.join(first, "own.txt")).st_nlink == 1
+    store = client.get("/dedup").json()["store"]
+    assert store == {"objects": 1, "bytes": len(data)}
+
+    client.post("/files/delete-batch", json={"paths": ["app/1"], "trash": False})
+    assert os.stat(os.path.join(second, "lib.so")).st_nlink == 2
+    client.post("/files/delete-batch", json={"paths": ["app/2"], "trash": False})
+    assert client.get("/dedup").json()["store"] == {"objects": 0, "bytes": 0}
+
+
+def test_rollup_counts_hard_linked_files_once(root, client):
+    """A file hard-linked into two builds counts once in their project's rollup, and not in
+    either build's exclusive bytes."""
+    _build(root, "app/1", {"shared.bin": b"s" * 1000, "own.bin": b"a" * 100})
+    _build(root, "app/2", {"own.bin": b"b" * 100})
+    os.link(os.path.join(root, "app/1/shared.bin"), os.path.join(root, "app/2/shared.bin"))
+    _backdate(root, "app", HOUR)
+
+    listed = client.get("/files/list", params={"path": "app", "depth": 1, "sizes": "true"}).json()
+    assert [(e["name"], e["size_bytes"], e["exclusive_bytes"]) for e in listed["entries"]] == [
+        ("1", 1100, 100), ("2", 1100, 100),
+    ]
+
+    rollup = client.get("/files/rollup", params={"depth": 1}).json()["entries"]
+    assert [(e["path"], e["builds"], e["size_bytes"], e["unsized_builds"]) for e in rollup] == [
+        ("app", 2, 1200, 0),
+    ]
+
+
+def test_change_journal_reports_additions_and_removals(root, client):
+    """The first read is a reset with every build; later reads return what changed after the
+    client's seq, from rescans and from deletes made through the agent."""
+    _build(root, "app/1", {"a": b"1"})
+    first = client.get("/files/changes", params={"depth": 2}).json()
+    assert first["reset"]
+    assert [(c["op"], c["path"]) for c in first["changes"]] == [("add", "app/1")]
+
+    _build(root, "app/2", {"a": b"2"}, age=0)
+    client.post("/files/delete-batch", json={"paths": ["app/1"], "trash": False})
+    later = client.get("/files/changes", params={"depth": 2, "epoch": first["epoch"], "since": first["seq"]}).json()
+
+    assert not later["reset"]
+    assert sorted((c["op"], c["path"]) for c in later["changes"]) == [("add", "app/2"), ("remove", "app/1")]
+    assert later["seq"] > first["seq"]
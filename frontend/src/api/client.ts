@@ -35,8 +35,14 @@ export const getDashboardStats = () => api.get("/dashboard/stats");
 // Binaries
 export const getProjects = (server?: string) =>
   api.get("/binaries", { params: server ? { server } : {} });
-export const getProjectBuilds = (project: string, server?: string) =>
-  api.get(`/binaries/detail/${project}`, { params: server ? { server } : {} });
+export const getProjectBuilds = (
+  project: string,
+  server?: string,
+  paging: { page?: number; page_size?: number; sort?: string; order?: string } = {}
+) =>
+  api.get(`/binaries/detail/${project}`, {
+    params: { ...paging, ...(server ? { server } : {}) },
+  });
 export const deleteBuild = (project: string, build: string, server?: string) =>
   api.delete(`/binaries/detail/${project}/${build}`, {
     params: server ? { server } : {},
@@ -60,16 +66,57 @@ export const removeBuildRetention = (
   api.delete(`/binaries/detail/${project}/${build}/retention`, {
     params: server ? { server } : {},
   });
+export interface BulkRetentionRequest {
+  items?: { server?: string; project: string; build: string; retention_days?: number; expires_at?: string }[];
+  server?: string;
+  project?: string;
+  pattern?: string;
+  first_build?: string;
+  last_build?: string;
+  retention_days?: number;
+  expires_at?: string;
+}
+export const setRetentionBulk = (data: BulkRetentionRequest) =>
+  api.put("/binaries/retention", data);
+export const removeRetentionBulk = (data: BulkRetentionRequest) =>
+  api.delete("/binaries/retention", { data });
+export interface DeleteJob {
+  id: string;
+  server: string;
+  state: "queued" | "running" | "completed" | "failed";
+  total: number;
+  deleted: number;
+  failed: string[];
+  bytes_freed: number;
+  error: string | null;
+}
+export const submitDeleteJob = (
+  project: string,
+  builds: string[],
+  server?: string
+) =>
+  api.post<DeleteJob>("/binaries/delete-jobs", {
+    server: server ?? "",
+    builds: builds.map((build) => ({ project, build })),
+  });
+export const getDeleteJob = (id: string) =>
+  api.get<DeleteJob>(`/binaries/delete-jobs/${id}`);
 
 // Config
 export const getConfig = () => api.get("/config");
 export const updateConfig = (data: Record<string, unknown>) =>
   api.put("/config", data);
+export const simulateConfig = (data: Record<string, unknown>) =>
+  api.post("/config/simulate", data);
 export const testConnection = () => api.post("/config/test-connection");
+export const getAgentThrottle = (server: string) =>
+  api.get(`/config/servers/${encodeURIComponent(server)}/throttle`);
+export const updateAgentThrottle = (server: string, data: Record<string, unknown>) =>
+  api.put(`/config/servers/${encodeURIComponent(server)}/throttle`, data);
 
 // Cleanup
-export const triggerCleanup = (dryRun: boolean) =>
-  api.post("/cleanup/trigger", { dry_run: dryRun });
+export const triggerCleanup = (dryRun: boolean, profile = false) =>
+  api.post("/cleanup/trigger", { dry_run: dryRun, profile });
 export const getCleanupStatus = () => api.get("/cleanup/status");
 export const abortCleanup = () => api.post("/cleanup/abort");
 
@@ -81,3 +128,11 @@ export const getLogs = (params: {
   page?: number;
   page_size?: number;
 }) => api.get("/logs", { params });
+export const downloadRunProfile = (
+  runId: number,
+  format: "collapsed" | "summary" = "collapsed"
+) =>
+  api.get(`/logs/runs/${runId}/profile`, {
+    params: { format },
+    responseType: "blob",
+  });
@@ -1,5 +1,6 @@
 import { useNavigate } from "react-router-dom";
 import RetentionBadge from "./RetentionBadge";
+import { formatBytes } from "../utils/format";
 
 interface Project {
   name: string;
@@ -9,6 +10,8 @@ interface Project {
   oldest_build: string | null;
   newest_build: string | null;
   server: string;
+  total_size_bytes: number;
+  unsized_build_count: number;
 }
 
 interface Props {
@@ -38,6 +41,9 @@ export default function ProjectTable({ projects, showServer }: Props) {
             <th className="px-4 py-3 text-left text-[11px] font-medium text-gray-400 uppercase tracking-wider">
               Builds
             </th>
+            <th className="px-4 py-3 text-left text-[11px] font-medium text-gray-400 uppercase tracking-wider">
+              Size
+            </th>
             <th className="px-4 py-3 text-left text-[11px] font-medium text-gray-400 uppercase tracking-wider">
               Range
             </th>
@@ -73,6 +79,17 @@ export default function ProjectTable({ projects, showServer }: Props) {
               <td className="px-4 py-3 text-[13px] text-gray-500 tabular-nums">
                 {p.build_count}
               </td>
+              <td
+                className="px-4 py-3 text-[13px] text-gray-500 tabular-nums"
+                title={
+                  p.unsized_build_count
+                    ? `${p.unsized_build_count} builds not measured yet`
+                    : undefined
+                }
+              >
+                {formatBytes(p.total_size_bytes, "-")}
+                {p.unsized_build_count > 0 && "+"}
+              </td>
               <td className="px-4 py-3 text-[13px] text-gray-400 font-mono">
                 {p.oldest_build && p.newest_build
                   ? `${p.oldest_build} ~ ${p.newest_build}`
@@ -11,6 +11,8 @@ interface Project {
   oldest_build: string | null;
   newest_build: string | null;
   server: string;
+  total_size_bytes: number;
+  unsized_build_count: number;
 }
 
 export default function BinaryListPage() {
@@ -6,8 +6,10 @@ import {
   getCleanupStatus,
   abortCleanup,
 } from "../api/client";
+import { useAuth } from "../context/AuthContext";
 import DiskUsageGauge from "../components/DiskUsageGauge";
 import RetentionBadge from "../components/RetentionBadge";
+import { formatBytes } from "../utils/format";
 import {
   FolderOpen,
   Package,
@@ -16,6 +18,7 @@ import {
   Loader2,
   X,
   Square,
+  AlertTriangle,
 } from "lucide-react";
 
 interface ServerStat {
@@ -28,6 +31,15 @@ interface ServerStat {
   };
   project_count: number;
   build_count: number;
+  total_size_bytes: number;
+  unsized_build_count: number;
+  agent: {
+    state: "closed" | "open" | "half_open";
+    failures: number;
+    last_error: string | null;
+    retry_in_seconds: number;
+    synced_at: string | null;
+  };
 }
 
 interface Stats {
@@ -39,6 +51,7 @@ interface Stats {
 interface DryRunTarget {
   project: string;
   build_number: string;
+  action: string;
   retention_type: string;
   age_days: number;
   score: number;
@@ -57,6 +70,8 @@ export default function DashboardPage() {
   const [panelMode, setPanelMode] = useState<PanelMode>("none");
   const [aborting, setAborting] = useState(false);
   const [error, setError] = useState("");
+  const [profile, setProfile] = useState(false);
+  const { role } = useAuth();
   const navigate = useNavigate();
   const logEndRef = useRef<HTMLDivElement>(null);
 
@@ -109,7 +124,7 @@ export default function DashboardPage() {
     setPanelMode("dryrun");
     setDryRunTargets([]);
     try {
-      const res = await triggerCleanup(true);
+      const res = await triggerCleanup(true, profile);
       setDryRunTargets(res.data.targets);
     } catch {
       setError("Failed to trigger dry run");
@@ -123,7 +138,7 @@ export default function DashboardPage() {
     try {
       setCleanupLogs([]);
       setPanelMode("cleanup");
-      await triggerCleanup(false);
+      await triggerCleanup(false, profile);
       setCleanupRunning(true);
     } catch {
       setError("Failed to trigger cleanup");
@@ -168,6 +183,17 @@ export default function DashboardPage() {
       <div className="flex items-center justify-between mb-8">
         <h2 className="text-xl font-semibold text-gray-900">Dashboard</h2>
         <div className="flex gap-2">
+          {role === "admin" && (
+            <label className="flex items-center gap-1.5 px-2 text-[12px] text-gray-500">
+              <input
+                type="checkbox"
+                checked={profile}
+                onChange={(e) => setProfile(e.target.checked)}
+                className="rounded border-gray-300"
+              />
+              Profile
+            </label>
+          )}
           <button
             onClick={handleDryRun}
             disabled={cleanupRunning || dryRunLoading}
@@ -198,51 +224,65 @@ export default function DashboardPage() {
       {/* Per-server stats */}
       <div className="space-y-4 mb-6">
         {stats.servers.map((srv) => (
-          <div
-            key={srv.name}
-            className="grid grid-cols-1 md:grid-cols-3 gap-4"
-          >
-            <DiskUsageGauge
-              serverName={srv.name}
-              usagePercent={srv.disk.usage_percent}
-              totalBytes={srv.disk.total_bytes}
-              usedBytes={srv.disk.used_bytes}
-              freeBytes={srv.disk.free_bytes}
-            />
-            <div
-              onClick={() => navigate("/binaries")}
-              className="bg-white border border-gray-200/60 rounded-xl p-5 cursor-pointer shadow-sm hover:shadow-md hover:border-gray-300 transition-all"
-            >
-              <p className="text-[11px] font-medium text-gray-400 uppercase tracking-wider mb-3">
-                Projects
-              </p>
-              <div className="flex items-center gap-3">
-                <FolderOpen
-                  className="text-blue-500"
-                  size={22}
-                  strokeWidth={1.8}
-                />
-                <span className="text-3xl font-semibold text-gray-900 tabular-nums">
-                  {srv.project_count}
+          <div key={srv.name}>
+            {srv.agent.state !== "closed" && (
+              <div className="flex items-center gap-2 mb-2 px-3 py-2 bg-amber-50 border border-amber-100 rounded-lg text-[12px] text-amber-700">
+                <AlertTriangle size={13} />
+                <span title={srv.agent.last_error ?? undefined}>
+                  Disk agent unreachable ({srv.agent.failures} failures),
+                  showing the last sync
+                  {srv.agent.synced_at &&
+                    ` of ${new Date(srv.agent.synced_at + "Z").toLocaleString()}`}
                 </span>
               </div>
-            </div>
-            <div
-              onClick={() => navigate("/binaries")}
-              className="bg-white border border-gray-200/60 rounded-xl p-5 cursor-pointer shadow-sm hover:shadow-md hover:border-gray-300 transition-all"
-            >
-              <p className="text-[11px] font-medium text-gray-400 uppercase tracking-wider mb-3">
-                Builds
-              </p>
-              <div className="flex items-center gap-3">
-                <Package
-                  className="text-emerald-500"
-                  size={22}
-                  strokeWidth={1.8}
-                />
-                <span className="text-3xl font-semibold text-gray-900 tabular-nums">
-                  {srv.build_count}
-                </span>
+            )}
+            <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
+              <DiskUsageGauge
+                serverName={srv.name}
+                usagePercent={srv.disk.usage_percent}
+                totalBytes={srv.disk.total_bytes}
+                usedBytes={srv.disk.used_bytes}
+                freeBytes={srv.disk.free_bytes}
+              />
+              <div
+                onClick={() => navigate("/binaries")}
+                className="bg-white border border-gray-200/60 rounded-xl p-5 cursor-pointer shadow-sm hover:shadow-md hover:border-gray-300 transition-all"
+              >
+                <p className="text-[11px] font-medium text-gray-400 uppercase tracking-wider mb-3">
+                  Projects
+                </p>
+                <div className="flex items-center gap-3">
+                  <FolderOpen
+                    className="text-blue-500"
+                    size={22}
+                    strokeWidth={1.8}
+                  />
+                  <span className="text-3xl font-semibold text-gray-900 tabular-nums">
+                    {srv.project_count}
+                  </span>
+                </div>
+              </div>
+              <div
+                onClick={() => navigate("/binaries")}
+                className="bg-white border border-gray-200/60 rounded-xl p-5 cursor-pointer shadow-sm hover:shadow-md hover:border-gray-300 transition-all"
+              >
+                <p className="text-[11px] font-medium text-gray-400 uppercase tracking-wider mb-3">
+                  Builds
+                </p>
+                <div className="flex items-center gap-3">
+                  <Package
+                    className="text-emerald-500"
+                    size={22}
+                    strokeWidth={1.8}
+                  />
+                  <span className="text-3xl font-semibold text-gray-900 tabular-nums">
+                    {srv.build_count}
+                  </span>
+                </div>
+                <p className="text-[12px] text-gray-400 mt-2 tabular-nums">
+                  {formatBytes(srv.total_size_bytes, "-")}
+                  {srv.unsized_build_count > 0 && "+"}
+                </p>
               </div>
             </div>
           </div>
@@ -314,7 +354,7 @@ export default function DashboardPage() {
                 {panelMode === "dryrun"
                   ? dryRunLoading
                     ? "Dry Run..."
-                    : `Dry Run — ${dryRunTargets.length} builds would be deleted`
+                    : `Dry Run — ${dryRunTargets.length} builds would be deleted or compressed`
                   : cleanupRunning
                   ? "Cleanup Running"
                   : "Cleanup Finished"}
@@ -398,6 +438,11 @@ export default function DashboardPage() {
                         </td>
                         <td className="px-4 py-2 text-[13px] font-mono text-gray-400">
                           {t.build_number}
+                          {t.action === "compress" && (
+                            <span className="ml-2 text-[10px] px-1.5 py-0.5 bg-gray-800 text-gray-400 rounded-full font-sans">
+                              compress
+                            </span>
+                          )}
                         </td>
                         <td className="px-4 py-2">
                           <RetentionBadge
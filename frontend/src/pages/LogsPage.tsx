@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
-import { getCleanupRuns, getLogs } from "../api/client";
+import { downloadRunProfile, getCleanupRuns, getLogs } from "../api/client";
 import RetentionBadge from "../components/RetentionBadge";
-import { Loader2, ChevronDown, ChevronRight, Trash2, Eye } from "lucide-react";
+import { Loader2, ChevronDown, ChevronRight, Trash2, Eye, Download } from "lucide-react";
 import { formatBytes } from "../utils/format";
 
 interface CleanupRun {
@@ -16,6 +16,7 @@ interface CleanupRun {
   bytes_freed: number;
   status: string;
   error_message: string | null;
+  has_profile: boolean;
 }
 
 interface LogEntry {
@@ -30,6 +31,7 @@ interface LogEntry {
   size_bytes: number;
   score: number;
   dry_run: boolean;
+  action: string;
 }
 
 function formatKST(dateStr: string): string {
@@ -68,6 +70,16 @@ export default function LogsPage() {
     fetch();
   }, []);
 
+  const saveProfile = async (runId: number, format: "collapsed" | "summary") => {
+    const res = await downloadRunProfile(runId, format);
+    const url = URL.createObjectURL(res.data);
+    const link = document.createElement("a");
+    link.href = url;
+    link.download = `cleanup-run-${runId}.${format === "collapsed" ? "folded" : "txt"}`;
+    link.click();
+    URL.revokeObjectURL(url);
+  };
+
   const toggleRun = async (runId: number) => {
     if (expandedRun === runId) {
       setExpandedRun(null);
@@ -136,8 +148,16 @@ export default function LogsPage() {
                       >
                         {run.status}
                       </span>
-                      <span className="px-1.5 py-0.5 rounded text-[10px] font-medium bg-gray-50 text-gray-400">
-                        {run.trigger === "manual" ? "manual" : "scheduled"}
+                      <span
+                        className={`px-1.5 py-0.5 rounded text-[10px] font-medium ${
+                          run.trigger === "emergency"
+                            ? "bg-red-50 text-red-600"
+                            : "bg-gray-50 text-gray-400"
+                        }`}
+                      >
+                        {run.trigger === "manual" || run.trigger === "emergency"
+                          ? run.trigger
+                          : "scheduled"}
                       </span>
                     </div>
                     <span className="text-[11px] text-gray-400">
@@ -199,6 +219,25 @@ export default function LogsPage() {
                       {run.error_message}
                     </div>
                   )}
+                  {run.has_profile && (
+                    <div className="flex items-center gap-2 mb-3 text-[12px]">
+                      <span className="text-gray-400">Profile</span>
+                      <button
+                        onClick={() => saveProfile(run.id, "collapsed")}
+                        className="flex items-center gap-1 px-2 py-1 rounded-md border border-gray-200 text-gray-600 hover:bg-gray-50 transition-colors"
+                      >
+                        <Download size={12} />
+                        Flamegraph stacks
+                      </button>
+                      <button
+                        onClick={() => saveProfile(run.id, "summary")}
+                        className="flex items-center gap-1 px-2 py-1 rounded-md border border-gray-200 text-gray-600 hover:bg-gray-50 transition-colors"
+                      >
+                        <Download size={12} />
+                        Summary
+                      </button>
+                    </div>
+                  )}
                   {runLogs[run.id] ? (
                     runLogs[run.id].length > 0 ? (
                       <div className="space-y-4">
@@ -241,6 +280,11 @@ export default function LogsPage() {
                                       </td>
                                       <td className="py-1.5 pr-4 font-mono text-gray-700">
                                         {log.build_number}
+                                        {log.action === "compress" && (
+                                          <span className="ml-2 text-[10px] px-1.5 py-0.5 bg-gray-100 text-gray-500 rounded-full font-sans">
+                                            compressed
+                                          </span>
+                                        )}
                                       </td>
                                       <td className="py-1.5 pr-4">
                                         <RetentionBadge
@@ -5,6 +5,11 @@ import {
   deleteBuild,
   setBuildRetention,
   removeBuildRetention,
+  setRetentionBulk,
+  removeRetentionBulk,
+  submitDeleteJob,
+  getDeleteJob,
+  DeleteJob,
 } from "../api/client";
 import RetentionBadge from "../components/RetentionBadge";
 import {
@@ -26,6 +31,8 @@ interface Build {
   expired: boolean;
   size_bytes: number;
   has_override: boolean;
+  compressed: boolean;
+  protected: boolean;
 }
 
 interface ProjectDetail {
@@ -33,8 +40,12 @@ interface ProjectDetail {
   retention_days: number;
   is_custom: boolean;
   builds: Build[];
+  total: number;
 }
 
+const PAGE_SIZE = 200;
+const JOB_POLL_MS = 1000;
+
 export default function ProjectDetailPage() {
   const location = useLocation();
   const navigate = useNavigate();
@@ -49,11 +60,18 @@ export default function ProjectDetailPage() {
   const [editingBuild, setEditingBuild] = useState<string | null>(null);
   const [editValue, setEditValue] = useState<number>(0);
   const [saving, setSaving] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [selected, setSelected] = useState<Set<string>>(new Set());
+  const [job, setJob] = useState<DeleteJob | null>(null);
 
+  // Reloads every page shown so far, so loadMore can continue at the next page
   const fetchBuilds = async () => {
     if (!project) return;
+    const pages = Math.max(1, Math.ceil((data?.builds.length ?? 0) / PAGE_SIZE));
     try {
-      const res = await getProjectBuilds(project, server);
+      const res = await getProjectBuilds(project, server, {
+        page_size: pages * PAGE_SIZE,
+      });
       setData(res.data);
     } catch {
       // error
@@ -62,6 +80,22 @@ export default function ProjectDetailPage() {
     }
   };
 
+  const loadMore = async () => {
+    if (!project || !data) return;
+    setLoadingMore(true);
+    try {
+      const res = await getProjectBuilds(project, server, {
+        page: data.builds.length / PAGE_SIZE + 1,
+        page_size: PAGE_SIZE,
+      });
+      setData({ ...res.data, builds: [...data.builds, ...res.data.builds] });
+    } catch {
+      // error
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchBuilds();
   }, [project, server]);
@@ -80,6 +114,86 @@ export default function ProjectDetailPage() {
     }
   };
 
+  const toggleSelected = (buildNumber: string) => {
+    const next = new Set(selected);
+    if (!next.delete(buildNumber)) next.add(buildNumber);
+    setSelected(next);
+  };
+
+  const toggleAll = () => {
+    if (!data) return;
+    setSelected(
+      selected.size === data.builds.length
+        ? new Set()
+        : new Set(data.builds.map((b) => b.build_number))
+    );
+  };
+
+  // Runs as a delete job on the backend; polled until it finishes
+  const handleDeleteSelected = async () => {
+    if (!project || selected.size === 0) return;
+    if (!confirm(`Delete ${selected.size} builds of ${project}?`)) return;
+    try {
+      const res = await submitDeleteJob(project, [...selected], server);
+      setJob(res.data);
+      setSelected(new Set());
+    } catch {
+      alert("Failed to start delete job");
+    }
+  };
+
+  // One request for the whole selection instead of a PUT/DELETE per build
+  const selectedItems = (project: string) =>
+    [...selected].map((build) => ({ server, project, build }));
+
+  const handleRetentionSelected = async () => {
+    if (!project || selected.size === 0 || !data) return;
+    const days = prompt(`Retention days for ${selected.size} builds`, String(data.retention_days));
+    if (days === null || !(Number(days) > 0)) return;
+    try {
+      await setRetentionBulk({ items: selectedItems(project), retention_days: Number(days) });
+      setSelected(new Set());
+      fetchBuilds();
+    } catch {
+      alert("Failed to set retention");
+    }
+  };
+
+  const handleOverrideRemoveSelected = async () => {
+    if (!project || selected.size === 0) return;
+    try {
+      await removeRetentionBulk({ items: selectedItems(project) });
+      setSelected(new Set());
+      fetchBuilds();
+    } catch {
+      alert("Failed to remove overrides");
+    }
+  };
+
+  useEffect(() => {
+    if (!job || job.state === "completed" || job.state === "failed") return;
+    const timer = setTimeout(async () => {
+      try {
+        const res = await getDeleteJob(job.id);
+        setJob(res.data);
+        if (res.data.state === "completed" || res.data.state === "failed") {
+          fetchBuilds();
+          if (res.data.failed.length > 0 || res.data.error) {
+            alert(
+              `Delete job finished: ${res.data.deleted}/${res.data.total} deleted` +
+                (res.data.error ? ` (${res.data.error})` : "")
+            );
+          }
+        }
+      } catch {
+        setJob(null);
+      }
+    }, JOB_POLL_MS);
+    return () => clearTimeout(timer);
+  }, [job]);
+
+  const jobRunning = job !== null && job.state !== "completed" && job.state !== "failed";
+
   const handleEditStart = (build: Build) => {
     setEditingBuild(build.build_number);
     setEditValue(build.retention_days);
@@ -133,12 +247,57 @@ export default function ProjectDetailPage() {
           isCustom={data.is_custom}
           retentionDays={data.retention_days}
         />
+        {selected.size > 0 && !jobRunning && (
+          <div className="ml-auto flex items-center gap-2">
+            <button
+              onClick={handleRetentionSelected}
+              className="inline-flex items-center gap-1.5 px-3 py-1.5 text-[12px] font-medium text-gray-700 border border-gray-200 hover:bg-gray-50 rounded-lg transition-colors"
+            >
+              <Clock size={13} />
+              Set retention
+            </button>
+            <button
+              onClick={handleOverrideRemoveSelected}
+              className="inline-flex items-center gap-1.5 px-3 py-1.5 text-[12px] font-medium text-gray-700 border border-gray-200 hover:bg-gray-50 rounded-lg transition-colors"
+            >
+              <X size={13} />
+              Clear overrides
+            </button>
+          </div>
+        )}
+        {(selected.size > 0 || jobRunning) && (
+          <button
+            onClick={handleDeleteSelected}
+            disabled={jobRunning}
+            className={`${jobRunning ? "ml-auto " : ""}inline-flex items-center gap-1.5 px-3 py-1.5 text-[12px] font-medium text-white bg-red-500 hover:bg-red-600 rounded-lg disabled:opacity-60 transition-colors`}
+          >
+            {jobRunning ? (
+              <>
+                <Loader2 size={13} className="animate-spin" />
+                Deleting {job.deleted} / {job.total}
+              </>
+            ) : (
+              <>
+                <Trash2 size={13} />
+                Delete selected ({selected.size})
+              </>
+            )}
+          </button>
+        )}
       </div>
 
       <div className="bg-white border border-gray-200/60 rounded-xl shadow-sm overflow-hidden">
         <table className="min-w-full">
           <thead>
             <tr className="border-b border-gray-100">
+              <th className="pl-4 py-3 w-4">
+                <input
+                  type="checkbox"
+                  checked={data.builds.length > 0 && selected.size === data.builds.length}
+                  onChange={toggleAll}
+                  disabled={jobRunning}
+                />
+              </th>
               <th className="px-4 py-3 text-left text-[11px] font-medium text-gray-400 uppercase tracking-wider">
                 Build
               </th>
@@ -168,8 +327,32 @@ export default function ProjectDetailPage() {
                 key={b.build_number}
                 className="border-b border-gray-50 hover:bg-gray-50/50 transition-colors"
               >
+                <td className="pl-4 py-3">
+                  <input
+                    type="checkbox"
+                    checked={selected.has(b.build_number)}
+                    onChange={() => toggleSelected(b.build_number)}
+                    disabled={jobRunning}
+                  />
+                </td>
                 <td className="px-4 py-3 text-[13px] font-mono font-medium text-gray-900">
                   {b.build_number}
+                  {b.compressed && (
+                    <span
+                      className="ml-2 text-[10px] px-1.5 py-0.5 bg-gray-100 text-gray-500 rounded-full font-sans font-medium"
+                      title="Compressed in place (.build.tar.zst)"
+                    >
+                      zst
+                    </span>
+                  )}
+                  {b.protected && (
+                    <span
+                      className="ml-2 text-[10px] px-1.5 py-0.5 bg-emerald-50 text-emerald-600 rounded-full font-sans font-medium"
+                      title="Kept by a retention rule"
+                    >
+                      kept
+                    </span>
+                  )}
                 </td>
                 <td className="px-4 py-3 text-[13px] text-gray-500">
                   {new Date(b.modified_at).toLocaleString()}
@@ -270,6 +453,18 @@ export default function ProjectDetailPage() {
             ))}
           </tbody>
         </table>
+        {data.builds.length < data.total && (
+          <div className="px-4 py-3 border-t border-gray-100 text-center">
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="inline-flex items-center gap-1.5 text-[12px] font-medium text-gray-500 hover:text-gray-900 disabled:opacity-40 transition-colors"
+            >
+              {loadingMore && <Loader2 size={13} className="animate-spin" />}
+              Load more ({data.builds.length} / {data.total})
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,10 +1,22 @@
 import { useState, useEffect, FormEvent } from "react";
-import { getConfig, updateConfig, testConnection } from "../api/client";
-import { Loader2, Plus, Trash2, Save, Wifi, WifiOff, Server, Clock } from "lucide-react";
+import {
+  getConfig,
+  updateConfig,
+  simulateConfig,
+  testConnection,
+  getAgentThrottle,
+  updateAgentThrottle,
+} from "../api/client";
+import { formatBytes } from "../utils/format";
+import { Loader2, Plus, Trash2, Save, Wifi, WifiOff, Server, Clock, Eye, Gauge } from "lucide-react";
+
+const GB = 1024 ** 3;
 
 interface CustomProject {
   path: string;
   retention_days: number;
+  max_bytes?: number | null;
+  max_builds?: number | null;
 }
 
 interface BinaryServer {
@@ -14,6 +26,10 @@ interface BinaryServer {
   project_depth: number;
   trigger_threshold_percent: number;
   target_threshold_percent: number;
+  emergency_threshold_percent: number;
+  cold_band_days: number;
+  project_max_bytes: number;
+  project_max_builds: number;
   check_interval_minutes: number;
   custom_projects: CustomProject[];
 }
@@ -28,6 +44,35 @@ interface ServerTestResult {
   name: string;
   disk_agent: { ok: boolean; message: string };
   file_list: { ok: boolean; message: string };
+  circuit: { state: string; failures: number; retry_in_seconds: number };
+}
+
+interface AgentThrottle {
+  files_per_second: number;
+  bytes_per_second: number;
+  io_class: string;
+  io_level: number;
+  nice: number;
+  active_tasks: number;
+  files_wait_seconds: number;
+  bytes_wait_seconds: number;
+}
+
+const MB = 1024 ** 2;
+
+interface PolicyImpact {
+  usage_percent: number;
+  would_trigger: boolean;
+  usage_after_cleanup: number;
+  steady_state_usage_percent: number;
+  deletable_builds: number;
+  deletable_bytes: number;
+}
+
+interface PolicyComparison {
+  name: string;
+  current: PolicyImpact | null;
+  proposed: PolicyImpact;
 }
 
 export default function SettingsPage() {
@@ -42,6 +87,9 @@ export default function SettingsPage() {
   });
   const [testing, setTesting] = useState(false);
   const [testResults, setTestResults] = useState<ServerTestResult[]>([]);
+  const [simulating, setSimulating] = useState(false);
+  const [impact, setImpact] = useState<PolicyComparison[] | null>(null);
+  const [throttles, setThrottles] = useState<Record<string, AgentThrottle | string>>({});
 
   useEffect(() => {
     const fetch = async () => {
@@ -52,6 +100,8 @@ export default function SettingsPage() {
           (c.binary_servers || []).map((s: BinaryServer) => ({
             ...s,
             project_depth: s.project_depth ?? 1,
+            project_max_bytes: s.project_max_bytes ?? 0,
+            project_max_builds: s.project_max_builds ?? 0,
             custom_projects: s.custom_projects ?? [],
           }))
         );
@@ -71,6 +121,7 @@ export default function SettingsPage() {
     setMessage("");
     try {
       await updateConfig({ binary_servers: servers, retention });
+      setImpact(null);
       setMessage("Settings saved successfully");
     } catch {
       setMessage("Failed to save settings");
@@ -79,6 +130,58 @@ export default function SettingsPage() {
     }
   };
 
+  const handleSimulate = async () => {
+    setSimulating(true);
+    setMessage("");
+    try {
+      const res = await simulateConfig({ binary_servers: servers, retention });
+      setImpact(res.data.servers);
+    } catch {
+      setMessage("Failed to preview settings");
+    } finally {
+      setSimulating(false);
+    }
+  };
+
+  // Runtime disk agent throttle; applied to the agent directly, not saved in config
+  const toggleThrottle = async (name: string) => {
+    if (throttles[name] !== undefined) {
+      const rest = { ...throttles };
+      delete rest[name];
+      setThrottles(rest);
+      return;
+    }
+    try {
+      const res = await getAgentThrottle(name);
+      setThrottles({ ...throttles, [name]: res.data });
+    } catch {
+      setThrottles({ ...throttles, [name]: "Failed to load throttle (save the server first)" });
+    }
+  };
+
+  const editThrottle = (name: string, field: keyof AgentThrottle, value: string | number) => {
+    const current = throttles[name];
+    if (typeof current !== "object") return;
+    setThrottles({ ...throttles, [name]: { ...current, [field]: value } });
+  };
+
+  const applyThrottle = async (name: string) => {
+    const t = throttles[name];
+    if (typeof t !== "object") return;
+    try {
+      const res = await updateAgentThrottle(name, {
+        files_per_second: t.files_per_second,
+        bytes_per_second: t.bytes_per_second,
+        io_class: t.io_class,
+        io_level: t.io_level,
+        nice: t.nice,
+      });
+      setThrottles({ ...throttles, [name]: res.data });
+    } catch {
+      setMessage(`Failed to update throttle for ${name}`);
+    }
+  };
+
   const addServer = () => {
     setServers([
       ...servers,
@@ -89,6 +192,10 @@ export default function SettingsPage() {
         project_depth: 1,
         trigger_threshold_percent: 90,
         target_threshold_percent: 80,
+        emergency_threshold_percent: 98,
+        cold_band_days: 0,
+        project_max_bytes: 0,
+        project_max_builds: 0,
         check_interval_minutes: 5,
         custom_projects: [],
       },
@@ -136,7 +243,7 @@ export default function SettingsPage() {
     serverIdx: number,
     projectIdx: number,
     field: keyof CustomProject,
-    value: string | number
+    value: string | number | null
   ) => {
     const updated = [...servers];
     const projects = [...updated[serverIdx].custom_projects];
@@ -182,6 +289,15 @@ export default function SettingsPage() {
                 {message}
               </span>
             )}
+            <button
+              type="button"
+              onClick={handleSimulate}
+              disabled={simulating}
+              className="flex items-center gap-1.5 px-4 py-2 border border-gray-200 rounded-lg text-[13px] font-medium hover:bg-gray-50 hover:border-gray-300 disabled:opacity-40 transition-all shadow-sm"
+            >
+              {simulating ? <Loader2 size={14} className="animate-spin" /> : <Eye size={14} />}
+              Preview
+            </button>
             <button
               type="submit"
               disabled={saving}
@@ -192,6 +308,64 @@ export default function SettingsPage() {
             </button>
           </div>
         </div>
+        {/* Impact preview of the unsaved settings */}
+        {impact && (
+          <div className="bg-white border border-gray-200/60 rounded-xl shadow-sm p-5">
+            <div className="flex items-center justify-between mb-3">
+              <h3 className="text-[14px] font-semibold text-gray-900">Impact Preview</h3>
+              <button
+                type="button"
+                onClick={() => setImpact(null)}
+                className="text-[12px] text-gray-400 hover:text-gray-600"
+              >
+                Close
+              </button>
+            </div>
+            <table className="min-w-full text-[12px]">
+              <thead>
+                <tr className="text-left text-[10px] text-gray-400 uppercase tracking-wider">
+                  <th className="pb-2 pr-4">Server</th>
+                  <th className="pb-2 pr-4">Usage</th>
+                  <th className="pb-2 pr-4">Deletable (current → proposed)</th>
+                  <th className="pb-2 pr-4">After Cleanup</th>
+                  <th className="pb-2">Steady State</th>
+                </tr>
+              </thead>
+              <tbody>
+                {impact.map(({ name, current, proposed }) => (
+                  <tr key={name} className="border-t border-gray-50">
+                    <td className="py-1.5 pr-4 font-medium text-gray-900">
+                      {name}
+                      {proposed.would_trigger && (
+                        <span className="ml-2 text-[10px] px-1.5 py-0.5 bg-amber-50 text-amber-600 rounded">
+                          triggers
+                        </span>
+                      )}
+                    </td>
+                    <td className="py-1.5 pr-4 text-gray-500 tabular-nums">
+                      {proposed.usage_percent.toFixed(1)}%
+                    </td>
+                    <td className="py-1.5 pr-4 text-gray-500 tabular-nums">
+                      {current
+                        ? `${current.deletable_builds} (${formatBytes(current.deletable_bytes)})`
+                        : "new"}
+                      {" → "}
+                      <span className="font-semibold text-gray-900">
+                        {proposed.deletable_builds} ({formatBytes(proposed.deletable_bytes)})
+                      </span>
+                    </td>
+                    <td className="py-1.5 pr-4 text-gray-500 tabular-nums">
+                      {proposed.usage_after_cleanup.toFixed(1)}%
+                    </td>
+                    <td className="py-1.5 text-gray-500 tabular-nums">
+                      {proposed.steady_state_usage_percent.toFixed(1)}%
+                    </td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </div>
+        )}
         {/* Retention Defaults */}
         <div className="bg-white border border-gray-200/60 rounded-xl shadow-sm p-5">
           <div className="flex items-center gap-2 mb-4">
@@ -280,6 +454,19 @@ export default function SettingsPage() {
                       placeholder="Server name (e.g. custom, mobile)"
                       className="px-3 py-2 border border-gray-200 rounded-lg text-[13px] font-semibold flex-1 mr-2 focus:outline-none focus:ring-2 focus:ring-indigo-500/20 focus:border-indigo-400"
                     />
+                    <button
+                      type="button"
+                      onClick={() => toggleThrottle(server.name)}
+                      disabled={!server.name}
+                      title="Disk agent throttle"
+                      className={`p-1.5 rounded-lg transition-colors disabled:opacity-40 ${
+                        throttles[server.name] !== undefined
+                          ? "text-indigo-500 bg-indigo-50"
+                          : "text-gray-300 hover:text-indigo-500 hover:bg-indigo-50"
+                      }`}
+                    >
+                      <Gauge size={15} />
+                    </button>
                     <button
                       type="button"
                       onClick={() => removeServer(i)}
@@ -321,7 +508,7 @@ export default function SettingsPage() {
                       />
                     </div>
                   </div>
-                  <div className="grid grid-cols-3 gap-3">
+                  <div className="grid grid-cols-5 gap-3">
                     <div>
                       <label className={labelCls}>Trigger (%)</label>
                       <input
@@ -344,6 +531,29 @@ export default function SettingsPage() {
                         className={inputCls}
                       />
                     </div>
+                    <div>
+                      <label className={labelCls}>Emergency (%)</label>
+                      <input
+                        type="number"
+                        min={0}
+                        max={100}
+                        value={server.emergency_threshold_percent}
+                        onChange={(e) => updateServer(i, "emergency_threshold_percent", Number(e.target.value))}
+                        className={inputCls}
+                      />
+                    </div>
+                    <div>
+                      <label className={labelCls} title="Builds with at most this many days left are compressed before deletion (0 = off)">
+                        Compress (days)
+                      </label>
+                      <input
+                        type="number"
+                        min={0}
+                        value={server.cold_band_days}
+                        onChange={(e) => updateServer(i, "cold_band_days", Number(e.target.value))}
+                        className={inputCls}
+                      />
+                    </div>
                     <div>
                       <label className={labelCls}>Interval (min)</label>
                       <input
@@ -355,6 +565,32 @@ export default function SettingsPage() {
                       />
                     </div>
                   </div>
+                  <div className="grid grid-cols-2 gap-3">
+                    <div>
+                      <label className={labelCls} title="Default per-project size limit, trimmed lowest score first before the disk thresholds (0 = no limit)">
+                        Project Quota (GB)
+                      </label>
+                      <input
+                        type="number"
+                        min={0}
+                        value={server.project_max_bytes / GB}
+                        onChange={(e) => updateServer(i, "project_max_bytes", Math.round(Number(e.target.value) * GB))}
+                        className={inputCls}
+                      />
+                    </div>
+                    <div>
+                      <label className={labelCls} title="Default per-project build count limit (0 = no limit)">
+                        Project Quota (builds)
+                      </label>
+                      <input
+                        type="number"
+                        min={0}
+                        value={server.project_max_builds}
+                        onChange={(e) => updateServer(i, "project_max_builds", Number(e.target.value))}
+                        className={inputCls}
+                      />
+                    </div>
+                  </div>
 
                   {/* Custom Projects */}
                   <div className="border-t border-gray-100 pt-3">
@@ -391,6 +627,31 @@ export default function SettingsPage() {
                             />
                             <span className="text-[11px] text-gray-400">d</span>
                           </div>
+                          <div className="flex items-center gap-1" title="Project quota, empty = server default, 0 = no limit">
+                            <input
+                              type="number"
+                              min={0}
+                              value={cp.max_bytes == null ? "" : cp.max_bytes / GB}
+                              onChange={(e) =>
+                                updateCustomProject(
+                                  i, j, "max_bytes",
+                                  e.target.value === "" ? null : Math.round(Number(e.target.value) * GB)
+                                )
+                              }
+                              className="w-16 px-2 py-1.5 border border-gray-200 rounded-lg text-[12px] text-center focus:outline-none focus:ring-2 focus:ring-indigo-500/20 focus:border-indigo-400"
+                            />
+                            <span className="text-[11px] text-gray-400">GB</span>
+                            <input
+                              type="number"
+                              min={0}
+                              value={cp.max_builds ?? ""}
+                              onChange={(e) =>
+                                updateCustomProject(i, j, "max_builds", e.target.value === "" ? null : Number(e.target.value))
+                              }
+                              className="w-16 px-2 py-1.5 border border-gray-200 rounded-lg text-[12px] text-center focus:outline-none focus:ring-2 focus:ring-indigo-500/20 focus:border-indigo-400"
+                            />
+                            <span className="text-[11px] text-gray-400">builds</span>
+                          </div>
                           <button
                             type="button"
                             onClick={() => removeCustomProject(i, j)}
@@ -418,8 +679,86 @@ export default function SettingsPage() {
                         {result.file_list.ok ? <Wifi size={13} /> : <WifiOff size={13} />}
                         Files: {result.file_list.message}
                       </span>
+                      {result.circuit.state !== "closed" && (
+                        <span className="text-amber-600">
+                          Circuit {result.circuit.state.replace("_", "-")} ({result.circuit.failures} failures)
+                        </span>
+                      )}
                     </div>
                   )}
+                  {typeof throttles[server.name] === "string" && (
+                    <p className="text-[12px] text-red-500 pt-2 border-t border-gray-100">
+                      {throttles[server.name] as string}
+                    </p>
+                  )}
+                  {typeof throttles[server.name] === "object" && (() => {
+                    const t = throttles[server.name] as AgentThrottle;
+                    const numCls = "w-20 px-2 py-1.5 border border-gray-200 rounded-lg text-[12px] text-center focus:outline-none focus:ring-2 focus:ring-indigo-500/20 focus:border-indigo-400";
+                    return (
+                      <div className="pt-2 border-t border-gray-100 space-y-2">
+                        <div className="flex items-center justify-between">
+                          <label className={labelCls}>Disk Agent Throttle (runtime, 0 = unlimited)</label>
+                          <span className="text-[11px] text-gray-400">
+                            {t.active_tasks} active · waited {(t.files_wait_seconds + t.bytes_wait_seconds).toFixed(1)}s
+                          </span>
+                        </div>
+                        <div className="flex flex-wrap items-center gap-2 text-[11px] text-gray-400">
+                          <input
+                            type="number"
+                            min={0}
+                            value={t.files_per_second}
+                            onChange={(e) => editThrottle(server.name, "files_per_second", Number(e.target.value))}
+                            className={numCls}
+                          />
+                          files/s
+                          <input
+                            type="number"
+                            min={0}
+                            value={t.bytes_per_second / MB}
+                            onChange={(e) =>
+                              editThrottle(server.name, "bytes_per_second", Math.round(Number(e.target.value) * MB))
+                            }
+                            className={numCls}
+                          />
+                          MB/s
+                          <select
+                            value={t.io_class}
+                            onChange={(e) => editThrottle(server.name, "io_class", e.target.value)}
+                            className="px-2 py-1.5 border border-gray-200 rounded-lg text-[12px] text-gray-700"
+                          >
+                            <option value="none">none</option>
+                            <option value="best-effort">best-effort</option>
+                            <option value="idle">idle</option>
+                          </select>
+                          <input
+                            type="number"
+                            min={0}
+                            max={7}
+                            value={t.io_level}
+                            onChange={(e) => editThrottle(server.name, "io_level", Number(e.target.value))}
+                            className={numCls}
+                          />
+                          io level
+                          <input
+                            type="number"
+                            min={0}
+                            max={19}
+                            value={t.nice}
+                            onChange={(e) => editThrottle(server.name, "nice", Number(e.target.value))}
+                            className={numCls}
+                          />
+                          nice
+                          <button
+                            type="button"
+                            onClick={() => applyThrottle(server.name)}
+                            className="ml-auto px-3 py-1.5 text-[12px] font-medium text-indigo-600 border border-indigo-200 rounded-lg hover:bg-indigo-50 transition-colors"
+                          >
+                            Apply
+                          </button>
+                        </div>
+                      </div>
+                    );
+                  })()}
                 </div>
               );
             })}
@@ -3,24 +3,28 @@
 # 사용법: ./setup.sh
 
 BACKUP_DIR="${HOME}/binary-manager-backup"
+CONFIG_DIR="${BACKUP_DIR}/config"  # mounted as a directory: config.yaml is replaced by rename on save
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 echo "=== Binary Manager 초기 설정 ==="
 
 # 1. 백업 디렉토리 생성
-mkdir -p "${BACKUP_DIR}"
-echo "[1/2] 디렉토리 생성: ${BACKUP_DIR}"
+mkdir -p "${CONFIG_DIR}"
+echo "[1/2] 디렉토리 생성: ${CONFIG_DIR}"
 
-# 2. config.yaml 복사 (없을 경우에만)
-if [ ! -f "${BACKUP_DIR}/config.yaml" ]; then
-    cp "${SCRIPT_DIR}/backend/config.yaml" "${BACKUP_DIR}/config.yaml"
-    echo "[2/2] config.yaml 복사 완료"
-else
+# 2. config.yaml 복사 (없을 경우에만, 예전 위치의 파일은 옮김)
+if [ -f "${CONFIG_DIR}/config.yaml" ]; then
     echo "[2/2] config.yaml 이미 존재 (스킵)"
+elif [ -f "${BACKUP_DIR}/config.yaml" ]; then
+    mv "${BACKUP_DIR}/config.yaml" "${CONFIG_DIR}/config.yaml"
+    echo "[2/2] config.yaml 이동 완료 (${BACKUP_DIR} → ${CONFIG_DIR})"
+else
+    cp "${SCRIPT_DIR}/backend/config.yaml" "${CONFIG_DIR}/config.yaml"
+    echo "[2/2] config.yaml 복사 완료"
 fi
 
 echo ""
 echo "=== 설정 완료 ==="
-echo "설정 파일: ${BACKUP_DIR}/config.yaml"
+echo "설정 파일: ${CONFIG_DIR}/config.yaml"
 echo ""
 echo "이제 'docker compose up --build -d'로 실행하세요."